@@ -0,0 +1,215 @@
+"""Pre-rendered animation frames for sprites.
+
+Rotating or scaling a surface every frame is far too slow, so every
+animated look is a FrameSet: transformed copies of one sprite, each
+rendered once (the first time it is shown, or ahead of time by warm())
+and from then on just blitted.  Frames are cropped to the pixels that are
+drawn (a turned sprite is mostly transparent corners) and carry an offset
+that keeps them anchored (centre for rotation, feet for squash and
+stretch), so drawing an animated entity is still a single blit.
+
+Looks are registered by name with define(); frame sets are cached per
+(sprite, look).  The frames count against the AssetManager's budget (see
+AssetManager.charge()), and while it is exceeded the least recently used
+sets are dropped, though never one drawn in the last KEEP_SECONDS.
+Bobbing needs no frames at all, it is only a table of y offsets.
+
+source() tells which sprite and transform a rendered frame came from, so
+a bigger copy of the frame can be rendered from a bigger copy of the
+sprite (see scaling.py).
+"""
+import math
+import time
+import weakref
+from collections import OrderedDict
+
+import pygame
+
+from assets import surface_bytes
+
+WARM_FILL = 0.75  # warm() stops once the shared budget is this full
+KEEP_SECONDS = 0.5  # sets drawn this recently are never dropped
+
+
+# -------------------------------
+# LOOKS
+# -------------------------------
+# A look is ([(angle, scale x, scale y)] per frame, anchor)
+def spin(steps):
+    return [(360 * i / steps, 1.0, 1.0) for i in range(steps)], "center"
+
+
+def squash_stretch(steps, amount):
+    # Frame 0 is squashed (wide and flat), the last one stretched
+    frames = []
+    for i in range(steps):
+        t = 2 * i / (steps - 1) - 1
+        frames.append((0, 1 - amount * t, 1 + amount * t))
+    return frames, "bottom"
+
+
+def bob_offsets(amplitude, period):
+    # y offsets for a gentle up and down, one per tick
+    return [round(amplitude * math.sin(2 * math.pi * i / period)) for i in range(period)]
+
+
+def frame_index(tick, period, steps, phase=0):
+    # Which of `steps` frames to show at `tick` for a loop lasting `period` ticks
+    return (tick * steps // period + phase) % steps
+
+
+class FrameSet:
+    __slots__ = ("base", "transforms", "anchor", "frames", "offsets", "bytes", "missing",
+                 "used")
+
+    def __init__(self, base, transforms, anchor):
+        self.base = base
+        self.transforms = transforms
+        self.anchor = anchor
+        self.frames = [None] * len(transforms)
+        self.offsets = [(0, 0)] * len(transforms)
+        self.bytes = 0
+        self.missing = len(transforms)
+        self.used = 0.0  # perf_counter() when last asked for a frame
+
+    def render(self, i, crop=True):
+        # Returns the bytes the new frame takes; an untransformed frame is
+        # the sprite itself and costs nothing
+        angle, sx, sy = self.transforms[i]
+        surf = self.base
+        w, h = surf.get_size()
+        if sx != 1 or sy != 1:
+            surf = pygame.transform.smoothscale(surf, (max(1, round(w * sx)),
+                                                       max(1, round(h * sy))))
+        if angle:
+            surf = pygame.transform.rotozoom(surf, angle, 1)
+        fw, fh = surf.get_size()
+        if self.anchor == "bottom":
+            dx, dy = (w - fw) // 2, h - fh
+        else:
+            dx, dy = (w - fw) // 2, (h - fh) // 2
+        if crop and surf is not self.base:
+            box = surf.get_bounding_rect()
+            if box.w and box.h:
+                surf = surf.subsurface(box).copy()
+                dx, dy = dx + box.x, dy + box.y
+        self.offsets[i] = (dx, dy)
+        self.frames[i] = surf
+        self.missing -= 1
+        size = 0 if surf is self.base else surface_bytes(surf)
+        self.bytes += size
+        return size
+
+
+class AnimationCache:
+    def __init__(self, assets):
+        self.assets = assets  # whose budget the frames count against
+        self.looks = {}
+        self.sets = OrderedDict()
+        self.used_bytes = 0
+        self.rendered = 0
+        self.evictions = 0
+        self.sources = weakref.WeakKeyDictionary()  # frame -> (base, transform, anchor, offset)
+
+    def define(self, name, look):
+        self.looks[name] = look
+
+    def frame_set(self, base, look):
+        key = (base, look)
+        fs = self.sets.get(key)
+        if fs is None:
+            fs = FrameSet(base, *self.looks[look])
+            self.sets[key] = fs
+        else:
+            self.sets.move_to_end(key)
+        fs.used = time.perf_counter()
+        return fs
+
+    def frame(self, base, look, i):
+        # (surface, (dx, dy)) for frame i of `look` applied to `base`
+        fs = self.frame_set(base, look)
+        surf = fs.frames[i]
+        if surf is None:
+            surf = self.render(fs, i)
+        return surf, fs.offsets[i]
+
+    def render_all(self, base, look):
+        # The whole FrameSet at once, e.g. to build collision masks from it
+        fs = self.frame_set(base, look)
+        for i, surf in enumerate(fs.frames):
+            if surf is None:
+                self.render(fs, i)
+        return fs
+
+    def render(self, fs, i):
+        self.add(fs.render(i))
+        surf = fs.frames[i]
+        if surf is not fs.base:
+            self.sources[surf] = (fs.base, fs.transforms[i], fs.anchor, fs.offsets[i])
+        return surf
+
+    def source(self, frame):
+        # (sprite, (angle, scale x, scale y), anchor, (dx, dy)) or None if
+        # not a frame
+        return self.sources.get(frame)
+
+    def add(self, size):
+        self.used_bytes += size
+        self.assets.charge(size)
+        self.rendered += 1
+        self.trim()
+
+    def drop(self, key):
+        size = self.sets.pop(key).bytes
+        self.used_bytes -= size
+        self.assets.charge(-size)
+
+    def trim(self):
+        # Drops the least recently used sets while the shared budget is
+        # exceeded; sets that are being drawn stay even then
+        now = time.perf_counter()
+        while self.sets and self.assets.used_bytes > self.assets.budget_bytes:
+            key, old = next(iter(self.sets.items()))
+            if now - old.used < KEEP_SECONDS:
+                break
+            self.drop(key)
+            self.evictions += 1
+
+    # -------------------------------
+    # WARMING
+    # -------------------------------
+    def warm_room(self):
+        return self.assets.used_bytes < self.assets.budget_bytes * WARM_FILL
+
+    def pending(self):
+        return self.warm_room() and any(fs.missing for fs in self.sets.values())
+
+    def warm(self, budget_ms):
+        # Renders missing frames of the most recently used sets first
+        deadline = time.perf_counter() + budget_ms / 1000
+        for fs in reversed(list(self.sets.values())):
+            for i, surf in enumerate(fs.frames):
+                if surf is not None:
+                    continue
+                if time.perf_counter() >= deadline or not self.warm_room():
+                    return
+                self.render(fs, i)
+
+    def release(self, bases):
+        # Drops every set made from one of the `bases` surfaces
+        for key in [k for k in self.sets if k[0] in bases]:
+            self.drop(key)
+
+    def clear(self):
+        for key in list(self.sets):
+            self.drop(key)
+
+    def stats(self):
+        return {
+            "sets": len(self.sets),
+            "frames": sum(len(fs.frames) - fs.missing for fs in self.sets.values()),
+            "rendered": self.rendered,
+            "evictions": self.evictions,
+            "used_bytes": self.used_bytes,
+            "budget_bytes": self.assets.budget_bytes,  # shared with the assets
+        }
@@ -0,0 +1,351 @@
+"""Asset cache shared by the whole game.
+
+Surfaces are decoded once, converted to the display format and kept keyed
+by (path, size, alpha).  Every entry's byte size is tracked (an atlas
+sheet is counted once, not per sprite cut from it).  Entries loaded for a
+group, such as a level, stay until release_group() unloads the group;
+other entries are dropped least recently used first once the cache goes
+over its memory budget.  Caches of surfaces made from the assets (the
+animation frames) charge() their bytes to the same budget, so there is
+one cap on converted surfaces.  usage() reports where the memory goes.
+
+Source images are scaled with scale_image(), the same function
+bake_assets.py bakes with, so a sprite has the same pixels (and the same
+collision masks, see shapes.py) whether or not baked/ is there.
+
+variant() hands out an entry decoded again at another size, for drawing
+at a bigger window size (see scaling.py).  Variants belong to the same
+groups as the entry and release_variants() drops them all at once.
+
+prefetch() queues work that is decoded
+on a worker thread where threads exist (desktop) or a piece at a time from
+pump() where they don't (pygbag), so the next level can warm up while the
+current one is being played.
+"""
+import os
+import glob
+import json
+import time
+import weakref
+from collections import OrderedDict
+
+import pygame
+
+from runtime import IS_BROWSER, USE_THREADS
+
+MANIFEST_VERSION = 1
+DEFAULT_BUDGET_BYTES = 64 * 1024 * 1024
+# Browser tabs (and the Chromebooks they run on) get killed well before that
+BROWSER_BUDGET_BYTES = 24 * 1024 * 1024
+
+
+def surface_bytes(surf):
+    return surf.get_width() * surf.get_height() * surf.get_bytesize()
+
+
+def scale_image(path, size, alpha):
+    # The one way art is scaled, at bake time and at load time alike
+    img = pygame.image.load(path)
+    if alpha and img.get_bitsize() != 32:
+        img = img.convert(32, pygame.SRCALPHA)
+    elif img.get_bitsize() not in (24, 32):
+        img = img.convert(24)
+    scaled = pygame.transform.smoothscale(img, size)
+    if alpha:
+        return scaled
+    # Drop the alpha channel so opaque art is saved as 24-bit
+    opaque = pygame.Surface(size, depth=24)
+    opaque.blit(scaled, (0, 0))
+    return opaque
+
+
+def default_budget():
+    # MISSION_EARTH_TEXTURE_MB overrides the per-platform default
+    mb = os.environ.get("MISSION_EARTH_TEXTURE_MB")
+    if mb:
+        return int(float(mb) * 1024 * 1024)
+    return BROWSER_BUDGET_BYTES if IS_BROWSER else DEFAULT_BUDGET_BYTES
+
+
+class AssetManager:
+    def __init__(self, root, budget_bytes=DEFAULT_BUDGET_BYTES, threaded=USE_THREADS):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.manifest = {}
+        self.baked_dir = None
+        self.cache = OrderedDict()
+        self.sizes = {}  # key -> bytes, 0 for sprites cut from a sheet
+        self.used_bytes = 0  # assets plus what was charge()d
+        self.charged_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.releases = 0
+        self.groups = {}  # group -> keys loaded for it
+        self.key_groups = {}  # key -> groups holding it
+        self.sheets = {}
+        self.sheet_users = {}  # sheet name -> keys cut from it
+        self.key_sheets = {}  # key -> sheet name
+        self.surface_keys = weakref.WeakKeyDictionary()  # surface -> key
+        self.variants = set()  # keys made by variant()
+        self.failed = set()  # keys whose prefetch failed
+        self.queue = OrderedDict()
+        self.pending = {}
+        self.executor = None
+        if threaded:
+            from concurrent.futures import ThreadPoolExecutor
+            self.executor = ThreadPoolExecutor(max_workers=1)
+
+    # -------------------------------
+    # BAKED MANIFEST
+    # -------------------------------
+    def load_manifest(self, baked_dir):
+        self.baked_dir = baked_dir
+        try:
+            with open(os.path.join(baked_dir, "manifest.json")) as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                self.manifest = manifest["assets"]
+        except (OSError, ValueError, KeyError):
+            self.manifest = {}
+
+    def key_for(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def list(self, folder):
+        # Baked builds may ship without the source folders, so ask the manifest
+        if self.manifest:
+            prefix = self.key_for(folder) + "/"
+            return [
+                os.path.join(self.root, key) for key in sorted(self.manifest)
+                if key.startswith(prefix) and "/" not in key[len(prefix):]
+            ]
+        return sorted(glob.glob(os.path.join(folder, "*.png")))
+
+    # -------------------------------
+    # LOADING
+    # -------------------------------
+    def decode(self, path, size, alpha):
+        # Safe to run off the main thread: no display format involved yet
+        entry = self.manifest.get(self.key_for(path))
+        if entry and tuple(entry["size"]) == tuple(size):
+            if "atlas" in entry:
+                return ("atlas", entry["atlas"], entry["rect"])
+            return ("file", pygame.image.load(os.path.join(self.baked_dir, entry["file"])))
+        return ("file", scale_image(path, size, alpha))
+
+    def finish(self, key, decoded):
+        # Display conversion has to happen on the main thread
+        if decoded[0] == "atlas":
+            _, sheet_name, rect = decoded
+            sheet = self.sheets.get(sheet_name)
+            if sheet is None:
+                sheet = pygame.image.load(
+                    os.path.join(self.baked_dir, sheet_name)).convert_alpha()
+                self.sheets[sheet_name] = sheet
+                self.sheet_users[sheet_name] = set()
+                self.used_bytes += surface_bytes(sheet)
+            self.sheet_users[sheet_name].add(key)
+            self.key_sheets[key] = sheet_name
+            return sheet.subsurface(rect)
+        img = decoded[1]
+        return img.convert_alpha() if key[2] else img.convert()
+
+    def get(self, path, size, alpha=True, group=None):
+        key = (path, tuple(size), alpha)
+        if group is not None:
+            self.tag(key, group)
+        surf = self.cache.get(key)
+        if surf is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return surf
+
+        self.misses += 1
+        self.queue.pop(key, None)
+        future = self.pending.pop(key, None)
+        decoded = future.result() if future else self.decode(path, size, alpha)
+        surf = self.finish(key, decoded)
+        self.store(key, surf)
+        return surf
+
+    def is_ready(self, path, size, alpha=True):
+        return (path, tuple(size), alpha) in self.cache
+
+    def store(self, key, surf):
+        self.cache[key] = surf
+        self.surface_keys[surf] = key
+        # A sprite cut from a sheet costs nothing beyond the sheet itself
+        size = 0 if key in self.key_sheets else surface_bytes(surf)
+        self.sizes[key] = size
+        self.used_bytes += size
+        while self.used_bytes > self.budget_bytes:
+            # Only entries no group holds can be evicted
+            old = next((k for k in self.cache
+                        if k not in self.key_groups and k != key), None)
+            if old is None:
+                break
+            self.drop(old)
+            self.evictions += 1
+
+    def drop(self, key):
+        del self.cache[key]
+        self.variants.discard(key)
+        self.used_bytes -= self.sizes.pop(key)
+        sheet_name = self.key_sheets.pop(key, None)
+        if sheet_name:
+            users = self.sheet_users[sheet_name]
+            users.discard(key)
+            if not users:
+                del self.sheet_users[sheet_name]
+                self.used_bytes -= surface_bytes(self.sheets.pop(sheet_name))
+
+    # -------------------------------
+    # GROUPS
+    # -------------------------------
+    def tag(self, key, group):
+        self.groups.setdefault(group, set()).add(key)
+        self.key_groups.setdefault(key, set()).add(group)
+
+    def release_group(self, group):
+        # Unloads everything only `group` was holding; returns bytes freed
+        before = self.used_bytes
+        for key in self.groups.pop(group, ()):
+            owners = self.key_groups[key]
+            owners.discard(group)
+            if owners:
+                continue
+            del self.key_groups[key]
+            self.queue.pop(key, None)
+            future = self.pending.pop(key, None)
+            if future:
+                future.cancel()
+            if key in self.cache:
+                self.drop(key)
+                self.releases += 1
+        return before - self.used_bytes
+
+    def charge(self, nbytes):
+        # Surfaces kept elsewhere but made from assets (negative to give back)
+        self.charged_bytes += nbytes
+        self.used_bytes += nbytes
+
+    def group_bytes(self, group):
+        keys = [k for k in self.groups.get(group, ()) if k in self.cache]
+        sheets = {self.key_sheets[k] for k in keys if k in self.key_sheets}
+        return (sum(self.sizes[k] for k in keys)
+                + sum(surface_bytes(self.sheets[name]) for name in sheets))
+
+    # -------------------------------
+    # BACKGROUND PRELOADING
+    # -------------------------------
+    def prefetch(self, path, size, alpha=True, group=None):
+        key = (path, tuple(size), alpha)
+        if group is not None:
+            self.tag(key, group)
+        if key in self.cache or key in self.pending or key in self.queue:
+            return
+        if self.executor:
+            self.pending[key] = self.executor.submit(self.decode, path, size, alpha)
+        else:
+            self.queue[key] = None
+
+    def pump(self, budget_ms=4):
+        # Called once per frame; moves finished work into the cache
+        deadline = time.perf_counter() + budget_ms / 1000
+        for key, future in list(self.pending.items()):
+            if not future.done():
+                continue
+            del self.pending[key]
+            try:
+                self.store(key, self.finish(key, future.result()))
+            except Exception as e:
+                self.failed.add(key)
+                print(f"Error preloading {key[0]}: {e}")
+            if time.perf_counter() >= deadline:
+                return
+
+        while self.queue and time.perf_counter() < deadline:
+            key, _ = self.queue.popitem(last=False)
+            path, size, alpha = key
+            try:
+                self.store(key, self.finish(key, self.decode(path, size, alpha)))
+            except Exception as e:
+                self.failed.add(key)
+                print(f"Error preloading {path}: {e}")
+
+    def busy(self):
+        return bool(self.pending or self.queue)
+
+    # -------------------------------
+    # SIZE VARIANTS
+    # -------------------------------
+    def variant(self, surf, size):
+        # `surf`'s asset decoded again at `size` from its file: the surface,
+        # False while it is being prefetched, None when surf is no asset
+        # or its file cannot be read
+        key = self.surface_keys.get(surf)
+        if key is None:
+            return None
+        path, _, alpha = key
+        vkey = (path, tuple(size), alpha)
+        if vkey == key:
+            return surf
+        if vkey in self.failed:
+            return None
+        if vkey not in self.variants:
+            self.variants.add(vkey)
+            for group in self.key_groups.get(key, ()):
+                self.tag(vkey, group)
+        if vkey in self.cache:
+            return self.get(path, size, alpha)
+        self.prefetch(path, size, alpha)
+        return False
+
+    def release_variants(self):
+        # Drops every variant, e.g. when the window size changed again
+        before = self.used_bytes
+        for vkey in list(self.variants):
+            for group in self.key_groups.pop(vkey, ()):
+                self.groups[group].discard(vkey)
+            self.queue.pop(vkey, None)
+            future = self.pending.pop(vkey, None)
+            if future:
+                future.cancel()
+            if vkey in self.cache:
+                self.drop(vkey)
+        self.variants.clear()
+        return before - self.used_bytes
+
+    # -------------------------------
+    # REPORTING
+    # -------------------------------
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "releases": self.releases,
+            "entries": len(self.cache),
+            "variants": len(self.variants),
+            "used_bytes": self.used_bytes,
+            "budget_bytes": self.budget_bytes,
+        }
+
+    def usage(self):
+        # Current texture memory, in total and per group
+        return {
+            "used_bytes": self.used_bytes,
+            "budget_bytes": self.budget_bytes,
+            "over_budget": self.used_bytes > self.budget_bytes,
+            "sheet_bytes": sum(surface_bytes(s) for s in self.sheets.values()),
+            "charged_bytes": self.charged_bytes,
+            "surfaces": len(self.cache),
+            "groups": {group: self.group_bytes(group) for group in self.groups},
+        }
+
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
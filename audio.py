@@ -0,0 +1,171 @@
+"""Sound effects and music.
+
+Sound effects are short files in sounds/ (name.ogg or name.wav, see
+SOUNDS).  Each is decoded once into a pygame.mixer.Sound by load_steps(),
+which main.py runs as part of the startup loading job, so audio never
+holds up the first frame.  A missing file is reported once and that
+sound stays silent; make_placeholder_audio.py writes stand-ins.  A machine
+without an audio device plays nothing.
+
+Sounds play on a fixed pool of CHANNELS channels reserved for them, so
+nothing else can take them and finding one is a scan of a short list.
+When every channel is busy the new sound takes over the channel of the
+lowest priority, oldest sound, or is dropped if everything playing
+matters more.  A sound also never has more than its own voice limit
+playing at once, rapid lane changes reuse their own channels instead of
+piling up.
+
+Music is streamed from disk by pygame.mixer.music, one track at a time,
+and never decoded whole.
+"""
+import os
+import time
+
+import pygame
+
+FREQUENCY = 44100
+BUFFER = 512  # samples; small enough that effects land on the frame they belong to
+CHANNELS = 8
+MUSIC_FADE_MS = 500
+SOUND_EXTENSIONS = (".ogg", ".wav")
+
+# name -> (priority, voice limit); higher priorities steal from lower ones
+SOUNDS = {
+    "lane": (0, 2),
+    "jump": (1, 2),
+    "collect": (2, 3),
+    "hit": (3, 1),
+    "clear": (3, 1),
+}
+
+
+def pre_init():
+    # Before pygame.init(), so the mixer opens with a short buffer
+    try:
+        pygame.mixer.pre_init(FREQUENCY, -16, 2, BUFFER)
+    except (NotImplementedError, pygame.error):
+        pass  # pygame built without its mixer
+
+
+class Audio:
+    def __init__(self, sound_dir, volume=1.0, music_volume=0.6, muted=False):
+        self.sound_dir = sound_dir
+        self.volume = volume
+        self.music_volume = music_volume
+        self.muted = muted
+        self.sounds = {}
+        self.enabled = self.open_mixer()
+        self.channels = []
+        self.voices = []  # per channel: (priority, started, name)
+        if self.enabled:
+            pygame.mixer.set_num_channels(max(CHANNELS, pygame.mixer.get_num_channels()))
+            pygame.mixer.set_reserved(CHANNELS)
+            self.channels = [pygame.mixer.Channel(i) for i in range(CHANNELS)]
+            self.voices = [(-1, 0.0, None)] * CHANNELS
+        self.music = None  # track playing or about to
+        self.played = 0
+        self.stolen = 0
+        self.dropped = 0
+
+    def open_mixer(self):
+        try:
+            if not pygame.mixer.get_init():
+                pygame.mixer.init()
+            return bool(pygame.mixer.get_init())
+        except (NotImplementedError, pygame.error) as e:
+            print(f"No audio: {e}")
+            return False
+
+    # -------------------------------
+    # LOADING
+    # -------------------------------
+    def find(self, name):
+        for ext in SOUND_EXTENSIONS:
+            path = os.path.join(self.sound_dir, name + ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def load_steps(self):
+        # Scheduler steps: one sound decoded per step
+        missing = []
+        for name in SOUNDS:
+            path = self.find(name) if self.enabled else None
+            if path is None:
+                missing.append(name)
+            else:
+                try:
+                    sound = pygame.mixer.Sound(path)
+                    sound.set_volume(self.volume)
+                    self.sounds[name] = sound
+                except pygame.error as e:
+                    print(f"Error loading sound {path}: {e}")
+            yield
+        if missing and self.enabled:
+            print(f"Missing sounds in {self.sound_dir}: {', '.join(missing)} "
+                  "(make_placeholder_audio.py writes stand-ins)")
+
+    # -------------------------------
+    # EFFECTS
+    # -------------------------------
+    def play(self, name):
+        sound = self.sounds.get(name)
+        if sound is None or self.muted:
+            return None
+        priority, limit = SOUNDS[name]
+        now = time.perf_counter()
+        busy = [ch.get_busy() for ch in self.channels]
+        same = [i for i, v in enumerate(self.voices) if busy[i] and v[2] == name]
+        if len(same) >= limit:
+            # At its voice limit: restart its own oldest voice
+            i = min(same, key=lambda i: self.voices[i][1])
+        elif not all(busy):
+            i = busy.index(False)
+        else:
+            i = min(range(CHANNELS), key=lambda i: self.voices[i][:2])
+            if self.voices[i][0] > priority:
+                self.dropped += 1
+                return None
+            self.stolen += 1
+        self.channels[i].play(sound)
+        self.voices[i] = (priority, now, name)
+        self.played += 1
+        return self.channels[i]
+
+    # -------------------------------
+    # MUSIC
+    # -------------------------------
+    def want_music(self, path):
+        # True when the track changes; play_music() then switches to it
+        if path == self.music:
+            return False
+        self.music = path
+        return True
+
+    def play_music(self, path):
+        if not self.enabled or path != self.music:
+            return  # gone again before it started
+        if path is None or not os.path.exists(path):
+            if path is not None:
+                print(f"Missing music {path}")
+            pygame.mixer.music.fadeout(MUSIC_FADE_MS)
+            return
+        try:
+            pygame.mixer.music.load(path)  # opens the file, decodes as it plays
+            pygame.mixer.music.set_volume(0 if self.muted else self.music_volume)
+            pygame.mixer.music.play(-1, fade_ms=MUSIC_FADE_MS)
+        except pygame.error as e:
+            print(f"Error playing music {path}: {e}")
+
+    def set_muted(self, muted):
+        self.muted = muted
+        if not self.enabled:
+            return
+        if muted:
+            for ch in self.channels:
+                ch.stop()
+        pygame.mixer.music.set_volume(0 if muted else self.music_volume)
+
+    def stats(self):
+        return {"enabled": self.enabled, "sounds": len(self.sounds),
+                "played": self.played, "stolen": self.stolen, "dropped": self.dropped}
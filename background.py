@@ -0,0 +1,131 @@
+"""Scrolling level background drawn straight into the window.
+
+A level's background images form a ring of tiles: screen column x of a
+layer shows ring column offset + x, wrapping after the last image, so the
+images follow each other without gaps.  Instead of blitting whole images
+every frame, draw() scrolls the window contents with Surface.scroll() and
+only fills in the columns that scrolled into view.  Whatever was drawn on
+top of the background last frame (sprites, HUD) is registered with
+cover() and painted over from the tiles before the scroll.
+
+Offsets are floats, so speeds do not have to be whole pixels per tick.
+Parallax layers are horizontal bands of the ring scrolling at their own
+speed factor; each band scrolls its own part of the window, so more
+layers do not mean more full-screen blits.
+"""
+import pygame
+
+BLACK = (0, 0, 0)
+
+
+class Layer:
+    __slots__ = ("band", "speed", "offset", "shown", "view")
+
+    def __init__(self, band, speed):
+        self.band = band
+        self.speed = speed
+        self.offset = 0.0  # ring column at the left edge of the screen
+        self.shown = 0  # whole-pixel offset currently in the window
+        self.view = None  # window subsurface covering the band
+
+
+class ScrollingBackground:
+    def __init__(self, surface):
+        self.surface = surface
+        self.tiles = []
+        self.tile_w = 0
+        self.ring_w = 0
+        self.layers = []
+        self.layer_specs = None
+        self.covered = []
+        self.stale = True
+        self.set_tiles([])
+
+    def set_surface(self, surface):
+        # After a window resize: same tiles, drawn into `surface`
+        self.surface = surface
+        self.set_tiles(self.tiles, self.layer_specs)
+
+    def set_tiles(self, tiles, layers=None):
+        # tiles: same-sized surfaces in scroll order.  layers: optional
+        # [(top, bottom, speed factor)] bands; default is one full layer.
+        self.tiles = [t for t in tiles if t is not None]
+        self.tile_w = self.tiles[0].get_width() if self.tiles else 0
+        self.ring_w = self.tile_w * len(self.tiles)
+        self.layer_specs = layers
+        w, h = self.surface.get_size()
+        self.layers = [Layer(pygame.Rect(0, top, w, bottom - top), speed)
+                       for top, bottom, speed in (layers or [(0, h, 1.0)])]
+        self.covered = []
+        self.stale = True
+
+    def update(self, speed):
+        # One tick: everything moves `speed` pixels times the layer factor
+        for layer in self.layers:
+            layer.offset += speed * layer.speed
+            if self.ring_w and layer.offset >= self.ring_w:
+                layer.offset -= self.ring_w
+                layer.shown -= self.ring_w
+
+    def cover(self, rect):
+        # Something was drawn over the background inside `rect`
+        self.covered.append(rect)
+
+    def cover_all(self, rects):
+        self.covered.extend(rects)
+
+    def blit_span(self, dest_x, y, h, src_x, w):
+        # Copies ring columns [src_x, src_x + w) to the window at dest_x
+        if not self.tiles:
+            self.surface.fill(BLACK, (dest_x, y, w, h))
+            return
+        tiles, tile_w, blit = self.tiles, self.tile_w, self.surface.blit
+        src_x %= self.ring_w
+        while w > 0:
+            tx = src_x % tile_w
+            n = min(w, tile_w - tx)
+            blit(tiles[src_x // tile_w], (dest_x, y), (tx, y, n, h))
+            dest_x += n
+            src_x = (src_x + n) % self.ring_w
+            w -= n
+
+    def restore(self, rect):
+        # Paints the background back under `rect` as it is currently shown
+        for layer in self.layers:
+            r = layer.band.clip(rect)
+            if r:
+                self.blit_span(r.x, r.y, r.height, layer.shown + r.x, r.width)
+
+    def draw(self, full=False):
+        # full: the window no longer holds last frame's background
+        w = self.surface.get_width()
+        if full or self.stale:
+            for layer in self.layers:
+                layer.shown = int(layer.offset)
+                band = layer.band
+                self.blit_span(0, band.y, band.height, layer.shown, w)
+            self.covered.clear()
+            self.stale = False
+            return
+
+        for rect in self.covered:
+            self.restore(rect)
+        self.covered.clear()
+
+        for layer in self.layers:
+            new = int(layer.offset)
+            dx = new - layer.shown
+            if not dx:
+                continue
+            band = layer.band
+            if layer.view is None:
+                layer.view = self.surface.subsurface(band)
+            if abs(dx) >= w:
+                self.blit_span(0, band.y, band.height, new, w)
+            elif dx > 0:
+                layer.view.scroll(-dx, 0)
+                self.blit_span(w - dx, band.y, band.height, new + w - dx, dx)
+            else:
+                layer.view.scroll(-dx, 0)
+                self.blit_span(0, band.y, band.height, new, -dx)
+            layer.shown = new
@@ -0,0 +1,173 @@
+"""Offline bake step: shrink the source art to the sizes the game draws it at.
+
+    python bake_assets.py            # one file per asset
+    python bake_assets.py --atlas    # one obstacle/player sheet per level
+    python bake_assets.py --jpeg     # opaque backgrounds as JPEG
+
+Writes everything into baked/ together with baked/manifest.json.  main.py
+reads the manifest at startup and loads the small copies directly, so only
+baked/ has to ship with the web build.  Placeholder sounds and music that
+are missing are written too (see make_placeholder_audio.py), unless
+--no-audio is given.
+"""
+import os
+import sys
+import glob
+import json
+import argparse
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import pygame
+
+from assets import scale_image
+from levels import load_levels
+from make_placeholder_audio import write_placeholders
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUT_DIR = os.path.join(ROOT_DIR, "baked")
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# (source pattern, size the game draws it at, keeps alpha)
+# Keep these in step with the scale targets in main.py.
+BAKE_SPECS = [
+    ("BACKGROUNDS/*.png", (900, 700), False),
+    ("player_images/*.png", (90, 90), True),
+    ("puzzle_images/*.png", (90, 90), True),
+    ("obstacles/*/*.png", (140, 140), True),
+    ("final_puzzle.png", (500, 500), True),
+]
+
+LEVEL_DIR = os.path.join(ROOT_DIR, "levels")
+ATLAS_MAX_WIDTH = 1024
+ATLAS_PADDING = 2
+
+
+def asset_key(path):
+    # Manifest keys are repo-relative paths with forward slashes
+    return os.path.relpath(path, ROOT_DIR).replace(os.sep, "/")
+
+
+def atlas_groups():
+    # Sources packed together when --atlas is given: one sheet per level
+    # file with that level's obstacles and player
+    groups = {}
+    for level in load_levels(LEVEL_DIR, ROOT_DIR).values():
+        groups[level.key] = [
+            os.path.join(asset_key(level.obstacle_dir), "*.png"),
+            asset_key(level.player_image),
+        ]
+    return groups
+
+
+def pack_shelves(sizes, max_width=ATLAS_MAX_WIDTH, padding=ATLAS_PADDING):
+    # Simple shelf packer: tallest first, fill rows left to right
+    order = sorted(range(len(sizes)), key=lambda i: -sizes[i][1])
+    rects = [None] * len(sizes)
+    x = y = shelf_h = width = 0
+    for i in order:
+        w, h = sizes[i]
+        if x and x + w > max_width:
+            y += shelf_h + padding
+            x = shelf_h = 0
+        rects[i] = (x, y, w, h)
+        x += w + padding
+        shelf_h = max(shelf_h, h)
+        width = max(width, x - padding)
+    return rects, (width, y + shelf_h)
+
+
+def collect_sources():
+    sources = {}
+    for pattern, size, alpha in BAKE_SPECS:
+        for path in sorted(glob.glob(os.path.join(ROOT_DIR, pattern))):
+            sources[asset_key(path)] = (path, size, alpha)
+    return sources
+
+
+def bake(out_dir=DEFAULT_OUT_DIR, atlas=False, jpeg=False, verbose=True):
+    sources = collect_sources()
+    assets = {}
+    in_bytes = out_bytes = 0
+
+    atlas_members = {}
+    if atlas:
+        for group, patterns in atlas_groups().items():
+            for pattern in patterns:
+                for path in sorted(glob.glob(os.path.join(ROOT_DIR, pattern))):
+                    key = asset_key(path)
+                    if key in sources:
+                        atlas_members.setdefault(group, []).append(key)
+
+    packed = {key for keys in atlas_members.values() for key in keys}
+
+    for key, (path, size, alpha) in sources.items():
+        in_bytes += os.path.getsize(path)
+        if key in packed:
+            continue
+        out_name = key
+        if jpeg and not alpha:
+            out_name = os.path.splitext(key)[0] + ".jpg"
+        out_path = os.path.join(out_dir, out_name)
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        pygame.image.save(scale_image(path, size, alpha), out_path)
+        out_bytes += os.path.getsize(out_path)
+        assets[key] = {"file": out_name, "size": list(size), "alpha": alpha}
+        if verbose:
+            print(f"{key} -> {out_name} {size[0]}x{size[1]}")
+
+    for group, keys in atlas_members.items():
+        images = [scale_image(*sources[key]) for key in keys]
+        rects, sheet_size = pack_shelves([img.get_size() for img in images])
+        sheet = pygame.Surface(sheet_size, pygame.SRCALPHA, 32)
+        for img, rect in zip(images, rects):
+            sheet.blit(img, rect[:2])
+        out_name = f"atlas_{group}.png"
+        out_path = os.path.join(out_dir, out_name)
+        os.makedirs(out_dir, exist_ok=True)
+        pygame.image.save(sheet, out_path)
+        out_bytes += os.path.getsize(out_path)
+        for key, rect in zip(keys, rects):
+            assets[key] = {
+                "atlas": out_name,
+                "rect": list(rect),
+                "size": list(rect[2:]),
+                "alpha": sources[key][2],
+            }
+        if verbose:
+            print(f"{group}: {len(keys)} images -> {out_name} "
+                  f"{sheet_size[0]}x{sheet_size[1]}")
+
+    manifest = {"version": MANIFEST_VERSION, "assets": assets}
+    with open(os.path.join(out_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+    if verbose:
+        print(f"baked {len(sources)} images: "
+              f"{in_bytes / 1e6:.1f} MB -> {out_bytes / 1e6:.1f} MB")
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default=DEFAULT_OUT_DIR,
+                        help="output directory (default: baked/)")
+    parser.add_argument("--atlas", action="store_true",
+                        help="pack each level's obstacles and player into one sheet")
+    parser.add_argument("--jpeg", action="store_true",
+                        help="save art without alpha as JPEG instead of PNG")
+    parser.add_argument("--no-audio", action="store_true",
+                        help="do not write missing placeholder sounds and music")
+    parser.add_argument("-q", "--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.jpeg and not pygame.image.get_extended():
+        parser.error("this pygame build cannot write JPEG")
+    bake(args.out, atlas=args.atlas, jpeg=args.jpeg, verbose=not args.quiet)
+    if not args.no_audio:
+        write_placeholders()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,329 @@
+"""Batch simulator for difficulty balancing.
+
+    python balance.py                                  # every level, 1000 episodes each
+    python balance.py --levels "Level 2" --speed 8 10 12 --every 45 55 65
+    python balance.py --policy dodge random --episodes 5000 --csv balance.csv
+    python balance.py --levels endless --policy dodge --json endless.json
+
+Plays headless episodes of the simulation (sim.py) across every core
+with a ProcessPoolExecutor.  A bot policy drives the
+lane changes and held keys the same way a player's input does.  An
+episode ends at the first hit, when the level is cleared or after
+--max-seconds.  Each combination of level, policy and overrides
+(--speed, --every, --count) plays the same seeds, so configurations are
+compared on identical spawn timelines.
+
+Hits go by the sprites' pixel masks like in the game, so each worker loads
+the art once with pygame on the dummy video driver.  --no-masks tests the
+plain rectangles instead and skips loading the art.  The random policy
+and the percentiles come from benchmark.py, which starts main.py
+headless, so pygame is needed either way.
+
+Results are aggregated per combination: clear and death rates, survival
+time percentiles, pieces collected and where deaths happen, as deaths per
+lane and a heatmap of lane by time bucket.  --csv writes one row per
+combination, --json adds the heatmaps.
+"""
+import os
+import sys
+import csv
+import copy
+import json
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import sim
+from benchmark import InputScript, percentile
+from levels import load_levels
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+LEVEL_DIR = os.path.join(ROOT, "levels")
+
+
+# -------------------------------
+# POLICIES
+# -------------------------------
+# A policy is made once per episode from the episode's seed and called
+# before every tick with the game state; it returns the tick's input as
+# (lane step, held bits).
+class IdlePolicy:
+    def __init__(self, seed):
+        pass
+
+    def __call__(self, state):
+        return 0, 0
+
+
+class RandomPolicy(InputScript):
+    # benchmark's scripted input: a new random action every `interval` ticks
+    def __call__(self, state):
+        return self.frame(state.timer)
+
+
+class DodgePolicy:
+    # A reasonable player: looks `lookahead` ticks ahead and moves to the
+    # neighbouring lane whose next obstacle is furthest away, otherwise
+    # steps towards puzzle pieces.  It only reacts every `reaction` ticks.
+    def __init__(self, seed, lookahead=40, reaction=6):
+        self.lookahead = lookahead
+        self.reaction = reaction
+
+    def gap(self, state, pool, lane, distance):
+        # Screen distance to the nearest entity ahead in `lane`, or None
+        nearest = min((e.x for e in pool.in_lane(lane, state.player_x,
+                                                 sim.PLAYER_WIDTH + distance)),
+                      default=None)
+        if nearest is None:
+            return None
+        return nearest - pool.offset - state.player_x
+
+    def __call__(self, state):
+        if state.timer % self.reaction:
+            return 0, 0
+        distance = int(state.obstacle_speed * self.lookahead)
+        lane = state.lane_index
+        options = [s for s in (0, -1, 1) if 0 <= lane + s < sim.LANE_COUNT]
+
+        def clearance(step):
+            gap = self.gap(state, state.obstacles, lane + step, distance)
+            return distance if gap is None else gap
+
+        if clearance(0) < distance:
+            best = max(options, key=clearance)
+            return best, 0
+        for step in options[1:]:
+            if (clearance(step) == distance
+                    and self.gap(state, state.puzzle_pieces, lane + step, distance) is not None):
+                return step, 0
+        return 0, 0
+
+
+POLICIES = {"idle": IdlePolicy, "random": RandomPolicy, "dodge": DodgePolicy}
+
+
+# -------------------------------
+# EPISODES (run in the workers)
+# -------------------------------
+worker_levels = None
+worker_shapes = {}  # level name -> shapes.Shapes
+
+
+def init_worker(level_dir, root, masks):
+    # Each worker process loads the level files (and art) once
+    global worker_levels, worker_shapes
+    worker_levels = load_levels(level_dir, root)
+    if masks:
+        worker_shapes = load_shapes(worker_levels, root)
+
+
+def load_shapes(levels, root):
+    # The same masks main.py builds, from the same (baked) images
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    from assets import AssetManager
+    from shapes import Shapes, spin_masks, squash_masks, player_mask
+
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))  # converting needs a display format
+    assets = AssetManager(root, threaded=False)
+    assets.load_manifest(os.path.join(root, "baked"))
+    obstacles, players = {}, {}
+    for name, level in levels.items():
+        obstacles[name] = []
+        for path in assets.list(level.obstacle_dir):
+            try:
+                img = assets.get(path, (sim.OBSTACLE_WIDTH, sim.OBSTACLE_HEIGHT))
+            except Exception as e:
+                print(f"Error loading {path}: {e}", file=sys.stderr)
+                continue
+            obstacles[name].append(spin_masks(img))
+        try:
+            img = assets.get(level.player_image, (sim.PLAYER_WIDTH, sim.PLAYER_HEIGHT))
+            players[name] = (player_mask(img), squash_masks(img))
+        except Exception:
+            players[name] = (None, None)
+    shapes = {name: Shapes(obstacles[name], *players[name]) for name in levels}
+    first = next(iter(levels))
+    shapes[sim.ENDLESS] = Shapes([m for name in levels for m in obstacles[name]],
+                                 *players[first])
+    return shapes
+
+
+def configured_levels(levels, level_name, speed, every, count):
+    # A copy of the level table with the overrides applied to one level
+    if level_name == sim.ENDLESS:
+        return levels  # endless mode ramps its own speed and spacing
+    level = copy.copy(levels[level_name])
+    if speed is not None:
+        level.obstacle_speed = speed
+    if every is not None or count is not None:
+        level.spawn_rules = [
+            dict(rule,
+                 every=rule["every"] if every is None else every,
+                 count=rule.get("count", 1) if count is None else count)
+            for rule in level.spawn_rules]
+    levels = dict(levels)
+    levels[level_name] = level
+    return levels
+
+
+def run_episode(levels, level_name, policy_name, seed, max_ticks):
+    # Returns (outcome, ticks survived, pieces collected, death lane or -1)
+    state = sim.GameState(levels, seed)
+    policy = POLICIES[policy_name](seed)
+    sim.start_level(state, level_name)
+    state.shapes = worker_shapes.get(level_name)
+    pieces = 0
+    for _ in range(max_ticks):
+        for event in sim.step(state, policy(state)):
+            if event[0] == "hit":
+                return "died", event[2], pieces, event[3]
+            if event[0] == "collect":
+                pieces += 1
+            elif event[0] == "finish":
+                return "cleared", event[2], pieces, -1
+    return "timeout", state.timer, pieces, -1
+
+
+def run_batch(key, seeds, max_ticks):
+    level_name, policy_name, speed, every, count = key
+    levels = configured_levels(worker_levels, level_name, speed, every, count)
+    return key, [run_episode(levels, level_name, policy_name, seed, max_ticks)
+                 for seed in seeds]
+
+
+# -------------------------------
+# AGGREGATION
+# -------------------------------
+def summarize(key, episodes, bucket_seconds):
+    level_name, policy_name, speed, every, count = key
+    n = len(episodes)
+    survival = sorted(ticks / sim.TICK_RATE for _, ticks, _, _ in episodes)
+    deaths = [0] * sim.LANE_COUNT
+    heatmap = {}  # time bucket -> deaths per lane
+    outcomes = {"cleared": 0, "died": 0, "timeout": 0}
+    for outcome, ticks, _, lane in episodes:
+        outcomes[outcome] += 1
+        if outcome == "died":
+            deaths[lane] += 1
+            bucket = int(ticks / sim.TICK_RATE // bucket_seconds)
+            heatmap.setdefault(bucket, [0] * sim.LANE_COUNT)[lane] += 1
+    return {
+        "level": level_name,
+        "policy": policy_name,
+        "speed": speed,
+        "every": every,
+        "count": count,
+        "episodes": n,
+        "clear_rate": round(outcomes["cleared"] / n, 4),
+        "death_rate": round(outcomes["died"] / n, 4),
+        "timeout_rate": round(outcomes["timeout"] / n, 4),
+        "survival_mean": round(sum(survival) / n, 3),
+        "survival_p10": round(percentile(survival, 10), 3),
+        "survival_p50": round(percentile(survival, 50), 3),
+        "survival_p90": round(percentile(survival, 90), 3),
+        "pieces_mean": round(sum(p for _, _, p, _ in episodes) / n, 3),
+        "deaths_by_lane": deaths,
+        "heatmap_bucket_seconds": bucket_seconds,
+        # rows: time bucket from 0, columns: lanes
+        "heatmap": [heatmap.get(b, [0] * sim.LANE_COUNT)
+                    for b in range(max(heatmap) + 1 if heatmap else 0)],
+    }
+
+
+def write_csv(path, rows):
+    fields = ["level", "policy", "speed", "every", "count", "episodes",
+              "clear_rate", "death_rate", "timeout_rate", "survival_mean",
+              "survival_p10", "survival_p50", "survival_p90", "pieces_mean"]
+    lanes = [f"deaths_lane_{i}" for i in range(sim.LANE_COUNT)]
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(fields + lanes)
+        for r in rows:
+            writer.writerow([r[k] for k in fields] + r["deaths_by_lane"])
+
+
+def print_rows(rows):
+    for r in rows:
+        overrides = ", ".join(f"{k} {r[k]}" for k in ("speed", "every", "count")
+                              if r[k] is not None)
+        print(f"{r['level']} / {r['policy']}" + (f" ({overrides})" if overrides else "")
+              + f": clear {r['clear_rate']:.0%}, died {r['death_rate']:.0%}, "
+              f"survival p10/p50/p90 {r['survival_p10']:.1f}/{r['survival_p50']:.1f}/"
+              f"{r['survival_p90']:.1f} s, pieces {r['pieces_mean']:.2f}, "
+              f"deaths by lane {r['deaths_by_lane']}")
+
+
+def main(argv=None):
+    levels = load_levels(LEVEL_DIR, ROOT)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--levels", nargs="+", default=list(levels), metavar="LEVEL")
+    parser.add_argument("--policy", nargs="+", default=["dodge"], choices=sorted(POLICIES))
+    parser.add_argument("--episodes", type=int, default=1000,
+                        help="episodes per combination (default 1000)")
+    parser.add_argument("--seed", type=int, default=1, help="first episode seed")
+    parser.add_argument("--max-seconds", type=float, default=120,
+                        help="simulated seconds before an episode times out (default 120)")
+    parser.add_argument("--speed", type=int, nargs="+", default=[None],
+                        help="obstacle speeds to sweep (default: the level's)")
+    parser.add_argument("--every", type=int, nargs="+", default=[None],
+                        help="spawn spacings in ticks to sweep (default: the level's)")
+    parser.add_argument("--count", type=int, nargs="+", default=[None],
+                        help="obstacles per spawn to sweep (default: the level's)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="worker processes (default: every core)")
+    parser.add_argument("--batch", type=int, default=50,
+                        help="episodes per task sent to a worker (default 50)")
+    parser.add_argument("--bucket", type=float, default=10,
+                        help="heatmap time bucket in seconds (default 10)")
+    parser.add_argument("--no-masks", action="store_true",
+                        help="test hits on rectangles, without loading any art")
+    parser.add_argument("--csv", help="write one row per combination to this file")
+    parser.add_argument("--json", help="write the results with heatmaps to this file")
+    args = parser.parse_args(argv)
+
+    for name in args.levels:
+        if name not in levels and name != sim.ENDLESS:
+            parser.error(f"unknown level {name!r}")
+
+    keys = []
+    for key in itertools.product(args.levels, args.policy, args.speed,
+                                 args.every, args.count):
+        if key[0] == sim.ENDLESS:
+            key = key[:2] + (None, None, None)  # overrides do not apply
+        if key not in keys:
+            keys.append(key)
+    seeds = range(args.seed, args.seed + args.episodes)
+    max_ticks = int(args.max_seconds * sim.TICK_RATE)
+    results = {key: [] for key in keys}
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                             initargs=(LEVEL_DIR, ROOT, not args.no_masks)) as pool:
+        futures = [pool.submit(run_batch, key, seeds[i:i + args.batch], max_ticks)
+                   for key in keys for i in range(0, len(seeds), args.batch)]
+        for done, future in enumerate(as_completed(futures), 1):
+            key, episodes = future.result()
+            results[key].extend(episodes)
+            print(f"\r{done}/{len(futures)} batches", end="", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    print(file=sys.stderr)
+
+    rows = [summarize(key, results[key], args.bucket) for key in keys]
+    print_rows(rows)
+    total = len(keys) * args.episodes
+    print(f"\n{total} episodes in {elapsed:.1f} s on {args.workers} workers "
+          f"({total / elapsed:.0f} episodes/s)")
+
+    if args.csv:
+        write_csv(args.csv, rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
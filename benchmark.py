@@ -0,0 +1,434 @@
+"""Headless, deterministic benchmark of the gameplay loop.
+
+    python benchmark.py                          # 3000 frames of every level
+    python benchmark.py --frames 600 --json out.json
+    python benchmark.py --save bench_baseline.json
+    python benchmark.py --compare bench_baseline.json --tolerance 0.15
+    python benchmark.py --levels endless         # endless mode from the start
+    python benchmark.py --collision 50 200 1000  # broadphase stress only
+    python benchmark.py --sim-only               # simulation ticks, no drawing
+    python benchmark.py --renderers surface texture --windows 900x700 1800x1400
+    python benchmark.py --renderers texture --windowed   # a real window (GPU)
+
+Runs main.py with SDL's dummy drivers, a seeded game state and a scripted
+input sequence, so every run plays exactly the same frames.  Each frame is
+one simulation tick plus a full draw and present, as fast as possible.
+Reports per-function timings, frames/sec, p50/p99 frame time and memory
+allocation figures.  With --compare the exit status is non-zero when a
+level got slower than the baseline by more than --tolerance.
+
+--renderers and --windows compare display backends (see display.py) and
+window sizes, one process per combination since the display is opened
+when main.py is imported.  The dummy video driver only has SDL's software
+render driver; --windowed opens real windows so the texture backend can
+run on the GPU.
+"""
+import os
+import sys
+import gc
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+
+os.environ["MISSION_EARTH_HEADLESS"] = "1"
+if "--windowed" in sys.argv[1:]:
+    # Has to be known before main.py opens the display
+    os.environ["MISSION_EARTH_WINDOWED"] = "1"
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import main as game
+import sim
+import collision
+from entities import EntityPool
+
+LEVELS = list(game.LEVELS)
+
+# Functions wrapped with timers; nested calls are counted inclusively
+TIMED_FUNCTIONS = {
+    sim: [
+        "tick",
+        "update_player",
+        "spawn_obstacle",
+        "update_obstacles",
+        "update_puzzle_pieces",
+    ],
+    game: [
+        "run_tick",
+        "update_scrolling_background",
+        "draw_level_common",
+        "draw_scrolling_background",
+        "draw_player",
+        "draw_obstacles",
+    ],
+}
+
+ACTION_BITS = {"left": sim.HELD_LEFT, "right": sim.HELD_RIGHT, "jump": sim.HELD_JUMP}
+
+
+class InputScript:
+    # Every `interval` frames picks a new action from its own seeded RNG,
+    # so the input does not depend on how the game uses its RNG.  frame()
+    # returns a tick's input as (lane step, held bits), like a recording.
+    def __init__(self, seed, interval=20):
+        self.rng = random.Random(seed)
+        self.interval = interval
+        self.held = 0
+
+    def frame(self, n):
+        if n % self.interval:
+            self.held &= ~sim.HELD_JUMP
+            return 0, self.held
+        action = self.rng.choice(["up", "down", "left", "right", "jump", "idle"])
+        self.held = ACTION_BITS.get(action, 0)
+        return {"up": -1, "down": 1}.get(action, 0), self.held
+
+
+class Timers:
+    def __init__(self):
+        self.totals = {}
+        self.calls = {}
+        self.originals = {}
+
+    def install(self, module, names):
+        for name in names:
+            fn = getattr(module, name)
+            self.originals[name] = (module, fn)
+            setattr(module, name, self.wrap(name, fn))
+
+    def wrap(self, name, fn):
+        totals, calls = self.totals, self.calls
+        totals[name] = 0.0
+        calls[name] = 0
+        perf = time.perf_counter
+
+        def timed(*args, **kwargs):
+            t = perf()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                totals[name] += perf() - t
+                calls[name] += 1
+        return timed
+
+    def reset(self):
+        for name in self.totals:
+            self.totals[name] = 0.0
+            self.calls[name] = 0
+
+    def uninstall(self):
+        for name, (module, fn) in self.originals.items():
+            setattr(module, name, fn)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    i = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[i]
+
+
+def count_hits(events):
+    return sum(1 for event in events if event[0] == "hit")
+
+
+def play_frames(level, frames, seed):
+    state = game.game_state
+    state.rng.seed(seed)
+    script = InputScript(seed)
+    game.start_level(level)
+    deaths = 0
+    frame_times = []
+    perf = time.perf_counter
+
+    for n in range(frames):
+        t = perf()
+        if game.current_state != level:
+            # A hit restarts the first level and finishing leaves it;
+            # either way keep measuring the level under test
+            game.start_level(level)
+        game.run_tick(*script.frame(n))
+        deaths += count_hits(state.events)
+        game.renderer.begin_frame(level)
+        game.draw_level_common(level)
+        game.renderer.present()
+        frame_times.append(perf() - t)
+    return frame_times, deaths
+
+
+def bench_level(level, frames, seed, timers, alloc_frames):
+    timers.reset()
+    gc.collect()
+    gc_before = [s["collections"] for s in gc.get_stats()]
+    start = time.perf_counter()
+    frame_times, deaths = play_frames(level, frames, seed)
+    elapsed = time.perf_counter() - start
+    gc_after = [s["collections"] for s in gc.get_stats()]
+
+    # Allocation pass is separate: tracemalloc would skew the timings
+    timings = {
+        name: {"total_ms": timers.totals[name] * 1000,
+               "per_call_us": timers.totals[name] / timers.calls[name] * 1e6
+               if timers.calls[name] else 0.0,
+               "calls": timers.calls[name]}
+        for name in timers.totals
+    }
+    tracemalloc.start()
+    alloc_start = tracemalloc.take_snapshot()
+    play_frames(level, alloc_frames, seed)
+    _, peak = tracemalloc.get_traced_memory()
+    growth = sum(stat.size_diff for stat in
+                 tracemalloc.take_snapshot().compare_to(alloc_start, "filename"))
+    tracemalloc.stop()
+
+    frame_times.sort()
+    return {
+        "frames": frames,
+        "fps": frames / elapsed,
+        "p50_ms": percentile(frame_times, 50) * 1000,
+        "p99_ms": percentile(frame_times, 99) * 1000,
+        "max_ms": frame_times[-1] * 1000,
+        "restarts": deaths,
+        "gc_collections": [a - b for a, b in zip(gc_after, gc_before)],
+        "alloc_peak_kib": peak / 1024,
+        "alloc_growth_kib": growth / 1024,
+        "alloc_frames": alloc_frames,
+        "display": game.display.stats(),
+        "window": "x".join(map(str, game.display.window_size)),
+        "functions": timings,
+    }
+
+
+def bench_sim(level, ticks, seed):
+    # The simulation on its own: a fresh GameState, no window, no drawing
+    state = sim.GameState(game.LEVELS, seed)
+    script = InputScript(seed)
+    sim.start_level(state, level)
+    deaths = 0
+    tick_times = []
+    perf = time.perf_counter
+
+    start = perf()
+    for n in range(ticks):
+        t = perf()
+        if state.level != level or state.finished:
+            sim.start_level(state, level)
+        deaths += count_hits(sim.step(state, script.frame(n)))
+        tick_times.append(perf() - t)
+    elapsed = perf() - start
+
+    tick_times.sort()
+    return {
+        "ticks": ticks,
+        "ticks_per_sec": ticks / elapsed,
+        "p50_us": percentile(tick_times, 50) * 1e6,
+        "p99_us": percentile(tick_times, 99) * 1e6,
+        "restarts": deaths,
+    }
+
+
+def bench_collision(per_lane, ticks=500, seed=1):
+    # Same stream of spawns and player positions for every strategy; each
+    # tick scrolls, expires off-screen entities, respawns them and runs
+    # one collision query in the player's lane.  Returns {strategy: (us per
+    # tick, hits found)}; the hit count keeps the query from being skipped
+    lanes = sim.LANE_COUNT
+    w = game.OBSTACLE_WIDTH
+    span = game.WIDTH * 8
+    rng = random.Random(seed)
+    spawns = [(rng.uniform(-w, span), rng.randrange(lanes))
+              for _ in range(per_lane * lanes)]
+    players = [(rng.randrange(lanes), rng.randrange(0, game.WIDTH - 90))
+               for _ in range(ticks)]
+    results = {}
+
+    # Baseline: what the game did before, a scan over every entity
+    items = [[x, lane] for x, lane in spawns]
+    found = 0
+    t = time.perf_counter()
+    for lane, px in players:
+        for item in items:
+            item[0] -= 7
+            if item[0] < -w:
+                item[0] += span
+        hits = [item for item in items
+                if item[1] == lane and item[0] < px + 90 and px < item[0] + w]
+        found += len(hits)
+    results["linear scan"] = time.perf_counter() - t, found
+
+    pool = EntityPool(w, w, lanes, prealloc=len(spawns))
+    for x, lane in spawns:
+        pool.spawn(x, 0, lane, None)
+    found = 0
+    t = time.perf_counter()
+    for lane, px in players:
+        pool.scroll(7)
+        for _ in range(pool.expire(-w)):
+            pool.spawn(span - w, 0, rng.randrange(lanes), None)
+        for _ in pool.in_lane(lane, px, 90):
+            found += 1
+    results["lane index"] = time.perf_counter() - t, found
+
+    if collision.numpy is not None:
+        arrays = collision.LaneArrays(lanes, w, capacity=len(spawns))
+        for x, lane in spawns:
+            arrays.add(x, lane)
+        found = 0
+        t = time.perf_counter()
+        for lane, px in players:
+            arrays.scroll(7)
+            for _ in range(len(arrays.expire(-w))):
+                arrays.add(span - w, rng.randrange(lanes))
+            hits = arrays.query(lane, px, px + 90)
+            found += len(hits)
+        results["numpy batch"] = time.perf_counter() - t, found
+
+    return {name: (secs / ticks * 1e6, found) for name, (secs, found) in results.items()}
+
+
+def bench_displays(args):
+    # Runs the level benchmark in a child process per backend and window size
+    rows = []
+    for backend in args.renderers:
+        for window in args.windows:
+            env = dict(os.environ, MISSION_EARTH_RENDERER=backend, MISSION_EARTH_WINDOW=window)
+            with tempfile.TemporaryDirectory() as tmp:
+                out = os.path.join(tmp, "results.json")
+                cmd = [sys.executable, os.path.abspath(__file__),
+                       "--frames", str(args.frames), "--alloc-frames", "0",
+                       "--seed", str(args.seed), "--json", out, "--levels", *args.levels]
+                if args.windowed:
+                    cmd.append("--windowed")
+                subprocess.run(cmd, env=env, check=True, stdout=subprocess.DEVNULL)
+                with open(out) as f:
+                    results = json.load(f)
+            rows.append({"renderer": backend, "window": window, "levels": results})
+            print_display_row(rows[-1])
+    return rows
+
+
+def print_display_row(row):
+    levels = row["levels"]
+    first = next(iter(levels.values()))
+    driver = first["display"]["driver"]
+    print(f"{first['display']['backend']:<8} {driver:<15} {row['window']:>10}  " + "  ".join(
+        f"{level} {r['fps']:5.0f} fps p50 {r['p50_ms']:5.2f} p99 {r['p99_ms']:5.2f} ms"
+        for level, r in levels.items()))
+
+
+def print_report(results):
+    for level, r in results.items():
+        print(f"\n{level}: {r['frames']} frames, {r['fps']:.0f} fps, "
+              f"p50 {r['p50_ms']:.2f} ms, p99 {r['p99_ms']:.2f} ms, "
+              f"max {r['max_ms']:.2f} ms, restarts {r['restarts']}")
+        print(f"  gc collections (gen0/1/2): {r['gc_collections']}, "
+              f"traced peak {r['alloc_peak_kib']:.0f} KiB, "
+              f"retained {r['alloc_growth_kib']:.0f} KiB "
+              f"over {r['alloc_frames']} frames")
+        funcs = sorted(r["functions"].items(), key=lambda kv: -kv[1]["total_ms"])
+        for name, t in funcs:
+            print(f"  {name:<30} {t['total_ms']:9.1f} ms "
+                  f"{t['per_call_us']:9.1f} us/call {t['calls']:7d} calls")
+
+
+def compare(results, baseline, tolerance):
+    # Compares p50 frame time, which is far less noisy than p99 or max
+    failed = False
+    for level, r in results.items():
+        base = baseline.get(level)
+        if not base:
+            continue
+        change = r["p50_ms"] / base["p50_ms"] - 1 if base["p50_ms"] else 0.0
+        status = "SLOWER" if change > tolerance else "ok"
+        failed |= status != "ok"
+        print(f"{level}: p50 {base['p50_ms']:.2f} -> {r['p50_ms']:.2f} ms "
+              f"({change:+.0%}) {status}")
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=3000)
+    parser.add_argument("--alloc-frames", type=int, default=600,
+                        help="frames to run under tracemalloc (default 600)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--levels", nargs="+", default=LEVELS, metavar="LEVEL")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--save", help="store the results as a baseline")
+    parser.add_argument("--compare", help="baseline file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="allowed p50 slowdown for --compare (default 0.15)")
+    parser.add_argument("--collision", type=int, nargs="+", metavar="PER_LANE",
+                        help="only benchmark the collision broadphase")
+    parser.add_argument("--sim-only", action="store_true",
+                        help="only benchmark simulation ticks (--frames of them)")
+    parser.add_argument("--renderers", nargs="+", choices=game.BACKENDS,
+                        help="compare these display backends")
+    parser.add_argument("--windows", nargs="+", default=["900x700"], metavar="WxH",
+                        help="window sizes for --renderers (default 900x700)")
+    parser.add_argument("--windowed", action="store_true",
+                        help="open real windows instead of the dummy video driver")
+    args = parser.parse_args(argv)
+
+    if args.renderers:
+        rows = bench_displays(args)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(rows, f, indent=1)
+        return 0
+
+    if args.sim_only:
+        results = {level: bench_sim(level, args.frames, args.seed) for level in args.levels}
+        for level, r in results.items():
+            print(f"{level}: {r['ticks']} ticks, {r['ticks_per_sec']:.0f} ticks/s, "
+                  f"p50 {r['p50_us']:.1f} us, p99 {r['p99_us']:.1f} us, "
+                  f"restarts {r['restarts']}")
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=1)
+        return 0
+
+    if args.collision:
+        for per_lane in args.collision:
+            timings = bench_collision(per_lane)
+            print(f"{per_lane} entities per lane: " + ", ".join(
+                f"{name} {us:.1f} us/tick ({hits} hits)"
+                for name, (us, hits) in timings.items()))
+        return 0
+
+    # Everything is decoded up front (the first level too, a hit restarts it,
+    # and endless mode uses every level's art); loading is not measured here
+    game.ensure_loaded("puzzles", *game.LEVELS)
+
+    timers = Timers()
+    for module, names in TIMED_FUNCTIONS.items():
+        timers.install(module, names)
+    results = {}
+    try:
+        for level in args.levels:
+            results[level] = bench_level(level, args.frames, args.seed, timers,
+                                         min(args.frames, args.alloc_frames))
+    finally:
+        timers.uninstall()
+        game.assets.shutdown()
+
+    print(f"Display: {game.display.stats()}, window {game.display.window_size}")
+    print_report(results)
+    for path in (args.json, args.save):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        return 1 if compare(results, baseline, args.tolerance) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""Lane-bucketed broadphase for things that scroll right to left.
+
+Everything in a pool moves at the same speed, so instead of touching every
+entity each tick the index keeps positions in track coordinates and only
+advances a shared scroll offset:  screen_x = x - offset.  Each lane is a
+list kept sorted by x, which makes scrolling O(1), expiry a look at the
+front of each lane and a collision query a bisect in a single lane.
+Nothing is copied per tick: query() walks the lane in place and expire()
+hands what it drops to a callback.  A lane has to stay sorted, so
+remove() cannot swap the last entity into the hole the way a plain pool
+does; it bisects and deletes, shifting the few entities behind it.
+
+LaneArrays is the same idea as NumPy arrays.  Only benchmark.py
+--collision uses it, to compare against LaneIndex with hundreds of
+entities per lane; the game runs on LaneIndex and needs no NumPy.
+"""
+from bisect import bisect_left, bisect_right, insort
+from operator import attrgetter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+track_x = attrgetter("x")
+
+
+class LaneIndex:
+    def __init__(self, lane_count, width):
+        self.lanes = [[] for _ in range(lane_count)]
+        self.width = width
+        self.offset = 0
+
+    def insert(self, e):
+        insort(self.lanes[e.lane], e, key=track_x)
+
+    def remove(self, e):
+        bucket = self.lanes[e.lane]
+        i = bisect_left(bucket, e.x, key=track_x)
+        while bucket[i] is not e:
+            i += 1
+        del bucket[i]
+
+    def scroll(self, dx):
+        self.offset += dx
+
+    def bounds(self, lane, x0, x1):
+        # (lo, hi): lanes[lane][lo:hi] overlap the screen span [x0, x1)
+        bucket = self.lanes[lane]
+        off = self.offset
+        return (bisect_right(bucket, x0 + off - self.width, key=track_x),
+                bisect_left(bucket, x1 + off, key=track_x))
+
+    def query(self, lane, x0, x1):
+        # Those entities, back to front and without copying the lane, so
+        # the caller may remove() the one it was just given
+        lo, hi = self.bounds(lane, x0, x1)
+        bucket = self.lanes[lane]
+        for i in range(hi - 1, lo - 1, -1):
+            yield bucket[i]
+
+    def expire(self, min_x, release=None):
+        # Drops entities whose screen x fell below min_x, handing each to
+        # release(); returns how many went
+        limit = min_x + self.offset
+        gone = 0
+        for bucket in self.lanes:
+            n = 0
+            while n < len(bucket) and bucket[n].x < limit:
+                if release is not None:
+                    release(bucket[n])
+                n += 1
+            if n:
+                del bucket[:n]
+                gone += n
+        return gone
+
+    def clear(self):
+        for bucket in self.lanes:
+            bucket.clear()
+        self.offset = 0
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.lanes)
+
+
+class LaneArrays:
+    # Structure-of-arrays variant: every query is a handful of vectorised
+    # comparisons, so it stays cheap with thousands of entities
+    def __init__(self, lane_count, width, capacity=256):
+        if numpy is None:
+            raise RuntimeError("LaneArrays needs numpy")
+        self.lane_count = lane_count
+        self.width = width
+        self.offset = 0.0
+        self.x = numpy.zeros(capacity)
+        self.lane = numpy.zeros(capacity, dtype=numpy.int8)
+        self.alive = numpy.zeros(capacity, dtype=bool)
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def grow(self):
+        old = len(self.x)
+        self.x = numpy.concatenate([self.x, numpy.zeros(old)])
+        self.lane = numpy.concatenate([self.lane, numpy.zeros(old, dtype=numpy.int8)])
+        self.alive = numpy.concatenate([self.alive, numpy.zeros(old, dtype=bool)])
+        self.free.extend(range(2 * old - 1, old - 1, -1))
+
+    def add(self, screen_x, lane):
+        if not self.free:
+            self.grow()
+        slot = self.free.pop()
+        self.x[slot] = screen_x + self.offset
+        self.lane[slot] = lane
+        self.alive[slot] = True
+        return slot
+
+    def remove(self, slot):
+        self.alive[slot] = False
+        self.free.append(slot)
+
+    def scroll(self, dx):
+        self.offset += dx
+
+    def query(self, lane, x0, x1):
+        off = self.offset
+        hit = (self.alive & (self.lane == lane) &
+               (self.x > x0 + off - self.width) & (self.x < x1 + off))
+        return numpy.flatnonzero(hit)
+
+    def expire(self, min_x):
+        gone = numpy.flatnonzero(self.alive & (self.x < min_x + self.offset))
+        if len(gone):
+            self.alive[gone] = False
+            self.free.extend(gone.tolist())
+        return gone
+
+    def screen_x(self, slots):
+        return self.x[slots] - self.offset
+
+    def clear(self):
+        self.alive[:] = False
+        self.free = list(range(len(self.x) - 1, -1, -1))
+        self.offset = 0.0
+
+    def __len__(self):
+        return int(self.alive.sum())
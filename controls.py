@@ -0,0 +1,202 @@
+"""Player input: keyboard, gamepad and touch turned into game actions.
+
+poll() pumps the pygame event queue once, at the top of the frame.  Events
+that map to a game action are buffered with the time they arrived;
+everything else (button clicks, F-keys, quitting) is handed back for the
+screens to handle.  Each simulation tick then takes its input from
+next_input(): at most one buffered lane change per tick, so a quick double
+tap moves two lanes on two consecutive ticks, plus the held movement
+bits.  Presses are latched until a tick has seen them, so a jump tapped
+within a single frame still counts.
+
+Keys are bound per action by name (pygame.key.name()), which is also how
+bindings are stored in the save file.  Gamepads use the d-pad or left
+stick and the south face button; on touch screens a swipe up or down
+changes lane and a tap jumps.
+
+Every applied press is timed until the frame showing it was presented;
+presented() hands those latencies to the profiler.
+"""
+import time
+from collections import deque
+
+import pygame
+
+from sim import HELD_LEFT, HELD_RIGHT, HELD_JUMP
+
+DEFAULT_BINDINGS = {
+    "up": ["up", "w"],
+    "down": ["down", "s"],
+    "left": ["left", "a"],
+    "right": ["right", "d"],
+    "jump": ["space"],
+}
+LANE_ACTIONS = {"up": -1, "down": 1}
+HELD_ACTIONS = {"left": HELD_LEFT, "right": HELD_RIGHT, "jump": HELD_JUMP}
+
+MAX_BUFFERED = 4  # lane changes queued beyond this are dropped
+STICK_DEADZONE = 0.5
+PAD_JUMP_BUTTONS = (0,)  # south face button (A / Cross)
+SWIPE_DISTANCE = 0.06  # fraction of the screen height
+TAP_TIME = 0.25  # seconds; a shorter touch that did not swipe is a jump
+
+
+class InputHandler:
+    def __init__(self, bindings=None):
+        self.bindings = {}
+        self.keymap = {}
+        self.set_bindings(bindings or DEFAULT_BINDINGS)
+        self.lane_steps = deque()  # (step, time it arrived)
+        self.keys_held = 0
+        self.pad_held = {"hat": 0, "stick": 0, "button": 0}
+        self.stick_lane = 0  # stick direction last turned into a lane change
+        self.latched = 0
+        self.latched_at = None
+        self.touches = {}  # finger id -> [start time, start y, swiped]
+        self.joysticks = {}
+        self.applied = []  # arrival times of presses a tick has used
+
+    # -------------------------------
+    # BINDINGS
+    # -------------------------------
+    def set_bindings(self, bindings):
+        # {action: [key names]}; actions left out keep their defaults
+        self.bindings = {action: list(names) for action, names in DEFAULT_BINDINGS.items()}
+        for action, names in bindings.items():
+            if action in self.bindings:
+                self.bindings[action] = list(names)
+        self.keymap = {}
+        for action, names in self.bindings.items():
+            for name in names:
+                try:
+                    self.keymap[pygame.key.key_code(name)] = action
+                except ValueError:
+                    print(f"Unknown key {name!r} bound to {action}")
+
+    def rebind(self, action, names):
+        self.set_bindings(dict(self.bindings, **{action: names}))
+        return self.bindings
+
+    # -------------------------------
+    # EVENTS
+    # -------------------------------
+    def poll(self):
+        # Pumps the event queue; returns the events that are not game input
+        now = time.perf_counter()
+        rest = []
+        for event in pygame.event.get():
+            if not self.handle(event, now):
+                rest.append(event)
+        return rest
+
+    def handle(self, event, now):
+        # Returns True when the event was game input
+        t = event.type
+        if t == pygame.KEYDOWN or t == pygame.KEYUP:
+            action = self.keymap.get(event.key)
+            if action is None:
+                return False
+            if t == pygame.KEYDOWN:
+                self.press(action, now)
+                self.keys_held |= HELD_ACTIONS.get(action, 0)
+            else:
+                self.keys_held &= ~HELD_ACTIONS.get(action, 0)
+            return True
+
+        if t == pygame.WINDOWFOCUSLOST:
+            # Key-ups go elsewhere while unfocused, nothing should stay held
+            self.keys_held = 0
+            return False
+
+        if t == pygame.JOYDEVICEADDED:
+            pad = pygame.joystick.Joystick(event.device_index)
+            self.joysticks[pad.get_instance_id()] = pad
+        elif t == pygame.JOYDEVICEREMOVED:
+            self.joysticks.pop(event.instance_id, None)
+            self.pad_held = dict.fromkeys(self.pad_held, 0)
+        elif t == pygame.JOYHATMOTION:
+            x, y = event.value
+            if y:
+                self.press("up" if y > 0 else "down", now)
+            self.pad_held["hat"] = HELD_LEFT if x < 0 else HELD_RIGHT if x > 0 else 0
+        elif t == pygame.JOYAXISMOTION:
+            self.stick(event.axis, event.value, now)
+        elif t == pygame.JOYBUTTONDOWN:
+            if event.button in PAD_JUMP_BUTTONS:
+                self.press("jump", now)
+                self.pad_held["button"] = HELD_JUMP
+        elif t == pygame.JOYBUTTONUP:
+            if event.button in PAD_JUMP_BUTTONS:
+                self.pad_held["button"] = 0
+
+        elif t == pygame.FINGERDOWN:
+            self.touches[event.finger_id] = [now, event.y, False]
+        elif t == pygame.FINGERMOTION:
+            touch = self.touches.get(event.finger_id)
+            if touch and not touch[2] and abs(event.y - touch[1]) >= SWIPE_DISTANCE:
+                touch[2] = True
+                self.press("up" if event.y < touch[1] else "down", now)
+        elif t == pygame.FINGERUP:
+            touch = self.touches.pop(event.finger_id, None)
+            if touch and not touch[2] and now - touch[0] <= TAP_TIME:
+                self.press("jump", now)
+        else:
+            return False
+        return True
+
+    def stick(self, axis, value, now):
+        if axis == 0:
+            self.pad_held["stick"] = (HELD_LEFT if value < -STICK_DEADZONE
+                                      else HELD_RIGHT if value > STICK_DEADZONE else 0)
+        elif axis == 1:
+            # One lane change per push, the stick has to come back first
+            lane = -1 if value < -STICK_DEADZONE else 1 if value > STICK_DEADZONE else 0
+            if lane and lane != self.stick_lane:
+                self.press("up" if lane < 0 else "down", now)
+            if lane or abs(value) < STICK_DEADZONE / 2:
+                self.stick_lane = lane
+
+    def press(self, action, now):
+        step = LANE_ACTIONS.get(action)
+        if step:
+            if len(self.lane_steps) < MAX_BUFFERED:
+                self.lane_steps.append((step, now))
+            return
+        self.latched |= HELD_ACTIONS[action]
+        if self.latched_at is None:
+            self.latched_at = now
+
+    # -------------------------------
+    # SIMULATION INPUT
+    # -------------------------------
+    def held(self):
+        bits = self.keys_held
+        for value in self.pad_held.values():
+            bits |= value
+        return bits
+
+    def next_input(self):
+        # (lane step, held bits) for one simulation tick
+        step = 0
+        held = self.held()
+        if self.lane_steps:
+            step, t = self.lane_steps.popleft()
+            self.applied.append(t)
+        if self.latched:
+            held |= self.latched
+            self.applied.append(self.latched_at)
+            self.latched = 0
+            self.latched_at = None
+        return step, held
+
+    def clear(self):
+        # Drops buffered presses, e.g. ones made on a menu
+        self.lane_steps.clear()
+        self.latched = 0
+        self.latched_at = None
+
+    def presented(self, record):
+        # Call after the frame is on screen; record(start) per applied press
+        for t in self.applied:
+            record(t)
+        self.applied.clear()
@@ -0,0 +1,325 @@
+"""Display backends: where frames are drawn and how they reach the screen.
+
+Both backends give the game the same small draw API.  `target` takes
+blit(), blits() and fill() like a pygame.Surface, shapes go through
+draw_rect() and draw_line() below, and present() puts the frame up:
+
+"surface"  pygame.display.set_mode() and software blits into the window
+           surface.  The window keeps what was drawn, so DirtyRenderer and
+           ScrollingBackground only redraw what changed.
+"texture"  pygame._sdl2.video: every surface is uploaded once as a
+           Texture and drawing is Renderer copies, on the GPU when there is
+           one.  SDL's software render driver is the fallback, so it also
+           runs without a GPU.  Nothing is kept between frames (`retained`
+           is False), every frame is drawn in full.  Surfaces that get
+           rendered again as new copies (animation frames) can be named
+           with an `identity` hook so the copy reuses the old texture.
+
+The game always draws in logical pixels and the window can be resized
+(see scaling.py).  At any other size the surfaces drawn are scaled copies
+made once per window size, so nothing is scaled per frame: the texture
+renderer maps logical positions onto the window itself, the surface
+backend draws through a ScaledTarget.  Mouse positions go back the other
+way through mouse_pos() and event_pos().
+
+open_display() picks the backend once at startup and falls back to the
+surface backend when the texture one cannot start.
+"""
+import weakref
+
+import pygame
+
+from scaling import View, Variants, ScaledTarget
+
+BACKENDS = ("surface", "texture")
+
+
+def draw_rect(target, color, rect, border_radius=0):
+    # pygame.draw.rect() for either backend's target
+    if isinstance(target, pygame.Surface):
+        return pygame.draw.rect(target, color, rect, border_radius=border_radius)
+    return target.draw_rect(color, rect, border_radius)
+
+
+def draw_line(target, color, start, end):
+    if isinstance(target, pygame.Surface):
+        return pygame.draw.line(target, color, start, end)
+    return target.draw_line(color, start, end)
+
+
+# -------------------------------
+# SURFACE BACKEND
+# -------------------------------
+class SurfaceDisplay:
+    name = "surface"
+    driver = "software blits"
+
+    def __init__(self, size, window_size=None, title=""):
+        self.size = size
+        self.view = View(size)
+        self.variants = Variants(self.view)
+        pygame.display.set_caption(title)
+        self.screen = None
+        self.target = None
+        self.resize(window_size or size)
+
+    def resize(self, window_size):
+        # Returns True when drawing has to start over at a new scale
+        if self.screen is not None and tuple(window_size) == self.view.window:
+            return False
+        self.screen = pygame.display.set_mode(window_size, pygame.RESIZABLE)
+        self.view.resize(self.screen.get_size())
+        self.variants.clear()
+        self.screen.fill((0, 0, 0))  # the letterbox bars stay black
+        if self.view.scaled:
+            self.target = ScaledTarget(self.screen, self.view, self.variants)
+        elif self.view.frame.size == self.screen.get_size():
+            self.target = self.screen
+        else:
+            # Letterboxed at scale 1: plain blits into the middle of the window
+            self.target = self.screen.subsurface(self.view.frame)
+        return True
+
+    @property
+    def retained(self):
+        # Unscaled, the target is (part of) the window and keeps its pixels
+        return not self.view.scaled
+
+    @property
+    def window_size(self):
+        return self.screen.get_size()
+
+    def mouse_pos(self):
+        return self.view.to_logical(pygame.mouse.get_pos())
+
+    def event_pos(self, event):
+        return self.view.to_logical(event.pos)
+
+    def upload(self, surfaces):
+        pass  # blits read the surfaces directly
+
+    def present(self, rects=None):
+        # rects=None puts up the whole frame
+        if rects is None or self.view.scaled:
+            pygame.display.flip()
+        else:
+            x, y = self.view.frame.topleft
+            pygame.display.update([pygame.Rect(r).move(x, y) for r in rects] if x or y else rects)
+
+    def snapshot(self):
+        return self.screen.subsurface(self.view.frame).copy()
+
+    def stats(self):
+        return {"backend": self.name, "driver": self.driver, **self.variants.stats()}
+
+
+# -------------------------------
+# TEXTURE BACKEND
+# -------------------------------
+class TextureTarget:
+    # Draws surfaces as textures; each surface is uploaded the first time
+    # it is drawn and its texture lives as long as the surface does
+    retained = False
+
+    def __init__(self, renderer, size, view, variants):
+        from pygame._sdl2.video import Texture
+        self.Texture = Texture
+        self.renderer = renderer
+        self.size = tuple(size)
+        self.view = view
+        self.variants = variants  # drawn instead of the surfaces when scaled
+        self.textures = weakref.WeakKeyDictionary()
+        self.shapes = {}  # (color, w, h, radius) -> rounded rect texture
+        # identity(surf) -> (owner, key) or None.  Textures of named
+        # surfaces live as long as the owner does, not the surface
+        self.identity = None
+        self.kept = weakref.WeakKeyDictionary()  # owner -> {key: (texture, offset)}
+        self.uploads = 0
+        self.upload_bytes = 0
+
+    def get_size(self):
+        return self.size
+
+    def get_width(self):
+        return self.size[0]
+
+    def get_height(self):
+        return self.size[1]
+
+    def get_rect(self):
+        return pygame.Rect((0, 0), self.size)
+
+    def texture(self, surf):
+        # Subsurfaces (atlas sprites) are drawn from their sheet's texture
+        sheet = surf.get_abs_parent()
+        tex = self.textures.get(sheet)
+        if tex is None:
+            tex = self.Texture.from_surface(self.renderer, sheet)
+            self.textures[sheet] = tex
+            self.uploads += 1
+            self.upload_bytes += sheet.get_width() * sheet.get_height() * 4
+        return tex, sheet is not surf and surf.get_abs_offset()
+
+    def drawn_texture(self, surf):
+        # The texture `surf` is drawn with: its scaled copy's when scaled,
+        # and one kept from an earlier copy when identity() names it
+        ident = self.identity(surf) if self.identity else None
+        if ident is not None:
+            owner, key = ident
+            kept = self.kept.get(owner)
+            if kept is not None and key in kept:
+                return kept[key]
+        if not self.view.scaled:
+            entry = self.texture(surf)
+        else:
+            entry = self.texture(self.variants.get(surf))
+            if not self.variants.is_final(surf):
+                return entry  # a stand-in, not worth keeping
+        if ident is not None:
+            self.kept.setdefault(owner, {})[key] = entry
+        return entry
+
+    def forget(self):
+        # Kept textures are for the old scale once the window is resized
+        self.kept.clear()
+
+    def upload(self, surfaces):
+        # Ahead of time, so the first frame that shows them does not stall
+        for surf in surfaces:
+            if surf is not None:
+                self.drawn_texture(surf)
+
+    def blit(self, surf, dest, area=None):
+        w, h = surf.get_size()
+        src = pygame.Rect(0, 0, w, h)
+        if area is not None:
+            src = src.clip(area)
+        x, y = dest[0], dest[1]
+        dst = pygame.Rect(x, y, src.width, src.height)
+        tex, offset = self.drawn_texture(surf)
+        if self.view.scaled:
+            # A copy with as many pixels as the window shows, drawn at the
+            # logical position; the renderer does the mapping
+            src = self.view.rect(src)
+        if offset:
+            src.move_ip(offset)
+        tex.draw(srcrect=src, dstrect=dst)
+        return dst
+
+    def blits(self, blit_sequence, doreturn=True):
+        blit = self.blit
+        rects = [blit(*item) for item in blit_sequence]
+        return rects if doreturn else None
+
+    def fill(self, color, rect=None):
+        rect = pygame.Rect(rect) if rect is not None else pygame.Rect((0, 0), self.size)
+        self.renderer.draw_color = pygame.Color(color)
+        self.renderer.fill_rect(rect)
+        return rect
+
+    def draw_rect(self, color, rect, border_radius=0):
+        rect = pygame.Rect(rect)
+        if not rect.width or not rect.height:
+            return rect
+        if not border_radius:
+            return self.fill(color, rect)
+        # Rounded corners are drawn once into a small texture
+        key = (tuple(color), rect.width, rect.height, border_radius)
+        tex = self.shapes.get(key)
+        if tex is None:
+            surf = pygame.Surface(rect.size, pygame.SRCALPHA)
+            pygame.draw.rect(surf, color, surf.get_rect(), border_radius=border_radius)
+            tex = self.Texture.from_surface(self.renderer, surf)
+            self.shapes[key] = tex
+        tex.draw(dstrect=rect)
+        return rect
+
+    def draw_line(self, color, start, end):
+        self.renderer.draw_color = pygame.Color(color)
+        self.renderer.draw_line(start, end)
+        return pygame.Rect(start, (1, 1)).union(pygame.Rect(end, (1, 1)))
+
+
+class TextureDisplay:
+    name = "texture"
+    retained = False
+
+    def __init__(self, size, window_size=None, title="", driver=None):
+        from pygame._sdl2.video import Window, Renderer, get_drivers
+        # convert() needs a display surface; the game draws into its own window
+        pygame.display.set_mode((1, 1), pygame.HIDDEN)
+        self.size = size
+        self.view = View(size)
+        self.variants = Variants(self.view)
+        self.window = Window(title, size=window_size or size, resizable=True)
+        names = [d.name for d in get_drivers()]
+        tried = [driver] if driver else names
+        if "software" in names and "software" not in tried:
+            tried.append("software")
+        self.renderer = None
+        errors = []
+        for name in tried:
+            try:
+                self.renderer = Renderer(self.window, index=names.index(name))
+                self.driver = name
+                break
+            except (ValueError, RuntimeError) as e:  # pygame and _sdl2 errors
+                errors.append(f"{name}: {e}")
+        if self.renderer is None:
+            self.window.destroy()
+            raise pygame.error("no render driver: " + "; ".join(errors))
+        self.renderer.logical_size = size
+        self.view.resize(self.window.size)
+        self.target = TextureTarget(self.renderer, size, self.view, self.variants)
+        self.clear()
+
+    def resize(self, window_size):
+        # SDL already rescales the renderer, only the copies have to follow
+        if not self.view.resize(window_size):
+            return False
+        self.variants.clear()
+        self.target.forget()
+        return True
+
+    @property
+    def window_size(self):
+        return self.window.size
+
+    def mouse_pos(self):
+        return self.view.to_logical(pygame.mouse.get_pos())
+
+    def event_pos(self, event):
+        return event.pos  # SDL already maps mouse events to the logical size
+
+    def upload(self, surfaces):
+        self.target.upload(surfaces)
+
+    def clear(self):
+        self.renderer.draw_color = (0, 0, 0, 255)
+        self.renderer.clear()
+
+    def present(self, rects=None):
+        # Always the whole frame, the next one starts from black
+        self.renderer.present()
+        self.clear()
+
+    def snapshot(self):
+        # Call before present()
+        return self.renderer.to_surface()
+
+    def stats(self):
+        return {"backend": self.name, "driver": self.driver,
+                "textures": len(self.target.textures),
+                "uploads": self.target.uploads,
+                "upload_bytes": self.target.upload_bytes,
+                "kept": sum(len(k) for k in self.target.kept.values()),
+                **self.variants.stats()}
+
+
+def open_display(size, window_size=None, backend="surface", driver=None, title=""):
+    if backend == "texture":
+        try:
+            return TextureDisplay(size, window_size, title, driver)
+        except (ImportError, RuntimeError) as e:
+            print(f"Texture renderer unavailable ({e}), using software blits")
+    return SurfaceDisplay(size, window_size, title)
@@ -0,0 +1,88 @@
+"""Endless mode: obstacle spawns streamed in chunks with a difficulty ramp.
+
+Instead of one timeline compiled up front, EndlessTimeline compiles a
+chunk of CHUNK_TICKS ticks at a time, always CHUNKS_AHEAD ahead of the
+current tick, and drops chunks once they are behind it.  Each chunk gets
+its spawn rules from the difficulty at its start, so the game speeds up
+and gets denser for as long as the run lasts while memory stays at a
+couple of chunks.  It has the same pop_due() as levels.SpawnTimeline, so
+the tick loop does not care which one it is popping from.
+"""
+import math
+import random
+from collections import deque
+
+from levels import compile_rules
+
+TICKS_PER_MINUTE = 60 * 60
+CHUNK_TICKS = 600  # ten seconds at 60 ticks/s
+CHUNKS_AHEAD = 1
+
+# Difficulty ramp, starting out like Level 1 and capped so it stays playable
+BASE_SPEED = 7
+MAX_SPEED = 16
+SPEED_PER_MINUTE = 1.5
+BASE_EVERY = 80
+MIN_EVERY = 28
+EVERY_PER_MINUTE = 8
+PAIRS_AFTER_MINUTES = 2  # from then on some spawns block two lanes at once
+
+
+def speed_at(tick):
+    return min(MAX_SPEED, BASE_SPEED + SPEED_PER_MINUTE * tick / TICKS_PER_MINUTE)
+
+
+def spawn_every_at(tick):
+    return max(MIN_EVERY, int(BASE_EVERY - EVERY_PER_MINUTE * tick / TICKS_PER_MINUTE))
+
+
+class EndlessTimeline:
+    def __init__(self, lane_count, seed, chunk_ticks=CHUNK_TICKS, ahead=CHUNKS_AHEAD):
+        self.lane_count = lane_count
+        self.rng = random.Random(seed)
+        self.chunk_ticks = chunk_ticks
+        self.ahead = ahead
+        self.chunks = deque()  # (start tick, SpawnTimeline)
+        self.next_start = 0
+        self.next_spawn = spawn_every_at(0)  # first spawn one period in
+        self.speed = speed_at(0)
+        self.chunks_made = 0
+        self.chunks_released = 0
+        self.stream(0)
+
+    def chunk_rules(self, start):
+        # Spawn rules for ticks [start, start + chunk_ticks), in chunk-local
+        # ticks.  The single-lane spawns carry on from the previous chunk
+        # so a chunk border never squeezes two spawns together.
+        every = spawn_every_at(start)
+        first = self.next_spawn - start
+        rules = [{"every": every, "start": first, "offset": first}]
+        if start >= PAIRS_AFTER_MINUTES * TICKS_PER_MINUTE and self.lane_count > 2:
+            rules.append({"every": every * 4, "offset": first + every // 2,
+                          "count": self.lane_count - 1})
+        steps = math.ceil((self.chunk_ticks - first) / every)
+        self.next_spawn = start + first + steps * every
+        return rules
+
+    def stream(self, tick):
+        # Release chunks behind the tick, compile the ones ahead of it
+        chunks = self.chunks
+        while chunks and chunks[0][0] + self.chunk_ticks <= tick:
+            chunks.popleft()
+            self.chunks_released += 1
+        while self.next_start <= tick + self.ahead * self.chunk_ticks:
+            start = self.next_start
+            rules = self.chunk_rules(start)
+            chunks.append((start, compile_rules(rules, self.chunk_ticks,
+                                                self.lane_count, self.rng)))
+            self.next_start += self.chunk_ticks
+            self.chunks_made += 1
+
+    def pop_due(self, tick):
+        self.speed = speed_at(tick)
+        self.stream(tick)
+        start, chunk = self.chunks[0]
+        return chunk.pop_due(tick - start)
+
+    def __len__(self):
+        return sum(len(chunk) for _, chunk in self.chunks)
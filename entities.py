@@ -0,0 +1,75 @@
+"""Pooled storage for obstacles and puzzle pieces.
+
+Entities are small __slots__ objects that are recycled through a free list
+instead of allocating a dict and a Rect per spawn.  Live entities sit in a
+collision.LaneIndex, so they are stored per lane in track coordinates:
+entity.x never changes after spawning and the on-screen position is
+entity.x - pool.offset.  Moving the whole pool is a single scroll() call.
+`kind` is whatever the owner uses to tell entities apart (the simulation
+stores a float in [0, 1) the renderer turns into a sprite).
+"""
+from collision import LaneIndex
+
+
+class Entity:
+    __slots__ = ("x", "y", "w", "h", "lane", "kind")
+
+    def __init__(self):
+        self.x = self.y = self.w = self.h = self.lane = 0
+        self.kind = None
+
+
+class EntityPool:
+    def __init__(self, w, h, lane_count, prealloc=16):
+        self.w = w
+        self.h = h
+        self.index = LaneIndex(lane_count, w)
+        self.free = [Entity() for _ in range(prealloc)]
+
+    @property
+    def offset(self):
+        return self.index.offset
+
+    def spawn(self, screen_x, y, lane, kind):
+        e = self.free.pop() if self.free else Entity()
+        e.x = screen_x + self.index.offset
+        e.y, e.w, e.h, e.lane, e.kind = y, self.w, self.h, lane, kind
+        self.index.insert(e)
+        return e
+
+    def release(self, e):
+        e.kind = None
+        self.free.append(e)
+
+    def despawn(self, e):
+        self.index.remove(e)
+        self.release(e)
+
+    def scroll(self, dx):
+        self.index.scroll(dx)
+
+    def expire(self, min_x):
+        # Despawns everything that scrolled past min_x, returns how many
+        return self.index.expire(min_x, self.release)
+
+    def in_lane(self, lane, x, w):
+        # Entities in `lane` overlapping the screen span [x, x + w), back
+        # to front; despawning the current one while iterating is fine
+        return self.index.query(lane, x, x + w)
+
+    def visible(self, x0, x1):
+        for lane in range(len(self.index.lanes)):
+            yield from self.index.query(lane, x0, x1)
+
+    def clear(self):
+        for bucket in self.index.lanes:
+            for e in bucket:
+                self.release(e)
+        self.index.clear()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        for bucket in self.index.lanes:
+            yield from bucket
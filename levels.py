@@ -0,0 +1,131 @@
+"""Level definitions loaded from levels/*.json.
+
+Each file describes one level: its art, speeds, how many puzzle pieces
+clear it and a list of obstacle spawn rules.  When a level starts, its
+rules are compiled into a seeded SpawnTimeline: a flat, tick-sorted list
+of spawn events.  The frame loop then just pops whatever is due, so the
+per-tick cost does not depend on how many or how complex the rules are.
+
+Spawn rule fields (only "every" is required):
+    every   spawn every N ticks
+    offset  tick phase within the period (default 0)
+    start   first tick the rule is active (default 0)
+    end     last tick the rule is active (default: the whole timeline)
+    count   obstacles per spawn, each in a different lane (default 1)
+    lanes   lane indices to choose from (default: all lanes)
+"""
+import os
+import glob
+import json
+import random
+from array import array
+
+LEVEL_FORMAT_VERSION = 1
+DEFAULT_TIMELINE_TICKS = 60 * 60 * 10  # ten minutes at 60 ticks/s, then it loops
+
+
+class LevelDef:
+    def __init__(self, data, root, key):
+        self.key = key  # file name without .json, e.g. "level_1"
+        self.name = data["name"]
+        self.order = data.get("order", 0)
+        self.backgrounds = [os.path.join(root, p) for p in data.get("backgrounds", [])]
+        self.obstacle_dir = os.path.join(root, data["obstacle_dir"])
+        self.player_image = os.path.join(root, data["player_image"])
+        self.obstacle_speed = data.get("obstacle_speed", 7)
+        self.pieces_required = data.get("pieces_required", 3)
+        self.spawn_rules = data.get("spawn", [])
+        self.timeline_ticks = data.get("timeline_ticks", DEFAULT_TIMELINE_TICKS)
+        self.next = data.get("next")
+        # Optional background music, streamed while the level is played
+        self.music = os.path.join(root, data["music"]) if data.get("music") else None
+        # Optional parallax bands: [{"top": y, "bottom": y, "speed": factor}]
+        self.background_layers = [(b["top"], b["bottom"], b.get("speed", 1.0))
+                                  for b in data.get("background_layers", [])]
+
+    def __repr__(self):
+        return f"LevelDef({self.name!r})"
+
+
+def load_levels(level_dir, root):
+    # Returns {name: LevelDef} in play order
+    defs = []
+    for path in sorted(glob.glob(os.path.join(level_dir, "*.json"))):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("version", LEVEL_FORMAT_VERSION) != LEVEL_FORMAT_VERSION:
+                print(f"Skipping {path}: unsupported version {data.get('version')}")
+                continue
+            key = os.path.splitext(os.path.basename(path))[0]
+            defs.append(LevelDef(data, root, key))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading level {path}: {e}")
+    defs.sort(key=lambda d: (d.order, d.name))
+
+    # Without an explicit "next", levels follow each other in order
+    for i, d in enumerate(defs):
+        if d.next is None and i + 1 < len(defs):
+            d.next = defs[i + 1].name
+    return {d.name: d for d in defs}
+
+
+class SpawnTimeline:
+    # Parallel arrays sorted by tick; `lane` and `pick` are decided at
+    # compile time, `pick` in [0, 1) selects the obstacle image
+    def __init__(self, ticks, lanes, picks, length):
+        self.ticks = ticks
+        self.lanes = lanes
+        self.picks = picks
+        self.length = length
+        self.pos = 0
+        self.last_tick = -1
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def reset(self):
+        self.pos = 0
+        self.last_tick = -1
+
+    def pop_due(self, tick):
+        # Yields (lane, pick) for every event due at `tick`
+        local = tick % self.length
+        if local < self.last_tick:
+            self.pos = 0  # wrapped around, start the loop again
+        self.last_tick = local
+        ticks = self.ticks
+        n = len(ticks)
+        while self.pos < n and ticks[self.pos] <= local:
+            i = self.pos
+            self.pos += 1
+            if ticks[i] == local:
+                yield self.lanes[i], self.picks[i]
+
+
+def compile_rules(rules, length, lane_count, rng):
+    # Expands spawn rules over ticks [0, length) into a SpawnTimeline
+    events = []
+    for rule in rules:
+        every = rule["every"]
+        offset = rule.get("offset", 0) % every
+        start = rule.get("start", 0)
+        end = min(rule.get("end", length - 1), length - 1)
+        lanes = rule.get("lanes") or list(range(lane_count))
+        count = min(rule.get("count", 1), len(lanes))
+        first = start + (offset - start) % every
+        for tick in range(first, end + 1, every):
+            for lane in rng.sample(lanes, count):
+                events.append((tick, lane, rng.random()))
+    events.sort(key=lambda ev: ev[0])
+    return SpawnTimeline(
+        array("l", (ev[0] for ev in events)),
+        array("b", (ev[1] for ev in events)),
+        array("d", (ev[2] for ev in events)),
+        length,
+    )
+
+
+def compile_timeline(level, lane_count, seed):
+    return compile_rules(level.spawn_rules, level.timeline_ticks, lane_count,
+                         random.Random(seed))
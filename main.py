@@ -1,26 +1,113 @@
 import os
-import glob
 import pygame
 import sys
-import random
 import math
+import time
 import asyncio
+from collections import OrderedDict
+
+from assets import AssetManager, default_budget
+from scheduler import FrameScheduler
+from text_cache import TextCache
+from animation import AnimationCache, FrameSet, bob_offsets
+from shapes import (Shapes, SPIN, SQUASH, spin_frame, squash_frame, frame_masks,
+                    masks_print, player_mask)
+from renderer import DirtyRenderer
+from display import open_display, draw_rect, BACKENDS
+from profiler import FrameProfiler
+from levels import load_levels
+from background import ScrollingBackground
+from save import SaveStore, default_path
+from recording import Recorder, state_hash
+from controls import InputHandler
+from audio import Audio, SOUNDS, pre_init as audio_pre_init
+from telemetry import Telemetry, open_sink, new_session
+from runtime import IS_BROWSER
+import sim
+from sim import GameState
+
+STARTUP_T0 = time.perf_counter()
+
+# Headless runs (benchmark.py, CI) use SDL's dummy drivers; no window opens
+# unless MISSION_EARTH_WINDOWED=1 (benchmark.py --windowed)
+HEADLESS = os.environ.get("MISSION_EARTH_HEADLESS") == "1"
+if HEADLESS and os.environ.get("MISSION_EARTH_WINDOWED") != "1":
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
 
 # Initializing Pygame and Font system
+audio_pre_init()
 pygame.init()
 pygame.font.init()
 
 # -------------------------------
 # BASIC SETTINGS
 # -------------------------------
-WIDTH = 900
-HEIGHT = 700
+WIDTH = sim.WIDTH
+HEIGHT = sim.HEIGHT
 FPS = 60
-BG_SWITCH_TIME = 300
+TICK_RATE = sim.TICK_RATE  # fixed simulation steps per second
 
-window = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Mission Earth")
-clock = pygame.time.Clock()
+# Progress and settings, read once here and written back by a background
+# job (see save.py).  Headless runs never touch the save file.
+save = SaveStore(None if HEADLESS else default_path())
+save.load()
+
+# -------------------------------
+# DISPLAY
+# -------------------------------
+# Drawing goes through a display backend (see display.py): "surface" blits
+# in software into the window, "texture" draws GPU-side textures with
+# pygame._sdl2 (SDL's software render driver where there is no GPU).  It is
+# picked at startup from MISSION_EARTH_RENDERER or the "renderer" setting;
+# MISSION_EARTH_RENDER_DRIVER picks the SDL render driver.
+#
+# The window can be resized; the game keeps drawing at WIDTH x HEIGHT and
+# is scaled to fit (see scaling.py).  It opens at the size it was left at,
+# or MISSION_EARTH_WINDOW (e.g. 1800x1400).
+RENDER_BACKEND = os.environ.get("MISSION_EARTH_RENDERER") or save.setting("renderer", "surface")
+if RENDER_BACKEND not in BACKENDS:
+    print(f"Unknown renderer {RENDER_BACKEND!r}, using surface")
+    RENDER_BACKEND = "surface"
+WINDOW_SIZE = save.setting("window")
+if os.environ.get("MISSION_EARTH_WINDOW"):
+    WINDOW_SIZE = tuple(int(n) for n in os.environ["MISSION_EARTH_WINDOW"].lower().split("x"))
+
+display = open_display((WIDTH, HEIGHT), WINDOW_SIZE, RENDER_BACKEND,
+                       os.environ.get("MISSION_EARTH_RENDER_DRIVER"), "Mission Earth")
+window = display.target  # what everything draws into
+renderer = DirtyRenderer(display)
+profiler = FrameProfiler()
+scheduler = FrameScheduler(fps=FPS, tick_rate=TICK_RATE, profiler=profiler)
+
+# Keyboard, gamepad and touch input, pumped once at the top of each frame
+# (see controls.py).  Key bindings are kept with the settings.
+controls = InputHandler(save.setting("bindings"))
+
+
+def rebind(action, key_names):
+    save.set_setting("bindings", controls.rebind(action, key_names))
+
+
+# Gameplay telemetry (see telemetry.py): deaths, pickups, level times and
+# frame times, written in batches by a background job.  Off unless asked
+# for: MISSION_EARTH_TELEMETRY or the "telemetry" setting name a folder or
+# an http:// URL, and "1" (or true) means the telemetry/ folder next to
+# the save file.  The browser build never logs.
+TELEMETRY_TARGET = os.environ.get("MISSION_EARTH_TELEMETRY") or save.setting("telemetry")
+if TELEMETRY_TARGET in ("1", True):
+    TELEMETRY_TARGET = os.path.join(os.path.dirname(default_path()), "telemetry")
+if IS_BROWSER or not isinstance(TELEMETRY_TARGET, str):
+    TELEMETRY_TARGET = None
+telemetry_session = new_session()
+telemetry = Telemetry(open_sink(TELEMETRY_TARGET, telemetry_session), telemetry_session)
+
+
+# F3 toggles the performance overlay, F4 dumps the recent frames as a
+# Chrome trace into traces/
+show_perf_overlay = (os.environ.get("MISSION_EARTH_PROFILE") == "1"
+                     or save.setting("perf_overlay", False))
+TRACE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "traces")
 
 # Colors
 WHITE = (255, 255, 255)
@@ -33,6 +120,7 @@ BUTTON_HOVER_COLOR = (100, 200, 80)
 font_large = pygame.font.Font(None, 80)
 font_medium = pygame.font.Font(None, 50)
 font_small = pygame.font.Font(None, 30)
+font_overlay = pygame.font.Font(None, 20)
 
 # -------------------------------
 # GAME STATES
@@ -40,252 +128,302 @@ font_small = pygame.font.Font(None, 30)
 STATE_MENU = "menu"
 STATE_LEVEL_SELECT = "level_select"
 STATE_INSTRUCTIONS = "instructions"
-STATE_LEVEL1 = "Level 1"
-STATE_LEVEL2 = "Level 2"
-STATE_LEVEL3 = "Level 3"
 STATE_FINISH = "finish_screen"
 STATE_WIN = "win"
+STATE_ENDLESS = sim.ENDLESS
+
+# -------------------------------
+# LEVELS
+# -------------------------------
+# Every level is a file in levels/ (see levels.py for the format) and its
+# name doubles as its game state.  Adding a level means adding a file.
+ASSET_ROOT = os.path.dirname(os.path.abspath(__file__))
+LEVEL_DIR = os.path.join(ASSET_ROOT, "levels")
+LEVELS = load_levels(LEVEL_DIR, ASSET_ROOT)
+FIRST_LEVEL = next(iter(LEVELS))
+PLAY_STATES = set(LEVELS) | {STATE_ENDLESS}
 
 current_state = STATE_MENU
-current_level_name = STATE_LEVEL1
+current_level_name = FIRST_LEVEL
 
 # PROGRESS TRACKING
-level_completion_status = {
-    "Level 1": False,
-    "Level 2": False,
-    "Level 3": False
-}
+level_completion_status = {name: save.is_completed(name) for name in LEVELS}
+
+# Everything the rules touch lives in one GameState (see sim.py); this
+# module feeds it input and draws it
+game_state = GameState(LEVELS, profiler=profiler)
+
+# -------------------------------
+# ASSET CACHE
+# -------------------------------
+# Every image goes through one AssetManager, so a surface is decoded and
+# converted once and then reused (e.g. backgrounds on every level restart).
+# bake_assets.py writes copies already scaled to the sizes used below into
+# baked/; when its manifest is present those are loaded instead of the
+# full-size sources.
+#
+# A level's art (obstacles, player, backgrounds) is loaded as a group when
+# the level starts.  Once converted surfaces (animation frames included)
+# go over the budget the levels started longest ago are unloaded again, so
+# a low-memory browser tab only ever holds about the current level.
+# MISSION_EARTH_TEXTURE_MB sets it.
+BAKED_DIR = os.path.join(ASSET_ROOT, "baked")
+ASSET_CACHE_BUDGET = default_budget()  # bytes of converted surfaces and frames
+
+assets = AssetManager(ASSET_ROOT, budget_bytes=ASSET_CACHE_BUDGET)
+assets.load_manifest(BAKED_DIR)
+
+# -------------------------------
+# ANIMATION
+# -------------------------------
+# Obstacles spin, puzzle pieces bob and the player squashes and stretches
+# while jumping.  Frames are rendered once into an AnimationCache (see
+# animation.py) and timed off the simulation tick, so a replay looks like
+# the run it came from.  The frames share the asset cache's budget.
+PUZZLE_BOB = bob_offsets(6, 90)
+
+animations = AnimationCache(assets)
+animations.define("spin", SPIN)  # timing in shapes.py, hits follow the turn
+animations.define("squash", SQUASH)  # hits follow it too, see shapes.py
+
+
+def art_variant(surf, size):
+    # Scaled copies for a resized window: sprites and backgrounds are
+    # decoded again from their files, animation frames are rendered again
+    # from their sprite's copy.  Anything else is smoothscaled.
+    frame = animations.source(surf)
+    if frame is not None:
+        base, transform, anchor, (dx, dy) = frame
+        big = display.variants.get(base)
+        if not display.variants.is_final(base):
+            return False
+        # The small frame is cropped, so cut the same part from the big one
+        frames = FrameSet(big, [transform], anchor)
+        frames.render(0, crop=False)
+        full = frames.frames[0]
+        scale = big.get_width() / base.get_width()
+        bx, by = frames.offsets[0]
+        box = pygame.Rect(round(dx * scale) - bx, round(dy * scale) - by, *size)
+        return full.subsurface(box.clip(full.get_rect())).copy()
+    return assets.variant(surf, size)
+
+
+display.variants.source = art_variant
+
+
+def frame_identity(surf):
+    # A frame rendered again after its set was dropped is a new surface
+    # with the same pixels: named by its sprite and transform, the texture
+    # backend draws it with the texture it already uploaded
+    frame = animations.source(surf)
+    return (frame[0], frame[1:]) if frame is not None else None
+
+
+if display.name == "texture":
+    display.target.identity = frame_identity
+
+# -------------------------------
+# AUDIO
+# -------------------------------
+# Sound effects for what the simulation reports (see handle_sim_event) and
+# a music track per level (its "music" field; endless mode plays the first
+# level's).  Sounds are decoded with the startup assets, music is streamed.
+# F6 mutes everything.
+SOUND_DIR = os.path.join(ASSET_ROOT, "sounds")
+SIM_SOUNDS = {"lane": "lane", "jump": "jump", "collect": "collect",
+              "hit": "hit", "finish": "clear"}
+
+audio = Audio(SOUND_DIR, volume=save.setting("sound_volume", 1.0),
+              music_volume=save.setting("music_volume", 0.6),
+              muted=save.setting("muted", False))
+
+
+def level_music(state):
+    if state == STATE_ENDLESS:
+        state = FIRST_LEVEL
+    return LEVELS[state].music if state in LEVELS else None
+
+
+def follow_music():
+    # The track changes with the state; the file is opened in spare time
+    if audio.want_music(level_music(current_state)):
+        scheduler.defer(audio.play_music, audio.music)
+
+
+def resize_window(size):
+    # Everything that depends on the window size is redone here, once
+    global window
+    if not display.resize(size):
+        return
+    window = display.target
+    background.set_surface(window)
+    assets.release_variants()  # the last size's copies
+    renderer.invalidate()
+    save.set_setting("window", list(display.window_size))
 
 # -------------------------------
 # ASSETS (Backgrounds)
 # -------------------------------
-BACKGROUND_DIR = os.path.join(os.path.dirname(__file__), 'backgrounds')
-LEVEL_BACKGROUNDS = {
-    "Level 1": [
-        os.path.join(BACKGROUND_DIR, "1.png"),
-        os.path.join(BACKGROUND_DIR, "2.png"),
-        os.path.join(BACKGROUND_DIR, "3.png")
-    ],
-    "Level 2": [
-        os.path.join(BACKGROUND_DIR, "4.png"),
-        os.path.join(BACKGROUND_DIR, "5.png"),
-        os.path.join(BACKGROUND_DIR, "6.png")
-    ],
-    "Level 3": [
-        os.path.join(BACKGROUND_DIR, "7.png"),
-        os.path.join(BACKGROUND_DIR, "8.png"),
-        os.path.join(BACKGROUND_DIR, "9.png")
-    ]
-}
+LEVEL_BACKGROUNDS = {name: lvl.backgrounds for name, lvl in LEVELS.items()}
+# Endless mode cycles through every level's backgrounds
+LEVEL_BACKGROUNDS[STATE_ENDLESS] = [p for lvl in LEVELS.values() for p in lvl.backgrounds]
+# Which level's asset group a background belongs to
+BACKGROUND_GROUPS = {p: name for name, lvl in LEVELS.items() for p in lvl.backgrounds}
 
-background_images = []
-bg_x1, bg_x2 = 0, WIDTH
-scroll_speed = 5
-bg_index_left, bg_index_right, bg_timer = 0, 1, 0
+GROUND_TOP = sim.GROUND_Y  # the ground strip below is drawn over the background
+background = ScrollingBackground(window)
 
 # -------------------------------
 # OBSTACLES (from latest.py style)
 # -------------------------------
-obstacles = []
-OBSTACLE_WIDTH = 140
-OBSTACLE_HEIGHT = 140
-level_obstacle_speed = {"Level 1": 7, "Level 2": 10, "Level 3": 13}
-level_obstacle_spawn_rate = {"Level 1": 80, "Level 2": 55, "Level 3": 35}
-level_timer = 0  # used for obstacle spawn timing
+OBSTACLE_WIDTH = sim.OBSTACLE_WIDTH
+OBSTACLE_HEIGHT = sim.OBSTACLE_HEIGHT
+obstacle_images = []  # set in present_level()
+endless_best = save.best_time(STATE_ENDLESS) or 0  # longest endless run, in seconds
+last_clear_time = 0  # seconds the last cleared level took
 
 
-def spawn_obstacle(current_level):
-    lane = random.choice(lane_positions)
-    x = WIDTH + 50
-    rect = pygame.Rect(x, lane, OBSTACLE_WIDTH, OBSTACLE_HEIGHT)
-    
-    # Select an image specific to the current level
-    lvl_images = LEVEL_SPECIFIC_OBSTACLES.get(current_level)
-    img = random.choice(lvl_images)
-    
-    # Store both the rect and the image
-    obstacles.append({"rect": rect, "img": img})
-
-
-def update_obstacles(current_level):
-    speed = level_obstacle_speed[current_level]
-    for obs_data in obstacles[:]:
-        obs_rect = obs_data["rect"]
-        obs_rect.x -= speed
-        
-        if obs_rect.x < -OBSTACLE_WIDTH:
-            obstacles.remove(obs_data)
-            continue
+def pick_image(images, kind):
+    # Entities carry a kind in [0, 1); the sprite is picked from it here
+    return images[int(kind * len(images))]
 
-        player_rect = pygame.Rect(player_x, player_y, player_width, player_height)
-        
-        # Hardcore Logic: Only die if in the same lane
-        if obs_rect.colliderect(player_rect):
-            if obs_rect.y == lane_positions[lane_index]:
-                # This resets the whole game to Level 1
-                start_level("Level 1") 
 
 def draw_obstacles():
-    for obs_data in obstacles:
-        # Drawing the level-specific image at the obstacle's position
-        window.blit(obs_data["img"], (obs_data["rect"].x, obs_data["rect"].y))
+    obstacles = game_state.obstacles
+    off = obstacles.offset
+    tick = game_state.timer
+    # Drawing the level-specific images in one batched call; the rects
+    # tell the background what to paint over next frame
+    blits = []
+    for obs in obstacles.visible(0, WIDTH):
+        i = spin_frame(tick, obs.kind)
+        surf, (dx, dy) = animations.frame(pick_image(obstacle_images, obs.kind), "spin", i)
+        blits.append((surf, (obs.x - off + dx, obs.y + dy)))
+    background.cover_all(window.blits(blits))
 
 # -------------------------------
 # PUZZLE PIECES
 # -------------------------------
 PUZZLE_IMAGE_DIR = os.path.join(os.path.dirname(__file__), "puzzle_images")
 ALL_PUZZLE_IMAGES = []
-for file in sorted(glob.glob(os.path.join(PUZZLE_IMAGE_DIR, "*.png"))):
-    try:
-        img = pygame.image.load(file).convert_alpha()
-        ALL_PUZZLE_IMAGES.append(pygame.transform.scale(img, (90, 90)))
-    except:
-        pass
 
-if not ALL_PUZZLE_IMAGES:
-    surf = pygame.Surface((40, 40), pygame.SRCALPHA)
-    surf.fill((255, 215, 0))
-    ALL_PUZZLE_IMAGES.append(surf)
 
-PUZZLE_SIZE = 80
-puzzle_pieces = []
-puzzles_collected = 0
-PIECES_REQUIRED_TO_FINISH = 3
+def load_puzzle_images():
+    # Generator: yields after each image so startup can spread the work
+    images = []
+    for file in assets.list(PUZZLE_IMAGE_DIR):
+        try:
+            images.append(assets.get(file, (90, 90), group="puzzles"))
+        except:
+            pass
+        yield
 
-# --- FINAL WIN IMAGE ---
-# Replace 'final_puzzle.png' with your actual filename
-WIN_IMAGE_PATH = os.path.join(os.path.dirname(__file__), "final_puzzle.png") 
-win_image = None
+    if not images:
+        surf = pygame.Surface((40, 40), pygame.SRCALPHA)
+        surf.fill((255, 215, 0))
+        images.append(surf)
+    ALL_PUZZLE_IMAGES[:] = images
 
-try:
-    win_image = pygame.image.load(WIN_IMAGE_PATH).convert_alpha()
-    # Scale it to fit a large portion of the screen, e.g., 500x500
-    win_image = pygame.transform.scale(win_image, (500, 500))
-except Exception as e:
-    print(f"Error loading win image: {e}")
+PUZZLE_SIZE = sim.PUZZLE_SIZE
 
 # --- FINAL WIN IMAGE ---
 # Replace 'final_puzzle.png' with your actual filename
 WIN_IMAGE_PATH = os.path.join(os.path.dirname(__file__), "final_puzzle.png") 
 win_image = None
 
-try:
-    win_image = pygame.image.load(WIN_IMAGE_PATH).convert_alpha()
-    # Scale it to fit a large portion of the screen, e.g., 500x500
-    win_image = pygame.transform.scale(win_image, (500, 500))
-except Exception as e:
-    print(f"Error loading win image: {e}")
-
-
 
+def load_win_image():
+    global win_image
+    try:
+        # Scale it to fit a large portion of the screen, e.g., 500x500
+        win_image = assets.get(WIN_IMAGE_PATH, (500, 500), group="win")
+    except Exception as e:
+        print(f"Error loading win image: {e}")
+    yield
 
 
 # --- OBSTACLE ASSETS ---
 # --- IMPROVED OBSTACLE LOADING ---
-OBSTACLE_IMAGE_DIR = os.path.join(os.path.dirname(__file__), "obstacles")
-LEVEL_SPECIFIC_OBSTACLES = {
-    "Level 1": [],
-    "Level 2": [],
-    "Level 3": []
-}
-
-def load_level_obstacles():
-    for lvl in LEVEL_SPECIFIC_OBSTACLES.keys():
-        # This assumes you have subfolders named 'Level 1', 'Level 2', etc.
-        lvl_folder = os.path.join(OBSTACLE_IMAGE_DIR, lvl)
-        if os.path.exists(lvl_folder):
-            for file in glob.glob(os.path.join(lvl_folder, "*.png")):
-                try:
-                    img = pygame.image.load(file).convert_alpha()
-                    img = pygame.transform.scale(img, (OBSTACLE_WIDTH, OBSTACLE_HEIGHT))
-                    LEVEL_SPECIFIC_OBSTACLES[lvl].append(img)
-                except Exception as e:
-                    print(f"Error loading {file}: {e}")
-        
-        # Fallback if no images found for a level
-        if not LEVEL_SPECIFIC_OBSTACLES[lvl]:
-            surf = pygame.Surface((OBSTACLE_WIDTH, OBSTACLE_HEIGHT))
-            surf.fill((200, 50, 50))
-            LEVEL_SPECIFIC_OBSTACLES[lvl].append(surf)
-
-# Call this once during initialization
-load_level_obstacles()
+# Each image's collision masks (one per spin frame, see shapes.py) are
+# built right after it loads, from the spin frames that get drawn, and
+# kept alongside it.  LEVEL_SHAPE_PRINTS fingerprints a level's masks,
+# obstacles then player, for the recordings.
+LEVEL_SPECIFIC_OBSTACLES = {name: [] for name in LEVELS}
+LEVEL_OBSTACLE_MASKS = {name: [] for name in LEVELS}
+LEVEL_SHAPE_PRINTS = {name: 0 for name in LEVELS}
+
+def level_obstacle_files(lvl):
+    return assets.list(LEVELS[lvl].obstacle_dir)
+
+
+def load_level_obstacles(lvl):
+    # Generator: yields after each image so startup can spread the work
+    images = []
+    masks = []
+    crc = 0
+    for file in level_obstacle_files(lvl):
+        try:
+            img = assets.get(file, (OBSTACLE_WIDTH, OBSTACLE_HEIGHT), group=lvl)
+            images.append(img)
+            masks.append(frame_masks(animations.render_all(img, "spin")))
+            crc = masks_print(masks[-1], crc)
+        except Exception as e:
+            print(f"Error loading {file}: {e}")
+        yield
+
+    # Fallback if no images found for a level
+    if not images:
+        surf = pygame.Surface((OBSTACLE_WIDTH, OBSTACLE_HEIGHT), pygame.SRCALPHA)
+        surf.fill((200, 50, 50))
+        images.append(surf)
+        masks.append(frame_masks(animations.render_all(surf, "spin")))
+        crc = masks_print(masks[-1], crc)
+    LEVEL_SPECIFIC_OBSTACLES[lvl] = images
+    LEVEL_OBSTACLE_MASKS[lvl] = masks
+    LEVEL_SHAPE_PRINTS[lvl] = crc
 
 # -------------------------------
 # PLAYER SYSTEM
 # -------------------------------
-player_width, player_height, player_x = 90, 90, 100
+player_width, player_height = sim.PLAYER_WIDTH, sim.PLAYER_HEIGHT
 
-PLAYER_IMAGE_DIR = os.path.join(os.path.dirname(__file__), "player_images")
+LEVEL_PLAYER_IMAGES = {name: None for name in LEVELS}
+LEVEL_PLAYER_MASKS = {name: None for name in LEVELS}
+LEVEL_PLAYER_SQUASH = {name: None for name in LEVELS}  # masks per squash frame
 
-LEVEL_PLAYER_IMAGES = {
-    "Level 1": None,
-    "Level 2": None,
-    "Level 3": None
-}
-
-def load_player_images():
-    level_files = {
-        "Level 1": "player1.png",
-        "Level 2": "player2.png",
-        "Level 3": "player3.png"
-    }
-
-    for lvl, filename in level_files.items():
-        path = os.path.join(PLAYER_IMAGE_DIR, filename)
-        try:
-            img = pygame.image.load(path).convert_alpha()
-            img = pygame.transform.scale(img, (player_width, player_height))
-            LEVEL_PLAYER_IMAGES[lvl] = img
-        except Exception as e:
-            print(f"Error loading {filename}: {e}")
 
-load_player_images()
+def load_player_image(lvl):
+    path = LEVELS[lvl].player_image
+    try:
+        img = assets.get(path, (player_width, player_height), group=lvl)
+        LEVEL_PLAYER_IMAGES[lvl] = img
+        LEVEL_PLAYER_MASKS[lvl] = player_mask(img)
+        LEVEL_PLAYER_SQUASH[lvl] = frame_masks(animations.render_all(img, "squash"))
+        LEVEL_SHAPE_PRINTS[lvl] = masks_print(
+            [(LEVEL_PLAYER_MASKS[lvl], (0, 0))] + LEVEL_PLAYER_SQUASH[lvl],
+            LEVEL_SHAPE_PRINTS[lvl])
+    except Exception as e:
+        print(f"Error loading {os.path.basename(path)}: {e}")
+    yield
 
 current_player_image = None
 
-grass_top = int(HEIGHT * 0.45)
-grass_bottom = HEIGHT - player_height - 40
-lane_positions = [
-    int(grass_top + i * ((grass_bottom - grass_top) / 2)) for i in range(3)
-]
-LANE_COUNT = len(lane_positions)
-
-lane_index = 1
-player_y = lane_positions[lane_index]
-player_vel_y, gravity, jump_strength, is_jumping = 0, 1, -15, False
-
-
-def handle_player_movement(keys):
-    global player_x, player_vel_y, is_jumping
-    if keys[pygame.K_LEFT] and player_x > 0:
-        player_x -= 7
-    if keys[pygame.K_RIGHT] and player_x < WIDTH - player_width:
-        player_x += 7
-    if keys[pygame.K_SPACE] and not is_jumping:
-        is_jumping = True
-        player_vel_y = jump_strength
-
 
 def draw_player():
-    global player_y, player_vel_y, is_jumping
-
-    if is_jumping:
-        player_vel_y += gravity
-        player_y += player_vel_y
-        if player_y >= HEIGHT - player_height - 40:
-            player_y = HEIGHT - player_height - 40
-            player_vel_y = 0
-            is_jumping = False
-
-    if current_player_image:
-        window.blit(current_player_image, (player_x, player_y))
+    pos = (game_state.player_x, game_state.player_y)
+    if current_player_image and game_state.is_jumping:
+        i = squash_frame(game_state.player_vel_y)
+        surf, (dx, dy) = animations.frame(current_player_image, "squash", i)
+        rect = window.blit(surf, (pos[0] + dx, pos[1] + dy))
+    elif current_player_image:
+        rect = window.blit(current_player_image, pos)
     else:
-        pygame.draw.rect(
+        rect = draw_rect(
             window,
             (245, 39, 39),
-            (player_x, player_y, player_width, player_height)
+            (*pos, player_width, player_height)
         )
+    background.cover(rect)
 
 
 # -------------------------------
@@ -294,164 +432,440 @@ def draw_player():
 
 
 def load_level_backgrounds(level_name):
-    global background_images, bg_x1, bg_x2, bg_timer, bg_index_left, bg_index_right
     background_images = []
     if level_name in LEVEL_BACKGROUNDS:
         for path in LEVEL_BACKGROUNDS[level_name]:
             try:
-                img = pygame.image.load(path).convert()
                 background_images.append(
-                    pygame.transform.scale(img, (WIDTH, HEIGHT))
+                    assets.get(path, (WIDTH, HEIGHT), alpha=False,
+                               group=BACKGROUND_GROUPS.get(path))
                 )
-            except:
-                pass
-    if not background_images:
-        background_images = [None]
-    bg_x1, bg_x2 = 0, WIDTH
-    bg_index_left = 0
-    bg_index_right = 1 if len(background_images) > 1 else 0
-    bg_timer = 0
+            except Exception as e:
+                print(f"Error loading {path}: {e}")
+    # Parallax bands come from the level file, by default it is one layer
+    level = LEVELS.get(level_name)
+    layers = level.background_layers if level else None
+    background.set_tiles(background_images, layers or [(0, GROUND_TOP, 1.0)])
+
+
+def pump_assets():
+    # Scheduler job: hands finished prefetches over to the cache
+    while True:
+        if not assets.busy():
+            yield False
+            continue
+        assets.pump(budget_ms=max(0.0, scheduler.remaining() * 1000))
+        yield
 
 
-def draw_scrolling_background():
-    global bg_x1, bg_x2, bg_index_left, bg_index_right, bg_timer
-    if not background_images or background_images[0] is None:
-        window.fill(BLACK)
+def warm_animations():
+    # Scheduler job: renders animation frames before they are first shown
+    while True:
+        if not animations.pending():
+            yield False
+            continue
+        animations.warm(budget_ms=max(0.0, scheduler.remaining() * 1000))
+        yield
+
+
+def level_art_bytes(level_name):
+    # Roughly what a level's art takes once converted, before it is loaded
+    pixels = (len(LEVEL_BACKGROUNDS[level_name]) * WIDTH * HEIGHT
+              + len(level_obstacle_files(level_name)) * OBSTACLE_WIDTH * OBSTACLE_HEIGHT
+              + player_width * player_height)
+    return pixels * 4
+
+
+def prefetch_level_art(level_name):
+    # Decoded in the background while the current level is played, so
+    # starting the next one only has to convert what is already decoded.
+    # Not when it would not fit next to the current level: it would only
+    # push that level's frames out while it is being played.
+    if level_name not in LEVELS or level_name in loaded_groups:
+        return
+    if assets.used_bytes + level_art_bytes(level_name) > assets.budget_bytes:
         return
+    level_use_order[level_name] = True  # so it can be unloaded again unplayed
+    for path in LEVEL_BACKGROUNDS[level_name]:
+        assets.prefetch(path, (WIDTH, HEIGHT), alpha=False, group=level_name)
+    for path in level_obstacle_files(level_name):
+        assets.prefetch(path, (OBSTACLE_WIDTH, OBSTACLE_HEIGHT), group=level_name)
+    assets.prefetch(LEVELS[level_name].player_image, (player_width, player_height),
+                    group=level_name)
 
-    bg_timer += 1
-    if bg_timer >= BG_SWITCH_TIME:
-        bg_timer = 0
-        bg_index_left = (bg_index_left + 1) % len(background_images)
-        bg_index_right = (bg_index_right + 1) % len(background_images)
 
-    bg_x1 -= scroll_speed
-    bg_x2 -= scroll_speed
+def warm_level_backgrounds(level_name):
+    for path in LEVEL_BACKGROUNDS.get(level_name, []):
+        try:
+            assets.get(path, (WIDTH, HEIGHT), alpha=False, group=level_name)
+        except Exception:
+            pass  # reported again by load_level_backgrounds
+        yield
+
 
-    if bg_x1 < -WIDTH:
-        bg_x1 = WIDTH
-        bg_index_left = (bg_index_left + 1) % len(background_images)
+def update_scrolling_background():
+    background.update(game_state.scroll_speed)
 
-    if bg_x2 < -WIDTH:
-        bg_x2 = WIDTH
-        bg_index_right = (bg_index_right + 1) % len(background_images)
 
-    window.blit(background_images[bg_index_left], (bg_x1, 0))
-    window.blit(background_images[bg_index_right], (bg_x2, 0))
+def draw_scrolling_background():
+    # Only the newly exposed columns are drawn unless the window was lost
+    background.draw(full=renderer.stale)
 
 # -------------------------------
-# PUZZLE SPAWN / UPDATE
+# LEVEL RESULTS
 # -------------------------------
 
 
-def spawn_single_puzzle_piece(current_level):
-    lane = random.choice(lane_positions)
-    x = random.randint(WIDTH + 400, WIDTH + 1200)
+def complete_level(level_name):
+    # Recorded once when the level is cleared; the save job writes it out
+    global last_clear_time
+    last_clear_time = game_state.timer / TICK_RATE
+    level_completion_status[level_name] = True
+    save.complete(level_name)
+    save.record_time(level_name, last_clear_time)
 
-    if ALL_PUZZLE_IMAGES:
-        img = random.choice(ALL_PUZZLE_IMAGES)
+# -------------------------------
+# STARTUP LOADING
+# -------------------------------
+# Nothing is decoded at import time. main() puts the menu up straight away
+# and stream_startup_assets() loads the rest in each frame's spare time; a level
+# only blocks when it is started before its own assets have arrived.  Later
+# levels are not part of startup, they load (or were prefetched) when started.
+STARTUP_GROUPS = ["puzzles", FIRST_LEVEL, "audio", "win"]
+loaded_groups = set()
+level_use_order = OrderedDict()  # loaded level groups, least recently used first
+startup_steps_done = 0
+startup_steps_total = 0
+
+
+def asset_group_steps(group):
+    if group == "puzzles":
+        yield from load_puzzle_images()
+    elif group == "win":
+        yield from load_win_image()
+    elif group == "audio":
+        yield from audio.load_steps()
     else:
-        img = pygame.Surface((40, 40))
-        img.fill((255, 215, 0))
+        yield from load_level_obstacles(group)
+        yield from load_player_image(group)
+        yield from warm_level_backgrounds(group)
+
+
+def count_startup_steps():
+    total = 0
+    for group in STARTUP_GROUPS:
+        if group == "puzzles":
+            total += len(assets.list(PUZZLE_IMAGE_DIR))
+        elif group == "win":
+            total += 1
+        elif group == "audio":
+            total += len(SOUNDS)
+        else:
+            total += len(level_obstacle_files(group)) + 1 + len(LEVEL_BACKGROUNDS[group])
+    return total
 
-    rect = pygame.Rect(x, lane, PUZZLE_SIZE, PUZZLE_SIZE)
-    puzzle_pieces.append({"rect": rect, "img": img})
 
+def load_group(group):
+    global startup_steps_done
+    for _ in asset_group_steps(group):
+        startup_steps_done += 1
+        yield
+    loaded_groups.add(group)
 
-def update_puzzle_pieces(current_level):
-    global puzzles_collected, current_state, current_level_name
 
-    for piece in puzzle_pieces[:]:
-        piece["rect"].x -= int(scroll_speed * 1.4)
+def ensure_loaded(*groups):
+    # Blocking path, only taken when something is needed before it streamed in
+    for group in groups:
+        if group not in loaded_groups:
+            for _ in load_group(group):
+                pass
 
-        if piece["rect"].x < -PUZZLE_SIZE:
-            puzzle_pieces.remove(piece)
-            spawn_single_puzzle_piece(current_level)
-            continue
 
-        player_rect = pygame.Rect(player_x, player_y, player_width, player_height)
-        
-        # Check for overlap
-        if piece["rect"].colliderect(player_rect):
-            # Only collect if the piece's Y matches the player's lane Y
-            if piece["rect"].y == lane_positions[lane_index]:
-                puzzles_collected += 1
-                puzzle_pieces.remove(piece)
+def unload_level(lvl):
+    # Drops a level's art; playing the level again loads it again
+    images = set(LEVEL_SPECIFIC_OBSTACLES[lvl])
+    images.add(LEVEL_PLAYER_IMAGES[lvl])
+    animations.release(images)
+    LEVEL_SPECIFIC_OBSTACLES[lvl] = []
+    LEVEL_OBSTACLE_MASKS[lvl] = []
+    LEVEL_PLAYER_IMAGES[lvl] = None
+    LEVEL_PLAYER_MASKS[lvl] = None
+    LEVEL_PLAYER_SQUASH[lvl] = None
+    LEVEL_SHAPE_PRINTS[lvl] = 0
+    loaded_groups.discard(lvl)
+    level_use_order.pop(lvl, None)
+    return assets.release_group(lvl)
+
+
+def use_level_art(level_name):
+    # Loads what `level_name` draws and, while over the texture budget,
+    # unloads the levels that were started longest ago.  The level a hit
+    # restarts the run on is kept too: loading it inside the tick that
+    # died would stall the restart.
+    keep = list(dict.fromkeys(level_groups(level_name) + run_levels(level_name)))
+    ensure_loaded(*keep)
+    for group in keep:
+        if group in LEVELS:
+            level_use_order[group] = True
+            level_use_order.move_to_end(group)
+    for lvl in list(level_use_order):
+        if assets.used_bytes <= assets.budget_bytes:
+            break
+        if lvl not in keep:
+            unload_level(lvl)
+    # Still over: frames of sprites not on screen go next
+    animations.trim()
+
+
+def startup_progress():
+    if not startup_steps_total:
+        return 0.0
+    return min(1.0, startup_steps_done / startup_steps_total)
+
+
+def stream_startup_assets():
+    # Scheduler job: one image per step, in whatever time the frame leaves
+    for group in STARTUP_GROUPS:
+        if group in loaded_groups:
+            continue
+        yield from load_group(group)
+    print(f"Assets loaded after {(time.perf_counter() - STARTUP_T0) * 1000:.0f} ms")
 
-                if puzzles_collected >= PIECES_REQUIRED_TO_FINISH:
-                    current_level_name = current_level
-                    current_state = STATE_FINISH
-                    return
-                else:
-                    spawn_single_puzzle_piece(current_level)
 
 # -------------------------------
 # LEVEL CONTROL
 # -------------------------------
 
 
+def level_groups(level_name):
+    # Asset groups a level draws from; endless mode uses every level's art
+    return ["puzzles"] + (list(LEVELS) if level_name == STATE_ENDLESS else [level_name])
+
+
 def start_level(level_name):
-    global current_state, obstacles, puzzle_pieces, puzzles_collected
-    global player_x, lane_index, player_y, scroll_speed, level_timer
-    global current_player_image
+    # The art has to be there before the level is shown, the simulation
+    # itself needs none of it
+    use_level_art(level_name)
+    sim.start_level(game_state, level_name)
+    present_level(level_name)
+
+
+def present_level(level_name):
+    # Points the drawing side at a level the simulation has (re)started,
+    # and the simulation at the masks of what is drawn
+    global current_state, current_player_image, obstacle_images
+    if level_name == STATE_ENDLESS:
+        # Endless runs use every level's art
+        obstacle_images = [img for name in LEVELS for img in LEVEL_SPECIFIC_OBSTACLES[name]]
+        masks = [m for name in LEVELS for m in LEVEL_OBSTACLE_MASKS[name]]
+        player_level = FIRST_LEVEL
+        next_level = None
+    else:
+        obstacle_images = LEVEL_SPECIFIC_OBSTACLES[level_name]
+        masks = LEVEL_OBSTACLE_MASKS[level_name]
+        player_level = level_name
+        next_level = LEVELS[level_name].next
+    current_player_image = LEVEL_PLAYER_IMAGES.get(player_level)
+    game_state.shapes = Shapes(masks, LEVEL_PLAYER_MASKS.get(player_level),
+                               LEVEL_PLAYER_SQUASH.get(player_level))
 
     current_state = level_name
-    level_timer = 0
-    obstacles = []
-    puzzle_pieces = []
-    puzzles_collected = 0
-    player_x = 100
-    lane_index = 1
-    scroll_speed = 5
-    player_y = lane_positions[lane_index]
+    load_level_backgrounds(level_name)
+    # The texture backend gets GPU copies up before the level's first frame
+    display.upload(background.tiles + ALL_PUZZLE_IMAGES + [current_player_image])
+    prefetch_level_art(next_level)
 
-    current_player_image = LEVEL_PLAYER_IMAGES.get(level_name)
+# -------------------------------
+# RECORDING / REPLAY
+# -------------------------------
+# Every run started from the menus seeds the game state and records its input
+# (see recording.py).  F5 saves the current or last run into recordings/
+# and replay.py plays it back; MISSION_EARTH_RECORD=1 saves every run.
+RECORDING_DIR = os.path.join(ASSET_ROOT, "recordings")
+AUTO_SAVE_RECORDINGS = os.environ.get("MISSION_EARTH_RECORD") == "1"
+recorder = None
+last_recording = None
+
+
+def begin_run(level_name, seed=None):
+    global recorder
+    end_run("abandoned")
+    if seed is None:
+        seed = int.from_bytes(os.urandom(4), "little")
+    game_state.rng.seed(seed)
+    controls.clear()
+    telemetry.log("run", level=level_name, seed=seed)
+    start_level(level_name)
+    # After start_level(): the fingerprints need the masks of every level
+    # the run can reach, which it loads
+    recorder = Recorder(seed, level_name, TICK_RATE, shape_prints(level_name))
+
+
+def run_levels(level_name):
+    # Levels a run plays: the one it starts on and, after a hit, the one
+    # the simulation restarts it on (see sim.player_hit)
+    if level_name == STATE_ENDLESS:
+        return list(LEVELS)
+    return list(dict.fromkeys([level_name, game_state.first_level]))
+
+
+def shape_prints(level_name):
+    # {level: LEVEL_SHAPE_PRINTS} of every level whose masks a run hits
+    return {lvl: LEVEL_SHAPE_PRINTS[lvl] for lvl in run_levels(level_name)}
+
+
+def sim_state():
+    # What the recorded state hashes cover
+    return game_state.key()
+
+
+def run_tick(lane_step, held):
+    # One simulation tick from recorded-style input.  main() and replay.py
+    # both go through here, so a replay sees exactly what the player did.
+    if recorder:
+        recorder.record(lane_step, held)
+    with profiler.phase("background.update"):
+        update_scrolling_background()
+    for event in sim.step(game_state, (lane_step, held)):
+        handle_sim_event(event)
+    if recorder:
+        recorder.checkpoint(sim_state)
+
+
+def handle_sim_event(event):
+    global current_state, current_level_name, endless_best
+    kind, level = event[0], event[1]
+    if kind in SIM_SOUNDS:
+        audio.play(SIM_SOUNDS[kind])
+    log_sim_event(event)
+    if kind == "hit" and level == STATE_ENDLESS:
+        if save.record_time(STATE_ENDLESS, event[2] / TICK_RATE, longer_is_better=True):
+            endless_best = save.best_time(STATE_ENDLESS)
+    elif kind == "restart":
+        # A hit: the simulation already restarted, show the level it chose
+        use_level_art(level)
+        present_level(level)
+    elif kind == "finish":
+        complete_level(level)
+        current_level_name = level
+        current_state = STATE_FINISH
+
+
+def log_sim_event(event):
+    kind, level = event[0], event[1]
+    if kind == "spawn":
+        telemetry.log("spawn", level=level, lane=event[2])
+    elif kind == "hit":
+        telemetry.log("death", level=level, seconds=round(event[2] / TICK_RATE, 2),
+                      lane=event[3], x=event[4])
+    elif kind == "collect":
+        telemetry.log("pickup", level=level, count=event[2])
+    elif kind == "finish":
+        telemetry.log("level_time", level=level, seconds=round(event[2] / TICK_RATE, 2))
+
+
+def end_run(outcome):
+    global recorder, last_recording
+    if recorder is None:
+        return None
+    telemetry.log("run_end", level=game_state.level, outcome=outcome,
+                  seconds=round(game_state.timer / TICK_RATE, 2),
+                  pieces=game_state.puzzles_collected)
+    last_recording = recorder.finish(
+        outcome=outcome,
+        state=current_state,
+        ticks=len(recorder.recording),
+        puzzles=game_state.puzzles_collected,
+        hash=state_hash(sim_state()),
+    )
+    recorder = None
+    if AUTO_SAVE_RECORDINGS:
+        save_recording()
+    return last_recording
 
-    load_level_backgrounds(level_name)
 
-    for _ in range(3):
-        spawn_single_puzzle_piece(level_name)
+def save_recording():
+    rec = recorder.recording if recorder else last_recording
+    if rec is None:
+        return None
+    os.makedirs(RECORDING_DIR, exist_ok=True)
+    path = os.path.join(RECORDING_DIR, time.strftime("run-%Y%m%d-%H%M%S.merc"))
+    print(f"Wrote {rec.save(path)}")
+    return path
 
 # -------------------------------
 # SCREEN DRAWING
 # -------------------------------
 finish_continue_button = None
 
+# Rendered text is cached, and screens that never change are composited
+# once into a full-window layer that is blitted in a single call.
+text_cache = TextCache(max_entries=256)
+static_layers = {}
 
-def draw_menu():
-    window.fill(BLACK)
-    t = font_large.render("Mission Earth", True, WHITE)
-    window.blit(t, (WIDTH // 2 - t.get_width() // 2, 100))
-    m = pygame.mouse.get_pos()
-    b1 = pygame.Rect(WIDTH // 2 - 100, 250, 200, 60)
-    b2 = pygame.Rect(WIDTH // 2 - 100, 350, 200, 60)
-    pygame.draw.rect(window,
-                     BUTTON_HOVER_COLOR if b1.collidepoint(m) else BUTTON_COLOR,
-                     b1,
-                     border_radius=10)
-    pygame.draw.rect(window,
-                     BUTTON_HOVER_COLOR if b2.collidepoint(m) else BUTTON_COLOR,
-                     b2,
-                     border_radius=10)
-    window.blit(font_medium.render("Start", True, BLACK),
-                (b1.x + 60, b1.y + 10))
-    window.blit(font_medium.render("Levels", True, BLACK),
-                (b2.x + 50, b2.y + 10))
-    return {"start": b1, "levels": b2}
 
+def render_text(font, text, color):
+    return text_cache.render(font, text, color)
 
-def draw_level_select():
-    window.fill(BLACK)
-    t = font_large.render("Select Level", True, WHITE)
-    window.blit(t, (WIDTH // 2 - t.get_width() // 2, 50))
-    m = pygame.mouse.get_pos()
-    btns = {}
-    for i, lvl in enumerate(["Level 1", "Level 2", "Level 3"]):
-        if lvl == "Level 1":
+
+def static_layer(key, compose):
+    layer = static_layers.get(key)
+    if layer is None:
+        # Keys like ("finish", level, time) replace their older variants,
+        # otherwise every cleared level would keep a full-window surface
+        if isinstance(key, tuple):
+            for old in [k for k in static_layers
+                        if isinstance(k, tuple) and k[0] == key[0]]:
+                del static_layers[old]
+        layer = pygame.Surface((WIDTH, HEIGHT)).convert()
+        layer.fill(BLACK)
+        compose(layer)
+        static_layers[key] = layer
+    return layer
+
+
+def compose_menu(surf):
+    t = render_text(font_large, "Mission Earth", WHITE)
+    surf.blit(t, (WIDTH // 2 - t.get_width() // 2, 100))
+
+
+MENU_BUTTONS = {
+    "start": (pygame.Rect(WIDTH // 2 - 100, 250, 200, 60), "Start", 60),
+    "levels": (pygame.Rect(WIDTH // 2 - 100, 350, 200, 60), "Levels", 50),
+    "endless": (pygame.Rect(WIDTH // 2 - 100, 450, 200, 60), "Endless", 35),
+}
+menu_hover = {}
+
+
+def draw_menu():
+    redraw = renderer.blit_layer("menu", static_layer("menu", compose_menu))
+    m = display.mouse_pos()
+    for name, (b, label, label_x) in MENU_BUTTONS.items():
+        # Buttons are only repainted when their hover state flips
+        hover = b.collidepoint(m)
+        if not redraw and menu_hover.get(name) == hover:
+            continue
+        menu_hover[name] = hover
+        draw_rect(window,
+                  BUTTON_HOVER_COLOR if hover else BUTTON_COLOR,
+                  b,
+                  border_radius=10)
+        window.blit(render_text(font_medium, label, BLACK),
+                    (b.x + label_x, b.y + 10))
+        renderer.mark(b)
+    return {name: b for name, (b, _, _) in MENU_BUTTONS.items()}
+
+
+def level_select_layout():
+    layout = []
+    names = list(LEVELS)
+    # Three levels keep the original 100px rows; more are squeezed in
+    step = min(100, (HEIGHT - 280) // max(1, len(names)))
+    for i, lvl in enumerate(names):
+        if i == 0:
             playable = True
         else:
-            prev_level = "Level " + str(i)
-            playable = level_completion_status.get(prev_level, False)
+            playable = level_completion_status.get(names[i - 1], False)
 
         if level_completion_status[lvl]:
             color = GREEN_COMPLETED
@@ -460,234 +874,408 @@ def draw_level_select():
         else:
             color = (50, 50, 50)
 
-        r = pygame.Rect(WIDTH // 2 - 125, 180 + i * 100, 250, 80)
-        pygame.draw.rect(window, color, r, border_radius=10)
+        r = pygame.Rect(WIDTH // 2 - 125, 180 + i * step, 250, step - 20)
+        layout.append((lvl, r, playable, color))
+    back = pygame.Rect(50, HEIGHT - 80, 150, 50)
+    return layout, back
+
+
+def compose_level_select(surf):
+    t = render_text(font_large, "Select Level", WHITE)
+    surf.blit(t, (WIDTH // 2 - t.get_width() // 2, 50))
+    layout, back = level_select_layout()
+    for lvl, r, playable, color in layout:
+        pygame.draw.rect(surf, color, r, border_radius=10)
         label = lvl + ("" if playable else " (Locked)")
-        txt = font_medium.render(label, True, WHITE)
-        window.blit(
+        txt = render_text(font_medium, label, WHITE)
+        surf.blit(
             txt,
             (r.centerx - txt.get_width() // 2,
              r.centery - txt.get_height() // 2)
         )
-        if playable:
-            btns[lvl] = r
 
-    back = pygame.Rect(50, HEIGHT - 80, 150, 50)
-    pygame.draw.rect(window, BUTTON_COLOR, back, border_radius=5)
-    window.blit(font_small.render("Back", True, BLACK),
-                (back.x + 45, back.y + 12))
+    pygame.draw.rect(surf, BUTTON_COLOR, back, border_radius=5)
+    surf.blit(render_text(font_small, "Back", BLACK),
+              (back.x + 45, back.y + 12))
+
+
+def draw_level_select():
+    # Nothing here moves, so the layer is only rebuilt when progress changes
+    key = ("level_select", tuple(level_completion_status.values()))
+    renderer.blit_layer(key, static_layer(key, compose_level_select))
+    layout, back = level_select_layout()
+    btns = {lvl: r for lvl, r, playable, _ in layout if playable}
     btns["back"] = back
     return btns
 
 
-def draw_instructions():
-    window.fill(BLACK)
-    title = font_large.render("How to Play", True, WHITE)
-    window.blit(
+INSTRUCTION_LINES = [
+    "You are collecting puzzle pieces to save Earth.",
+    "Arrow Up/Down: change lanes.",
+    "Arrow Left/Right: move horizontally.",
+    "Gamepad: stick or d-pad and A. Touch: swipe to change lanes, tap to jump.",
+    "Stars make you go faster",
+    "Avoid pollution blocks and collect puzzle pieces.",
+    "Collect 3 pieces to clear the level."
+]
+INSTRUCTIONS_BACK = pygame.Rect(50, HEIGHT - 80, 150, 50)
+INSTRUCTIONS_CONTINUE = pygame.Rect(WIDTH // 2 - 110, HEIGHT - 90, 220, 60)
+
+
+def compose_instructions(surf):
+    title = render_text(font_large, "How to Play", WHITE)
+    surf.blit(
         title,
         (WIDTH // 2 - title.get_width() // 2, 60)
     )
 
-    lines = [
-        "You are collecting puzzle pieces to save Earth.",
-        "Arrow Up/Down: change lanes.",
-        "Arrow Left/Right: move horizontally.",
-        "Stars make you go faster",
-        "Avoid pollution blocks and collect puzzle pieces.",
-        "Collect 3 pieces to clear the level."
-    ]
     y = 160
-    for line in lines:
-        txt = font_small.render(line, True, WHITE)
-        window.blit(
+    for line in INSTRUCTION_LINES:
+        txt = render_text(font_small, line, WHITE)
+        surf.blit(
             txt,
             (WIDTH // 2 - txt.get_width() // 2, y)
         )
         y += 40
 
-    back = pygame.Rect(50, HEIGHT - 80, 150, 50)
-    pygame.draw.rect(window, BUTTON_COLOR, back, border_radius=5)
-    window.blit(font_small.render("Back", True, BLACK),
-                (back.x + 45, back.y + 12))
+    back = INSTRUCTIONS_BACK
+    pygame.draw.rect(surf, BUTTON_COLOR, back, border_radius=5)
+    surf.blit(render_text(font_small, "Back", BLACK),
+              (back.x + 45, back.y + 12))
 
-    cont = pygame.Rect(WIDTH // 2 - 110, HEIGHT - 90, 220, 60)
-    pygame.draw.rect(window, BUTTON_COLOR, cont, border_radius=10)
-    window.blit(font_small.render("Continue", True, BLACK),
-                (cont.x + 45, cont.y + 20))
+    cont = INSTRUCTIONS_CONTINUE
+    pygame.draw.rect(surf, BUTTON_COLOR, cont, border_radius=10)
+    surf.blit(render_text(font_small, "Continue", BLACK),
+              (cont.x + 45, cont.y + 20))
 
-    return {"back": back, "continue": cont}
 
+def draw_instructions():
+    renderer.blit_layer("instructions",
+                        static_layer("instructions", compose_instructions))
+    return {"back": INSTRUCTIONS_BACK, "continue": INSTRUCTIONS_CONTINUE}
 
-def draw_finish_screen():
-    global finish_continue_button, level_completion_status
-    window.fill(BLACK)
-    t = font_large.render("LEVEL CLEARED!", True, WHITE)
-    window.blit(t, (WIDTH // 2 - t.get_width() // 2, HEIGHT // 2 - 100))
-    finish_continue_button = pygame.Rect(WIDTH // 2 - 110,
-                                         HEIGHT // 2, 220, 60)
-    pygame.draw.rect(window, BUTTON_COLOR, finish_continue_button,
+
+FINISH_CONTINUE = pygame.Rect(WIDTH // 2 - 110, HEIGHT // 2, 220, 60)
+
+
+def format_time(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def compose_finish_screen(surf):
+    t = render_text(font_large, "LEVEL CLEARED!", WHITE)
+    surf.blit(t, (WIDTH // 2 - t.get_width() // 2, HEIGHT // 2 - 100))
+    best = save.best_time(current_level_name) or last_clear_time
+    times = render_text(font_small, f"Time {format_time(last_clear_time)}"
+                                    f"   Best {format_time(best)}", WHITE)
+    surf.blit(times, (WIDTH // 2 - times.get_width() // 2, HEIGHT // 2 - 35))
+    pygame.draw.rect(surf, BUTTON_COLOR, FINISH_CONTINUE,
                      border_radius=10)
-    window.blit(font_medium.render("Continue", True, BLACK),
-                (finish_continue_button.x + 40, finish_continue_button.y + 10))
+    surf.blit(render_text(font_medium, "Continue", BLACK),
+              (FINISH_CONTINUE.x + 40, FINISH_CONTINUE.y + 10))
 
-    if current_level_name in level_completion_status:
-        level_completion_status[current_level_name] = True
 
+def draw_finish_screen():
+    global finish_continue_button
+    # Completion was recorded by complete_level(); this only draws
+    key = ("finish", current_level_name, last_clear_time)
+    renderer.blit_layer(key, static_layer(key, compose_finish_screen))
+    finish_continue_button = FINISH_CONTINUE
     return finish_continue_button
 
 
-def draw_win_screen():
-    window.fill(BLACK)
-    
+def compose_win_screen(surf):
     # Draw the "You Saved Earth" title
-    title = font_large.render("YOU SAVED EARTH!", True, WHITE)
-    window.blit(title, (WIDTH // 2 - title.get_width() // 2, 50))
+    title = render_text(font_large, "YOU SAVED EARTH!", WHITE)
+    surf.blit(title, (WIDTH // 2 - title.get_width() // 2, 50))
     
     # Draw the completed puzzle image if it loaded successfully
     if win_image:
         img_x = WIDTH // 2 - win_image.get_width() // 2
         img_y = HEIGHT // 2 - win_image.get_height() // 2 + 30
-        window.blit(win_image, (img_x, img_y))
+        surf.blit(win_image, (img_x, img_y))
     
     # Draw the sub-text at the bottom
-    sub = font_medium.render("All levels complete. Thanks for playing!", True, WHITE)
-    window.blit(sub, (WIDTH // 2 - sub.get_width() // 2, HEIGHT - 100))
+    sub = render_text(font_medium, "All levels complete. Thanks for playing!", WHITE)
+    surf.blit(sub, (WIDTH // 2 - sub.get_width() // 2, HEIGHT - 100))
+
+
+def draw_win_screen():
+    key = ("win", win_image is not None)
+    renderer.blit_layer(key, static_layer(key, compose_win_screen))
+
+
+LOADING_AREA = pygame.Rect(WIDTH // 2 - 150, HEIGHT - 58, 300, 36)
+loading_bar_shown = None
+
+
+def draw_loading_bar():
+    global loading_bar_shown
+    progress = startup_progress()
+    percent = int(progress * 100)
+    if not renderer.full and percent == loading_bar_shown:
+        return
+    loading_bar_shown = percent
+    renderer.restore(LOADING_AREA)
+
+    bar = pygame.Rect(WIDTH // 2 - 150, HEIGHT - 30, 300, 8)
+    draw_rect(window, (50, 50, 50), bar, border_radius=4)
+    draw_rect(window, BUTTON_COLOR,
+              (bar.x, bar.y, int(bar.width * progress), bar.height),
+              border_radius=4)
+    txt = render_text(font_small, f"Loading {percent}%", WHITE)
+    window.blit(txt, (WIDTH // 2 - txt.get_width() // 2, bar.y - 28))
+
+
+def clear_loading_bar():
+    global loading_bar_shown
+    if loading_bar_shown is not None:
+        loading_bar_shown = None
+        renderer.restore(LOADING_AREA)
 
 
 def draw_level_common(current_level):
-    global level_timer
-    window.fill(BLACK)
-    draw_scrolling_background()
-    draw_player()
-
-    # Obstacles: spawn and update like in latest.py
-    level_timer += 1
-    spawn_rate = level_obstacle_spawn_rate[current_level]
-    if level_timer % spawn_rate == 0:
-        spawn_obstacle(current_level)
-    update_obstacles(current_level)
-    draw_obstacles()
-
-    # Puzzle pieces
-    update_puzzle_pieces(current_level)
-    for piece in puzzle_pieces:
-        window.blit(piece["img"], piece["rect"])
-
-    # ground strip
-    ground_rect = pygame.Rect(0, HEIGHT - 40, WIDTH, 40)
-    pygame.draw.rect(window, (40, 80, 40), ground_rect)
-
-    # back button
-    back = pygame.Rect(50, 20, 150, 50)
-    pygame.draw.rect(window, BUTTON_COLOR, back, border_radius=5)
-    window.blit(font_small.render("Back", True, BLACK),
-                (back.x + 45, back.y + 12))
-
-    info = font_small.render(
-        f"Energy: {puzzles_collected}/{PIECES_REQUIRED_TO_FINISH}",
-        True,
-        WHITE
-    )
-    window.blit(info, (WIDTH - info.get_width() - 20, 20))
+    # Everything moves, so every gameplay frame is presented in full; the
+    # background itself is scrolled in place rather than redrawn
+    renderer.mark_all()
+    with profiler.phase("background.draw"):
+        draw_scrolling_background()
+    with profiler.phase("player.draw"):
+        draw_player()
+    with profiler.phase("obstacles.draw"):
+        draw_obstacles()
+
+    with profiler.phase("puzzles.draw"):
+        pieces = game_state.puzzle_pieces
+        off = pieces.offset
+        tick = game_state.timer
+        bob = PUZZLE_BOB
+        background.cover_all(window.blits(
+            [(pick_image(ALL_PUZZLE_IMAGES, piece.kind),
+              (piece.x - off, piece.y + bob[(tick + piece.x) % len(bob)]))
+             for piece in pieces.visible(0, WIDTH)]
+        ))
+
+    with profiler.phase("hud.draw"):
+        # ground strip
+        ground_rect = pygame.Rect(0, GROUND_TOP, WIDTH, HEIGHT - GROUND_TOP)
+        draw_rect(window, (40, 80, 40), ground_rect)
+
+        # back button
+        back = pygame.Rect(50, 20, 150, 50)
+        draw_rect(window, BUTTON_COLOR, back, border_radius=5)
+        background.cover(back)
+        window.blit(render_text(font_small, "Back", BLACK),
+                    (back.x + 45, back.y + 12))
+
+        # Only rendered again when the count changes
+        collected = game_state.puzzles_collected
+        if current_level == STATE_ENDLESS:
+            text = (f"Energy: {collected}"
+                    f"   Time {format_time(game_state.timer / TICK_RATE)}"
+                    f"   Best {format_time(endless_best)}")
+        else:
+            text = f"Energy: {collected}/{game_state.pieces_required}"
+        info = render_text(font_small, text, WHITE)
+        background.cover(window.blit(info, (WIDTH - info.get_width() - 20, 20)))
 
     return {"back": back}
 
+def draw_perf_overlay():
+    profiler.count("obstacles", len(game_state.obstacles))
+    profiler.count("puzzle pieces", len(game_state.puzzle_pieces))
+    if current_state == STATE_ENDLESS:
+        profiler.count("endless", f"speed {game_state.obstacle_speed:.1f}, "
+                                  f"{len(game_state.timeline.chunks)} chunks")
+    profiler.count("textures",
+                   f"{assets.used_bytes / 2**20:.1f}/{assets.budget_bytes / 2**20:.0f} MB, "
+                   f"{len(assets.cache)} surfaces, levels {len(level_use_order)}")
+    profiler.count("animation frames",  # part of the textures line above
+                   f"{animations.used_bytes / 2**20:.1f} MB, {len(animations.sets)} sets")
+    if display.view.scaled:
+        variants = display.variants.stats()
+        profiler.count("window", f"{display.view.window[0]}x{display.view.window[1]} "
+                                 f"x{variants['scale']}, {variants['variants']} copies, "
+                                 f"{variants['stand_ins']} stand-ins")
+    rect = profiler.draw_overlay(window, font_overlay)
+    renderer.mark(rect)
+    if current_state in PLAY_STATES:
+        background.cover(rect)
+
+
+def export_perf_trace():
+    path = os.path.join(TRACE_DIR, time.strftime("trace-%Y%m%d-%H%M%S.json"))
+    print(f"Wrote {profiler.export_trace(path)}")
+
 # -------------------------------
 # MAIN LOOP
 # -------------------------------
 
 
 async def main():
-    global current_state, player_y, lane_index, current_level_name, level_timer
+    global current_state
+    global startup_steps_total, show_perf_overlay
 
     run = True
     active_buttons = {}
+    first_frame = True
+
+    startup_steps_total = count_startup_steps()
+    loader = scheduler.add_job(stream_startup_assets(), "startup assets")
+    scheduler.add_job(pump_assets(), "asset prefetch")
+    scheduler.add_job(warm_animations(), "animation frames")
+    scheduler.add_job(save.writer(), "save")
+    scheduler.add_job(telemetry.writer(), "telemetry")
 
     while run:
-        clock.tick(FPS)
-        keys = pygame.key.get_pressed()
-        mouse_pos = pygame.mouse.get_pos()
+        ticks = scheduler.begin_frame()
+        profiler.begin_frame()
+        telemetry.frame(scheduler.last_frame_ms)
+        # Input first, so this frame's ticks already see this frame's presses
+        with profiler.phase("input"):
+            events = controls.poll()
+        if current_state not in PLAY_STATES:
+            controls.clear()
         active_buttons = {}
 
-        if current_state == STATE_MENU:
-            active_buttons = draw_menu()
-
-        elif current_state == STATE_LEVEL_SELECT:
-            active_buttons = draw_level_select()
+        # Fixed-rate simulation, however fast we happen to be drawing
+        for _ in range(ticks):
+            if current_state not in PLAY_STATES:
+                break
+            run_tick(*controls.next_input())
 
-        elif current_state == STATE_INSTRUCTIONS:
-            active_buttons = draw_instructions()
+        renderer.begin_frame(current_state)
 
-        elif current_state in [STATE_LEVEL1, STATE_LEVEL2, STATE_LEVEL3]:
+        if current_state in PLAY_STATES:
             active_buttons = draw_level_common(current_state)
-            handle_player_movement(keys)
 
-        elif current_state == STATE_FINISH:
-            draw_finish_screen()
+        else:
+            with profiler.phase("screen.draw"):
+                if current_state == STATE_MENU:
+                    active_buttons = draw_menu()
+
+                elif current_state == STATE_LEVEL_SELECT:
+                    active_buttons = draw_level_select()
+
+                elif current_state == STATE_INSTRUCTIONS:
+                    active_buttons = draw_instructions()
+
+                elif current_state == STATE_FINISH:
+                    draw_finish_screen()
+
+                elif current_state == STATE_WIN:
+                    draw_win_screen()
+
+        if current_state in [STATE_MENU, STATE_LEVEL_SELECT, STATE_INSTRUCTIONS]:
+            if not loader.done:
+                draw_loading_bar()
+            else:
+                clear_loading_bar()
 
-        elif current_state == STATE_WIN:
-            draw_win_screen()
+        if show_perf_overlay:
+            draw_perf_overlay()
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
+        for event in events:
+            # The texture backend's window closing does not quit SDL by itself
+            if event.type in (pygame.QUIT, pygame.WINDOWCLOSE):
                 run = False
 
-            if event.type == pygame.KEYDOWN and current_state in [
-                STATE_LEVEL1, STATE_LEVEL2, STATE_LEVEL3
-            ]:
-                if event.key == pygame.K_UP and lane_index > 0:
-                    lane_index -= 1
-                    player_y = lane_positions[lane_index]
-                elif event.key == pygame.K_DOWN and lane_index < LANE_COUNT - 1:
-                    lane_index += 1
-                    player_y = lane_positions[lane_index]
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                show_perf_overlay = not show_perf_overlay
+                save.set_setting("perf_overlay", show_perf_overlay)
+                renderer.invalidate()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                export_perf_trace()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F5:
+                save_recording()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F6:
+                audio.set_muted(not audio.muted)
+                save.set_setting("muted", audio.muted)
+
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                renderer.invalidate()
+            elif event.type == pygame.WINDOWSIZECHANGED:
+                resize_window((event.x, event.y))
 
             if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                pos = display.event_pos(event)
                 if current_state == STATE_MENU:
                     if active_buttons.get("start") and \
-                            active_buttons["start"].collidepoint(event.pos):
+                            active_buttons["start"].collidepoint(pos):
                         current_state = STATE_INSTRUCTIONS
                     elif active_buttons.get("levels") and \
-                            active_buttons["levels"].collidepoint(event.pos):
+                            active_buttons["levels"].collidepoint(pos):
                         current_state = STATE_LEVEL_SELECT
+                    elif active_buttons.get("endless") and \
+                            active_buttons["endless"].collidepoint(pos):
+                        begin_run(STATE_ENDLESS)
 
                 elif current_state == STATE_LEVEL_SELECT:
                     if active_buttons.get("back") and \
-                            active_buttons["back"].collidepoint(event.pos):
+                            active_buttons["back"].collidepoint(pos):
                         current_state = STATE_MENU
-                    for lvl in ["Level 1", "Level 2", "Level 3"]:
+                    for lvl in LEVELS:
                         if active_buttons.get(lvl) and \
-                                active_buttons[lvl].collidepoint(event.pos):
-                            start_level(lvl)
+                                active_buttons[lvl].collidepoint(pos):
+                            begin_run(lvl)
 
                 elif current_state == STATE_INSTRUCTIONS:
                     if active_buttons.get("back") and \
-                            active_buttons["back"].collidepoint(event.pos):
+                            active_buttons["back"].collidepoint(pos):
                         current_state = STATE_MENU
                     if active_buttons.get("continue") and \
-                            active_buttons["continue"].collidepoint(event.pos):
-                        start_level("Level 1")
+                            active_buttons["continue"].collidepoint(pos):
+                        begin_run(FIRST_LEVEL)
 
-                elif current_state in [STATE_LEVEL1, STATE_LEVEL2, STATE_LEVEL3]:
+                elif current_state == STATE_ENDLESS:
                     if active_buttons.get("back") and \
-                            active_buttons["back"].collidepoint(event.pos):
+                            active_buttons["back"].collidepoint(pos):
+                        current_state = STATE_MENU
+
+                elif current_state in LEVELS:
+                    if active_buttons.get("back") and \
+                            active_buttons["back"].collidepoint(pos):
                         current_state = STATE_LEVEL_SELECT
 
                 elif current_state == STATE_FINISH:
                     if finish_continue_button and \
-                            finish_continue_button.collidepoint(event.pos):
-                        if current_level_name == "Level 1":
-                            start_level("Level 2")
-                        elif current_level_name == "Level 2":
-                            start_level("Level 3")
-                        elif current_level_name == "Level 3":
+                            finish_continue_button.collidepoint(pos):
+                        next_level = LEVELS[current_level_name].next
+                        if next_level in LEVELS:
+                            begin_run(next_level)
+                        else:
+                            ensure_loaded("win")
                             current_state = STATE_WIN
 
                 elif current_state == STATE_WIN:
                     current_state = STATE_MENU
 
-        pygame.display.flip()
-
+        if recorder and current_state not in PLAY_STATES:
+            end_run("finished" if current_state == STATE_FINISH else "left")
+        follow_music()
+
+        with profiler.phase("present"):
+            renderer.present()
+        controls.presented(profiler.record_latency)
+        profiler.end_frame()
+        if first_frame:
+            first_frame = False
+            print(f"First frame after {(time.perf_counter() - STARTUP_T0) * 1000:.0f} ms")
+
+        # Background jobs get the rest of the frame, then asyncio (and the
+        # browser under pygbag) gets control until the next one is due
+        await scheduler.end_frame()
+
+    end_run("quit")
+    print(f"Asset cache: {assets.stats()}")
+    print(f"Animation frames: {animations.stats()}")
+    print(f"Display: {display.stats()}")
+    print(f"Audio: {audio.stats()}")
+    assets.shutdown()
+    save.shutdown()
+    telemetry.shutdown()
+    print(f"Telemetry: {telemetry.stats()}")
     pygame.quit()
     sys.exit()
 
@@ -0,0 +1,121 @@
+"""Writes simple synthesized placeholder audio until real recordings exist.
+
+    python make_placeholder_audio.py           # missing files only
+    python make_placeholder_audio.py --force   # overwrite everything
+
+Sound effects go to sounds/<name>.wav for every name in audio.SOUNDS, and
+one short music loop per level to music/level_<n>.wav, the files the
+level JSONs point at.  Everything is small 8-bit mono WAV built with the
+standard library, so it runs anywhere.  The files are build output, not
+committed: bake_assets.py writes the missing ones along with the baked
+art.  A real sound goes next to a placeholder as <name>.ogg; real music
+goes in the level JSON's "music" field.
+"""
+import os
+import sys
+import math
+import wave
+import random
+import argparse
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+from audio import SOUNDS
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+SOUND_DIR = os.path.join(ROOT_DIR, "sounds")
+MUSIC_DIR = os.path.join(ROOT_DIR, "music")
+RATE = 11025  # plenty for placeholders, and a quarter of CD-quality mono
+
+# name -> [(start Hz, end Hz, seconds)] segments, played one after another
+EFFECTS = {
+    "lane": [(520, 700, 0.06)],
+    "jump": [(300, 620, 0.16)],
+    "collect": [(880, 880, 0.07), (1320, 1320, 0.16)],
+    "hit": [(180, 60, 0.35)],
+    "clear": [(523, 523, 0.12), (659, 659, 0.12), (784, 784, 0.12), (1047, 1047, 0.4)],
+}
+
+# Level music: (root note Hz, beats per minute), one loop of 4 bars each
+MUSIC = {1: (220.0, 112), 2: (196.0, 126), 3: (174.6, 140)}
+CHORDS = [(0, 4, 7), (9, 12, 16), (5, 9, 12), (7, 11, 14)]  # I vi IV V, in semitones
+
+
+def sweep(start, end, seconds, volume=0.5):
+    # A sine gliding from `start` to `end` Hz with a short attack and decay
+    n = int(RATE * seconds)
+    out = []
+    phase = 0.0
+    for i in range(n):
+        t = i / n
+        phase += 2 * math.pi * (start + (end - start) * t) / RATE
+        env = min(1.0, i / (RATE * 0.005)) * (1 - t) ** 1.5
+        out.append(volume * env * math.sin(phase))
+    return out
+
+
+def effect(name):
+    samples = []
+    for start, end, seconds in EFFECTS[name]:
+        samples += sweep(start, end, seconds)
+    if name == "hit":
+        rng = random.Random(1)
+        samples = [s + 0.25 * (1 - i / len(samples)) * rng.uniform(-1, 1)
+                   for i, s in enumerate(samples)]
+    return samples
+
+
+def music(root, bpm):
+    # Arpeggiated chords over a bass note; the loop ends where it starts
+    eighth = 60 / bpm / 2
+    n = int(RATE * eighth)
+    out = []
+    for chord in CHORDS:
+        bass = root / 2 * 2 ** (chord[0] / 12)
+        for step in range(8):
+            note = root * 2 ** ((chord[step % 3] + 12 * (step // 3 % 2)) / 12)
+            for i in range(n):
+                t = i / RATE
+                env = math.exp(-6 * i / n)
+                out.append(0.22 * env * math.sin(2 * math.pi * note * t)
+                           + 0.18 * math.sin(2 * math.pi * bass * (len(out) / RATE)))
+    return out
+
+
+def write_wav(path, samples):
+    # 8-bit WAV samples are unsigned, silence is 128
+    pcm = bytes(128 + round(max(-1.0, min(1.0, s)) * 127) for s in samples)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(1)
+        f.setframerate(RATE)
+        f.writeframes(pcm)
+    print(f"Wrote {os.path.relpath(path, ROOT_DIR)} ({len(samples) / RATE:.1f} s)")
+
+
+def write_placeholders(force=False):
+    # Returns how many files were written
+    written = 0
+    for name in SOUNDS:
+        path = os.path.join(SOUND_DIR, name + ".wav")
+        if force or not os.path.exists(path):
+            write_wav(path, effect(name))
+            written += 1
+    for level, (root, bpm) in MUSIC.items():
+        path = os.path.join(MUSIC_DIR, f"level_{level}.wav")
+        if force or not os.path.exists(path):
+            write_wav(path, music(root, bpm))
+            written += 1
+    return written
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--force", action="store_true", help="overwrite existing files")
+    args = parser.parse_args(argv)
+    write_placeholders(args.force)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
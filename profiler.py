@@ -0,0 +1,189 @@
+"""Per-frame profiling: phase timings, a rolling trace and an overlay.
+
+Wrap a phase of the frame in `with profiler.phase("name"):`.  Every phase
+lands in a rolling buffer that export_trace() writes out as Chrome trace
+JSON (load it in chrome://tracing or https://ui.perfetto.dev), so stutter
+reported by a player can be looked at offline.  draw_overlay() shows FPS,
+a frame-time graph and the slowest phases on top of the game.
+
+record_latency() takes the time an input arrived once the frame showing
+its effect has been presented; the overlay shows that input-to-present
+latency and the trace puts it on its own track.
+"""
+import os
+import json
+import time
+from array import array
+from collections import deque
+
+import pygame
+
+from display import draw_line
+
+perf = time.perf_counter
+TRACE_CATEGORIES = {"frame": "frame", "input latency": "input"}
+
+
+class Phase:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = perf()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, perf())
+
+
+class FrameProfiler:
+    def __init__(self, history=180, trace_events=20000):
+        self.t0 = perf()
+        self.phases = {}
+        self.frame_phases = {}
+        self.phase_avg = {}
+        self.frame_ms = deque(maxlen=history)
+        self.work_ms = deque(maxlen=history)
+        self.latency_ms = deque(maxlen=history)
+        # Ring buffer in flat arrays: recording allocates no containers
+        self.trace_size = trace_events
+        self.trace_names = [None] * trace_events
+        self.trace_start = array("d", bytes(8 * trace_events))
+        self.trace_end = array("d", bytes(8 * trace_events))
+        self.trace_pos = 0
+        self.trace_len = 0
+        self.frame_start = None
+        self.frame_count = 0
+        self.counters = {}
+        self.overlay_surface = None
+
+    # -------------------------------
+    # RECORDING
+    # -------------------------------
+    def phase(self, name):
+        # Phase objects are reused, so instrumenting costs no allocations
+        ph = self.phases.get(name)
+        if ph is None:
+            ph = self.phases[name] = Phase(self, name)
+        return ph
+
+    def record(self, name, start, end):
+        ms = (end - start) * 1000
+        self.frame_phases[name] = self.frame_phases.get(name, 0.0) + ms
+        self.add_trace(name, start, end)
+
+    def add_trace(self, name, start, end):
+        i = self.trace_pos
+        self.trace_names[i] = name
+        self.trace_start[i] = start
+        self.trace_end[i] = end
+        self.trace_pos = (i + 1) % self.trace_size
+        if self.trace_len < self.trace_size:
+            self.trace_len += 1
+
+    def begin_frame(self):
+        now = perf()
+        if self.frame_start is not None:
+            self.frame_ms.append((now - self.frame_start) * 1000)
+        self.frame_start = now
+        self.frame_phases.clear()
+
+    def end_frame(self):
+        # Called once the frame's work is done, before the loop idles
+        end = perf()
+        self.work_ms.append((end - self.frame_start) * 1000)
+        self.add_trace("frame", self.frame_start, end)
+        self.frame_count += 1
+        for name, ms in self.frame_phases.items():
+            avg = self.phase_avg.get(name, ms)
+            self.phase_avg[name] = avg + (ms - avg) * 0.1
+
+    def record_latency(self, start, end=None):
+        end = perf() if end is None else end
+        self.latency_ms.append((end - start) * 1000)
+        self.add_trace("input latency", start, end)
+
+    def count(self, name, value):
+        # Free-form values (entity counts, cache size...) for the overlay
+        self.counters[name] = value
+
+    def fps(self):
+        if not self.frame_ms:
+            return 0.0
+        recent = list(self.frame_ms)[-30:]
+        return 1000 / (sum(recent) / len(recent))
+
+    # -------------------------------
+    # TRACE EXPORT
+    # -------------------------------
+    def export_trace(self, path):
+        events = []
+        first = (self.trace_pos - self.trace_len) % self.trace_size
+        for n in range(self.trace_len):
+            i = (first + n) % self.trace_size
+            name, start, end = self.trace_names[i], self.trace_start[i], self.trace_end[i]
+            events.append({
+                "name": name,
+                "cat": TRACE_CATEGORIES.get(name, "phase"),
+                "ph": "X",
+                "ts": (start - self.t0) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": 1,
+                # Latencies span frames, so they get a track of their own
+                "tid": 2 if name == "input latency" else 1,
+            })
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return path
+
+    # -------------------------------
+    # OVERLAY
+    # -------------------------------
+    def draw_overlay(self, surface, font, pos=(10, 80), refresh_every=10):
+        # Text is re-rendered a few times a second; the graph every frame
+        if self.overlay_surface is None or self.frame_count % refresh_every == 0:
+            self.overlay_surface = self.compose_overlay(font)
+        panel = self.overlay_surface
+        rect = surface.blit(panel, pos)
+
+        graph = pygame.Rect(pos[0] + 8, rect.bottom - 48, panel.get_width() - 16, 40)
+        budget_y = graph.bottom - int(graph.height * 16.7 / 33.3)
+        draw_line(surface, (90, 90, 90), (graph.x, budget_y), (graph.right, budget_y))
+        samples = list(self.frame_ms)[-graph.width // 2:]
+        for i, ms in enumerate(samples):
+            h = min(graph.height, int(graph.height * ms / 33.3))
+            color = (60, 200, 60) if ms <= 17.5 else (230, 180, 40) if ms <= 34 else (230, 60, 60)
+            x = graph.x + i * 2
+            draw_line(surface, color, (x, graph.bottom), (x, graph.bottom - h))
+        return rect
+
+    def compose_overlay(self, font):
+        lines = []
+        frame = self.frame_ms[-1] if self.frame_ms else 0.0
+        work = sum(self.work_ms) / len(self.work_ms) if self.work_ms else 0.0
+        lines.append(f"FPS {self.fps():5.1f}  frame {frame:5.1f} ms  work {work:4.1f} ms")
+        if self.latency_ms:
+            latency = sorted(self.latency_ms)
+            lines.append(f"input to present p50 {latency[len(latency) // 2]:4.1f} ms"
+                         f"  max {latency[-1]:4.1f} ms")
+        for name, value in self.counters.items():
+            lines.append(f"{name}: {value}")
+        slowest = sorted(self.phase_avg.items(), key=lambda kv: -kv[1])[:6]
+        for name, ms in slowest:
+            lines.append(f"{name:<18}{ms:6.2f} ms")
+
+        line_h = font.get_linesize()
+        panel = pygame.Surface((300, 8 + line_h * len(lines) + 52))
+        panel.fill((20, 20, 20))
+        y = 4
+        for line in lines:
+            panel.blit(font.render(line, True, (230, 230, 230)), (8, y))
+            y += line_h
+        return panel
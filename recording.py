@@ -0,0 +1,148 @@
+"""Compact input recordings of a play session.
+
+A recording is the random seed a run started from plus one byte of input
+per simulation tick: the held movement keys and any lane change.  The
+simulation (sim.py) only depends on those and on its own seeded RNG, so
+feeding the same bytes back through main.run_tick() replays the run exactly.  Every
+CHECK_EVERY ticks a hash of the game state is stored as well, so a
+replay can tell where it stopped matching (a bug, or an edited run).
+Obstacle hits also depend on the collision masks of the art, so the
+header carries their fingerprint per level (shapes.masks_print()).
+
+File layout (little endian):
+    header   "MERC", format version u8, seed u32, tick rate u16,
+             level name (u8 length + UTF-8), fingerprint count u8,
+             (level name (u8 length + UTF-8), masks CRC u32) pairs
+    body     zlib of: tick count u32, input bytes, checkpoint count u32,
+             (tick u32, state hash u32) pairs, summary JSON (u16 length)
+"""
+import json
+import zlib
+import struct
+from array import array
+
+MAGIC = b"MERC"
+# 2: the simulation has its own RNG, version 1 runs no longer replay
+# 3: obstacle hits go by pixel masks, older runs die in different places
+# 4: the header fingerprints the masks, as they differ with the art
+# 5: a jumping player is hit with its squash/stretch frame
+FORMAT_VERSION = 5
+CHECK_EVERY = 60  # ticks between state hashes
+
+HEADER = struct.Struct("<4sBIH")
+
+# Input byte: bits 0-2 held keys (sim.HELD_*), bits 3-4 lane change
+LANE_SHIFT = 3
+LANE_CODES = {0: 0, -1: 1, 1: 2}
+LANE_STEPS = {0: 0, 1: -1, 2: 1}
+
+
+def state_hash(values):
+    return zlib.crc32(repr(values).encode())
+
+
+def pack_name(name):
+    data = name.encode()
+    return bytes([len(data)]) + data
+
+
+def unpack_name(data, pos):
+    # (name, position after it)
+    end = pos + 1 + data[pos]
+    return data[pos + 1:end].decode(), end
+
+
+class Recording:
+    def __init__(self, seed, level, tick_rate=60, shapes=None):
+        self.seed = seed
+        self.level = level
+        self.tick_rate = tick_rate
+        self.shapes = dict(shapes or {})  # level -> masks CRC
+        self.inputs = bytearray()
+        self.checks = array("I")  # tick, hash, tick, hash...
+        self.summary = {}
+
+    def __len__(self):
+        return len(self.inputs)
+
+    def tick_input(self, i):
+        # (lane step, held bits) for tick i
+        b = self.inputs[i]
+        return LANE_STEPS[b >> LANE_SHIFT & 3], b & 7
+
+    def checkpoints(self):
+        c = self.checks
+        return {c[i]: c[i + 1] for i in range(0, len(c), 2)}
+
+    # -------------------------------
+    # ENCODING
+    # -------------------------------
+    def to_bytes(self):
+        shapes = b"".join(pack_name(level) + struct.pack("<I", crc)
+                          for level, crc in sorted(self.shapes.items()))
+        summary = json.dumps(self.summary, separators=(",", ":")).encode()
+        body = b"".join([
+            struct.pack("<I", len(self.inputs)), bytes(self.inputs),
+            struct.pack("<I", len(self.checks) // 2), self.checks.tobytes(),
+            struct.pack("<H", len(summary)), summary,
+        ])
+        return (HEADER.pack(MAGIC, FORMAT_VERSION, self.seed, self.tick_rate)
+                + pack_name(self.level) + bytes([len(self.shapes)]) + shapes
+                + zlib.compress(body, 9))
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, seed, tick_rate = HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("not a recording, or an unsupported version")
+        level, pos = unpack_name(data, HEADER.size)
+        shapes = {}
+        count = data[pos]
+        pos += 1
+        for _ in range(count):
+            name, pos = unpack_name(data, pos)
+            (shapes[name],) = struct.unpack_from("<I", data, pos)
+            pos += 4
+        body = zlib.decompress(data[pos:])
+
+        rec = cls(seed, level, tick_rate, shapes)
+        (n,) = struct.unpack_from("<I", body)
+        rec.inputs = bytearray(body[4:4 + n])
+        pos = 4 + n
+        (n_checks,) = struct.unpack_from("<I", body, pos)
+        pos += 4
+        rec.checks = array("I")
+        rec.checks.frombytes(body[pos:pos + 8 * n_checks])
+        pos += 8 * n_checks
+        (n,) = struct.unpack_from("<H", body, pos)
+        rec.summary = json.loads(body[pos + 2:pos + 2 + n])
+        return rec
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+class Recorder:
+    def __init__(self, seed, level, tick_rate=60, shapes=None):
+        self.recording = Recording(seed, level, tick_rate, shapes)
+
+    def record(self, lane_step, held):
+        self.recording.inputs.append(LANE_CODES[lane_step] << LANE_SHIFT | held)
+
+    def checkpoint(self, get_state):
+        # Called after each tick; hashes get_state() every CHECK_EVERY ticks
+        tick = len(self.recording.inputs)
+        if tick % CHECK_EVERY == 0:
+            self.recording.checks.append(tick)
+            self.recording.checks.append(state_hash(get_state()))
+
+    def finish(self, **summary):
+        self.recording.summary = summary
+        return self.recording
@@ -0,0 +1,86 @@
+"""Dirty-rectangle presentation for the game window.
+
+Screens mark what they actually changed and present() pushes only those
+areas with pygame.display.update(rects).  Full-window static layers are
+only blitted when the layer (or the screen) changes, so an idle menu costs
+no drawing at all.  Gameplay frames scroll the whole background and just
+mark everything, which falls back to a plain flip(); `stale` tells the
+scrolling background when the window no longer holds the last frame.
+
+On a display that does not keep its contents (the texture backend, see
+display.py) every frame is simply a full one.
+"""
+import pygame
+
+# Past this many rects one full update is cheaper than many small ones
+MAX_RECTS = 24
+
+
+class DirtyRenderer:
+    def __init__(self, display):
+        self.display = display
+        self.rects = []
+        self.full = True
+        self.stale = True  # the window contents were lost or replaced
+        self.screen = None
+        self.layer_key = None
+        self.layer = None
+        self.frames_full = 0
+        self.frames_partial = 0
+        self.frames_idle = 0
+
+    @property
+    def surface(self):
+        # Follows the display, a resize can swap what it draws into
+        return self.display.target
+
+    def begin_frame(self, screen):
+        # Switching screens always redraws everything once
+        if screen != self.screen or not self.display.retained:
+            self.screen = screen
+            self.invalidate()
+
+    def invalidate(self):
+        self.full = True
+        self.stale = True
+        self.layer_key = None
+
+    def mark(self, rect):
+        if not self.full:
+            self.rects.append(pygame.Rect(rect))
+
+    def mark_all(self):
+        self.full = True
+
+    def blit_layer(self, key, layer):
+        # Returns True when the layer was (re)drawn and everything on top of
+        # it has to be drawn again as well
+        if self.full or key != self.layer_key:
+            self.surface.blit(layer, (0, 0))
+            self.layer_key = key
+            self.layer = layer
+            self.full = True
+            return True
+        return False
+
+    def restore(self, rect):
+        # Puts the static layer back under an area that is about to change
+        rect = pygame.Rect(rect)
+        if self.layer is not None:
+            self.surface.blit(self.layer, rect, rect)
+        else:
+            self.surface.fill((0, 0, 0), rect)
+        self.mark(rect)
+
+    def present(self):
+        if self.full or len(self.rects) > MAX_RECTS:
+            self.display.present()
+            self.frames_full += 1
+        elif self.rects:
+            self.display.present(self.rects)
+            self.frames_partial += 1
+        else:
+            self.frames_idle += 1
+        self.full = False
+        self.stale = False
+        self.rects = []
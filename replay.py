@@ -0,0 +1,132 @@
+"""Replay recorded runs (see recording.py).
+
+    python replay.py recordings/run-20260101-120000.merc     # fast-forward
+    python replay.py recordings/*.merc --json results.json   # regression set
+    python replay.py run.merc --draw-every 1                 # include drawing
+    python replay.py run.merc --watch                        # in a window
+
+Fast-forward mode runs headless and as fast as it can, checking the state
+hash stored every few ticks and the final summary.  A run recorded on art
+with other collision masks (see shapes.py) is refused before it starts,
+as its hits would land elsewhere.  The exit status is
+non-zero when any recording stops matching, which is what you want both
+for regression runs and for checking a submitted leaderboard run.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recordings", nargs="+", metavar="FILE")
+    parser.add_argument("--watch", action="store_true",
+                        help="play back in a window at normal speed")
+    parser.add_argument("--draw-every", type=int, default=0, metavar="TICKS",
+                        help="draw every N ticks when fast-forwarding (default never)")
+    parser.add_argument("--json", help="write the results to this file")
+    return parser.parse_args(argv)
+
+
+args = parse_args(sys.argv[1:]) if __name__ == "__main__" else None
+if not (args and args.watch):
+    os.environ["MISSION_EARTH_HEADLESS"] = "1"
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+import main as game
+from recording import Recording, state_hash
+
+
+def replay(rec, draw_every=0, watch=False):
+    # Returns a result dict; "ok" is False at the first mismatch
+    checks = rec.checkpoints()
+    clock = pygame.time.Clock()
+    game.begin_run(rec.level, seed=rec.seed)
+    game.recorder = None  # replaying, not recording again
+    prints = game.shape_prints(rec.level)
+    if rec.shapes != prints:
+        levels = sorted(set(rec.shapes) | set(prints))
+        other = [lvl for lvl in levels if rec.shapes.get(lvl) != prints.get(lvl)]
+        return {"level": rec.level, "ok": False, "diverged_at": 0,
+                "error": f"recorded on other collision art ({', '.join(other)})"}
+    result = {"level": rec.level, "ticks": len(rec), "ok": True, "diverged_at": None}
+
+    start = time.perf_counter()
+    for tick in range(len(rec)):
+        if game.current_state not in game.PLAY_STATES:
+            result["ok"] = False
+            result["diverged_at"] = tick
+            result["error"] = f"run ended early in {game.current_state!r}"
+            break
+        game.run_tick(*rec.tick_input(tick))
+
+        expected = checks.get(tick + 1)
+        if expected is not None and state_hash(game.sim_state()) != expected:
+            result["ok"] = False
+            result["diverged_at"] = tick + 1
+            result["error"] = "state hash mismatch"
+            break
+
+        if watch or (draw_every and tick % draw_every == 0):
+            game.renderer.begin_frame(game.current_state)
+            if game.current_state in game.PLAY_STATES:
+                game.draw_level_common(game.current_state)
+            game.renderer.present()
+        if watch:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    result["ok"] = False
+                    result["error"] = "closed"
+                    return result
+            clock.tick(rec.tick_rate)
+    elapsed = time.perf_counter() - start
+
+    summary = rec.summary
+    if result["ok"] and summary:
+        if summary.get("hash") != state_hash(game.sim_state()):
+            result["ok"] = False
+            result["error"] = "final state differs from the recording"
+    result.update({
+        "outcome": summary.get("outcome"),
+        "puzzles": game.game_state.puzzles_collected,
+        "final_state": game.current_state,
+        "seconds": elapsed,
+        "ticks_per_sec": len(rec) / elapsed if elapsed else 0.0,
+    })
+    return result
+
+
+def main(args):
+    game.ensure_loaded("puzzles", *game.LEVELS)
+    results = {}
+    failed = False
+    try:
+        for path in args.recordings:
+            try:
+                rec = Recording.load(path)
+            except (OSError, ValueError) as e:
+                results[path] = {"ok": False, "error": str(e)}
+            else:
+                results[path] = replay(rec, args.draw_every, args.watch)
+            r = results[path]
+            failed |= not r["ok"]
+            status = "ok" if r["ok"] else f"FAIL ({r.get('error')}, tick {r.get('diverged_at')})"
+            if "ticks" in r:
+                print(f"{path}: {r['level']}, {r['ticks']} ticks, outcome {r['outcome']}, "
+                      f"{r['puzzles']} pieces, {r['ticks_per_sec']:.0f} ticks/s: {status}")
+            else:
+                print(f"{path}: {status}")
+    finally:
+        game.assets.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(args))
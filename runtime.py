@@ -0,0 +1,9 @@
+"""Where the game runs: on the desktop, or in the browser under pygbag.
+
+The browser build has no threads and no persistent files, so the modules
+that would use a worker thread or write to disk check these instead.
+"""
+import sys
+
+IS_BROWSER = sys.platform == "emscripten"
+USE_THREADS = not IS_BROWSER
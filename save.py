@@ -0,0 +1,185 @@
+"""Saved progress and settings.
+
+Everything lives in one small versioned JSON document, read once at
+startup.  Changes only mark the store dirty; writer() is a scheduler job
+that waits until things have been quiet for SAVE_DELAY seconds and then
+writes a single snapshot, so finishing a level or toggling a setting never
+touches the disk inside a frame.
+
+On desktop the file is written on a worker thread to a temporary file
+that then replaces the old one, so a crash mid-write leaves the previous
+save intact.  Under pygbag there are no threads and no real files; the
+document goes to the browser's localStorage instead.
+"""
+import os
+import json
+import time
+
+from runtime import IS_BROWSER, USE_THREADS
+
+SAVE_VERSION = 1
+SAVE_DELAY = 1.0  # seconds of quiet before changes are written
+
+# Upgrades from older save versions: {old version: fn(data) -> data}
+MIGRATIONS = {}
+
+
+def default_data():
+    return {"version": SAVE_VERSION, "completed": [], "best_times": {}, "settings": {}}
+
+
+def default_path():
+    return os.environ.get("MISSION_EARTH_SAVE") or os.path.join(
+        os.path.expanduser("~"), ".mission_earth", "save.json")
+
+
+class SaveStore:
+    def __init__(self, path, storage_key="mission_earth_save",
+                 threaded=USE_THREADS, delay=SAVE_DELAY):
+        # path None keeps everything in memory (headless runs)
+        self.path = path
+        self.storage_key = storage_key
+        self.delay = delay
+        self.data = default_data()
+        self.dirty = False
+        self.changed_at = 0.0
+        self.writes = 0
+        self.writing = None
+        self.executor = None
+        if threaded and path and not IS_BROWSER:
+            from concurrent.futures import ThreadPoolExecutor
+            self.executor = ThreadPoolExecutor(max_workers=1)
+
+    # -------------------------------
+    # LOADING
+    # -------------------------------
+    def read_text(self):
+        if IS_BROWSER:
+            import platform
+            return platform.window.localStorage.getItem(self.storage_key)
+        if not self.path or not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            return f.read()
+
+    def load(self):
+        try:
+            text = self.read_text()
+            if text:
+                self.data = self.migrate(json.loads(text))
+        except Exception as e:
+            print(f"Could not read save data, starting fresh: {e}")
+            self.data = default_data()
+            if self.path and not IS_BROWSER and os.path.exists(self.path):
+                # Kept aside rather than overwritten by the next save
+                try:
+                    os.replace(self.path, self.path + ".bad")
+                except OSError:
+                    pass
+        return self.data
+
+    def migrate(self, data):
+        version = data.get("version", 0)
+        while version in MIGRATIONS:
+            data = MIGRATIONS[version](data)
+            version = data["version"]
+        if version != SAVE_VERSION:
+            raise ValueError(f"unsupported save version {version}")
+        merged = default_data()
+        merged.update(data)
+        return merged
+
+    # -------------------------------
+    # PROGRESS AND SETTINGS
+    # -------------------------------
+    def is_completed(self, level):
+        return level in self.data["completed"]
+
+    def complete(self, level):
+        if level not in self.data["completed"]:
+            self.data["completed"].append(level)
+            self.touch()
+
+    def best_time(self, key):
+        return self.data["best_times"].get(key)
+
+    def record_time(self, key, seconds, longer_is_better=False):
+        # Returns True when `seconds` is a new best for `key`
+        best = self.data["best_times"].get(key)
+        if best is None or (seconds > best if longer_is_better else seconds < best):
+            self.data["best_times"][key] = round(seconds, 2)
+            self.touch()
+            return True
+        return False
+
+    def setting(self, name, default=None):
+        return self.data["settings"].get(name, default)
+
+    def set_setting(self, name, value):
+        if self.data["settings"].get(name) != value:
+            self.data["settings"][name] = value
+            self.touch()
+
+    def touch(self):
+        self.dirty = True
+        self.changed_at = time.perf_counter()
+
+    # -------------------------------
+    # WRITING
+    # -------------------------------
+    def write_text(self, text):
+        if IS_BROWSER:
+            import platform
+            platform.window.localStorage.setItem(self.storage_key, text)
+            return
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def write_snapshot(self, text):
+        try:
+            self.write_text(text)
+            self.writes += 1
+        except Exception as e:
+            print(f"Could not write save data: {e}")
+
+    def snapshot(self):
+        # Taken on the main thread, so a write never sees a half-made change
+        self.dirty = False
+        return json.dumps(self.data, separators=(",", ":"))
+
+    def start_write(self):
+        if self.executor:
+            self.writing = self.executor.submit(self.write_snapshot, self.snapshot())
+        else:
+            self.write_snapshot(self.snapshot())
+
+    def writer(self):
+        # Scheduler job: coalesces changes into one write once they settle
+        while True:
+            if (not self.dirty or not (self.path or IS_BROWSER)
+                    or time.perf_counter() - self.changed_at < self.delay
+                    or (self.writing and not self.writing.done())):
+                yield False
+                continue
+            self.start_write()
+            yield
+
+    def flush(self):
+        # Blocking write of anything outstanding, for shutdown
+        if self.writing:
+            self.writing.result()
+            self.writing = None
+        if self.dirty and (self.path or IS_BROWSER):
+            self.write_snapshot(self.snapshot())
+
+    def shutdown(self):
+        self.flush()
+        if self.executor:
+            self.executor.shutdown(wait=True)
@@ -0,0 +1,173 @@
+"""Drawing at any window size while the game keeps its logical resolution.
+
+The simulation, the layout and every draw call stay in logical pixels
+(900x700).  A View maps them onto the window: one scale factor and a
+letterbox offset, recomputed when the window is resized and never per
+frame.
+
+Surfaces are not scaled while drawing.  Variants keeps one copy of every
+drawn surface at the current scale, made the first time the surface is
+drawn at that scale.  A `source` hook can supply better copies than
+smoothscale, e.g. sprites decoded again from their full-size files (see
+main.art_variant).  It returns a surface, False while one is still being
+made (a smoothscaled stand-in is shown until then), or None when there is
+nothing better.  A new scale starts the cache over.
+
+ScaledTarget draws into the window with that: blit() positions are
+logical, the surfaces blitted are the variants.  It redraws every frame in
+full (`retained` is False), since the background cannot scroll the window
+by fractions of a pixel.
+"""
+import weakref
+
+import pygame
+
+
+class View:
+    def __init__(self, logical_size):
+        self.logical = tuple(logical_size)
+        self.window = self.logical
+        self.scale = 1.0
+        self.frame = pygame.Rect((0, 0), self.logical)  # window pixels drawn into
+        self.resizes = 0
+
+    def resize(self, window_size):
+        # Returns True when the scale or the letterbox changed
+        window_size = tuple(window_size)
+        if window_size == self.window:
+            return False
+        self.window = window_size
+        (w, h), (ww, wh) = self.logical, window_size
+        self.scale = min(ww / w, wh / h)
+        fw, fh = round(w * self.scale), round(h * self.scale)
+        self.frame = pygame.Rect((ww - fw) // 2, (wh - fh) // 2, fw, fh)
+        self.resizes += 1
+        return True
+
+    @property
+    def scaled(self):
+        # A wider or taller window at scale 1 is only letterboxed
+        return self.scale != 1.0
+
+    def px(self, v):
+        return round(v * self.scale)
+
+    def rect(self, r):
+        # Logical rect to frame pixels; shared edges stay shared
+        r = pygame.Rect(r)
+        px = self.px
+        x, y = px(r.x), px(r.y)
+        return pygame.Rect(x, y, px(r.right) - x, px(r.bottom) - y)
+
+    def to_logical(self, pos):
+        return (int((pos[0] - self.frame.x) / self.scale),
+                int((pos[1] - self.frame.y) / self.scale))
+
+
+class Variants:
+    def __init__(self, view, source=None):
+        self.view = view
+        self.source = source  # source(surf, size) -> surface, False or None
+        self.scale = view.scale
+        self.cache = weakref.WeakKeyDictionary()  # surface -> (copy, final)
+        self.made = 0
+        self.standins = 0
+
+    def size_for(self, surf):
+        w, h = surf.get_size()
+        px = self.view.px
+        return max(1, px(w)), max(1, px(h))
+
+    def get(self, surf):
+        if self.scale != self.view.scale:
+            self.clear()
+        entry = self.cache.get(surf)
+        if entry is not None and entry[1]:
+            return entry[0]
+        size = self.size_for(surf)
+        made = self.source(surf, size) if self.source else None
+        if made is False:
+            # Not there yet: a stand-in now, asked again next time
+            if entry is None:
+                entry = (pygame.transform.smoothscale(surf, size), False)
+                self.cache[surf] = entry
+                self.standins += 1
+            return entry[0]
+        if made is None:
+            made = pygame.transform.smoothscale(surf, size)
+        self.cache[surf] = (made, True)
+        self.made += 1
+        return made
+
+    def is_final(self, surf):
+        entry = self.cache.get(surf)
+        return entry is not None and entry[1]
+
+    def clear(self):
+        self.cache.clear()
+        self.scale = self.view.scale
+
+    def stats(self):
+        final = sum(1 for _, done in self.cache.values() if done)
+        return {"scale": round(self.view.scale, 3), "variants": final,
+                "stand_ins": len(self.cache) - final, "made": self.made}
+
+
+class ScaledTarget:
+    # The Surface-like draw API of display.py, in logical pixels
+    retained = False
+
+    def __init__(self, surface, view, variants):
+        self.view = view
+        self.variants = variants
+        self.surface = surface.subsurface(view.frame)
+        self.size = view.logical
+
+    def get_size(self):
+        return self.size
+
+    def get_width(self):
+        return self.size[0]
+
+    def get_height(self):
+        return self.size[1]
+
+    def get_rect(self):
+        return pygame.Rect((0, 0), self.size)
+
+    def blit(self, surf, dest, area=None):
+        px = self.view.px
+        big = self.variants.get(surf)
+        x, y = dest[0], dest[1]
+        if area is None:
+            w, h = surf.get_size()
+            self.surface.blit(big, (px(x), px(y)))
+        else:
+            ax, ay, w, h = area
+            x0, y0 = px(x), px(y)
+            self.surface.blit(big, (x0, y0),
+                              (px(ax), px(ay), px(x + w) - x0, px(y + h) - y0))
+        return pygame.Rect(x, y, w, h)
+
+    def blits(self, blit_sequence, doreturn=True):
+        blit = self.blit
+        rects = [blit(*item) for item in blit_sequence]
+        return rects if doreturn else None
+
+    def fill(self, color, rect=None):
+        if rect is None:
+            self.surface.fill(color)
+            return self.get_rect()
+        self.surface.fill(color, self.view.rect(rect))
+        return pygame.Rect(rect)
+
+    def draw_rect(self, color, rect, border_radius=0):
+        pygame.draw.rect(self.surface, color, self.view.rect(rect),
+                         border_radius=self.view.px(border_radius))
+        return pygame.Rect(rect)
+
+    def draw_line(self, color, start, end):
+        px = self.view.px
+        pygame.draw.line(self.surface, color, (px(start[0]), px(start[1])),
+                         (px(end[0]), px(end[1])), max(1, px(1)))
+        return pygame.Rect(start, (1, 1)).union(pygame.Rect(end, (1, 1)))
@@ -0,0 +1,115 @@
+"""Cooperative frame scheduler for the asyncio main loop.
+
+Each frame the loop asks begin_frame() how many fixed simulation ticks to
+run, updates and draws, then awaits end_frame().  end_frame() spends what
+is left of the frame budget on background jobs and then yields to asyncio
+(and so to the browser under pygbag) instead of blocking in clock.tick().
+
+Background jobs are generators: every next() is one small unit of work.
+A job that yields False had nothing to do, and once every job has said so
+the scheduler stops polling them for the rest of the frame.
+"""
+import time
+import asyncio
+from collections import deque
+
+
+class Job:
+    def __init__(self, gen, name):
+        self.gen = gen
+        self.name = name
+        self.done = False
+
+    def step(self):
+        # Returns False when the job had nothing to do
+        try:
+            return next(self.gen) is not False
+        except StopIteration:
+            self.done = True
+        except Exception as e:
+            print(f"Background job {self.name} failed: {e}")
+            self.done = True
+        return True
+
+
+def call_once(fn, *args):
+    fn(*args)
+    yield
+
+
+class FrameScheduler:
+    def __init__(self, fps=60, tick_rate=60, max_ticks_per_frame=5, profiler=None):
+        self.frame_time = 1.0 / fps
+        self.tick_time = 1.0 / tick_rate
+        self.max_ticks = max_ticks_per_frame
+        self.jobs = deque()
+        self.accumulator = 0.0
+        self.frame_start = None
+        self.last_frame_ms = 0.0
+        self.fps = 0.0
+        self.profiler = profiler
+
+    # -------------------------------
+    # BACKGROUND JOBS
+    # -------------------------------
+    def add_job(self, gen, name="job"):
+        job = Job(gen, name)
+        self.jobs.append(job)
+        return job
+
+    def defer(self, fn, *args):
+        # One-off call run in the next frame's spare time
+        return self.add_job(call_once(fn, *args), getattr(fn, "__name__", "job"))
+
+    def run_jobs(self, deadline):
+        # At least one step per frame so jobs still move on heavy frames
+        ran = False
+        idle = 0
+        while self.jobs and idle < len(self.jobs):
+            if ran and time.perf_counter() >= deadline:
+                break
+            job = self.jobs.popleft()
+            worked = job.step()
+            if not job.done:
+                self.jobs.append(job)
+            idle = 0 if worked else idle + 1
+            ran = True
+
+    def flush_jobs(self):
+        # Runs everything that still has work, e.g. pending saves on exit
+        self.run_jobs(float("inf"))
+
+    # -------------------------------
+    # FRAME PACING
+    # -------------------------------
+    def begin_frame(self):
+        # Returns how many fixed ticks the simulation should advance
+        now = time.perf_counter()
+        if self.frame_start is None:
+            self.frame_start = now - self.tick_time
+        elapsed = now - self.frame_start
+        self.frame_start = now
+        self.last_frame_ms = elapsed * 1000
+        self.fps = 1.0 / elapsed if elapsed > 0 else 0.0
+
+        self.accumulator += elapsed
+        ticks = int(self.accumulator / self.tick_time)
+        if ticks > self.max_ticks:
+            # Too far behind (e.g. window dragged): drop time rather than spiral
+            ticks = self.max_ticks
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= ticks * self.tick_time
+        return ticks
+
+    def remaining(self):
+        return self.frame_start + self.frame_time - time.perf_counter()
+
+    async def end_frame(self):
+        deadline = self.frame_start + self.frame_time
+        if self.profiler and self.jobs:
+            with self.profiler.phase("jobs"):
+                self.run_jobs(deadline)
+        else:
+            self.run_jobs(deadline)
+        await asyncio.sleep(max(0.0, deadline - time.perf_counter()))
@@ -0,0 +1,116 @@
+"""Collision shapes: pixel masks of the obstacle and player sprites.
+
+Obstacle art has a lot of transparent space around it, so a hit is decided
+by the pixels that are actually drawn.  Masks are built once per scaled
+image when a level's art loads, one per spin frame because obstacles
+rotate on screen, and kept next to the surfaces in main.py, which builds
+them from the spin frames it draws (frame_masks()) so every turn is only
+rendered once.  The simulation still tests rectangles first (see
+sim.update_obstacles) and only asks the masks about the few obstacles
+whose box touches the player.  The player is tested the way it is drawn
+too: its plain sprite on the ground, its squash/stretch frame mid-jump.
+
+A Shapes holds the masks of whatever is on screen and is handed to the
+simulation as state.shapes; without one it falls back to the rectangles.
+
+Hits depend on the masks, so recordings carry masks_print() of the art
+they were played on and replay.py refuses to run them on other masks.
+"""
+import zlib
+
+import pygame
+
+from animation import FrameSet, spin, squash_stretch, frame_index
+from sim import JUMP_STRENGTH
+
+SPIN_STEPS = 24  # frames per obstacle turn
+SPIN_TICKS = 240  # ticks per turn
+SPIN = spin(SPIN_STEPS)
+SQUASH_STEPS = 9  # player frames over a jump
+SQUASH = squash_stretch(SQUASH_STEPS, 0.18)
+
+
+def spin_frame(tick, kind):
+    # Each obstacle turns at its own phase, taken from its kind
+    return frame_index(tick, SPIN_TICKS, SPIN_STEPS, int(kind * 7919))
+
+
+def squash_frame(vel_y):
+    # Stretched on the way up, squashed coming down
+    t = (1 - vel_y / -JUMP_STRENGTH) / 2
+    return min(SQUASH_STEPS - 1, max(0, round(t * (SQUASH_STEPS - 1))))
+
+
+def frame_masks(frames):
+    # [(mask, (dx, dy))] per frame of a fully rendered FrameSet
+    return [(pygame.mask.from_surface(surf), offset)
+            for surf, offset in zip(frames.frames, frames.offsets)]
+
+
+def sprite_masks(image, look):
+    # [(mask, (dx, dy))] per frame of `look`, offsets as drawn, without
+    # keeping the frames
+    frames = FrameSet(image, *look)
+    masks = []
+    for i in range(len(frames.transforms)):
+        frames.render(i)
+        masks.append((pygame.mask.from_surface(frames.frames[i]), frames.offsets[i]))
+        frames.frames[i] = None  # only the mask is kept
+    return masks
+
+
+def spin_masks(image):
+    return sprite_masks(image, SPIN)
+
+
+def squash_masks(image):
+    return sprite_masks(image, SQUASH)
+
+
+def masks_print(masks, crc=0):
+    # CRC of [(mask, (dx, dy))], chained onto `crc`
+    for mask, offset in masks:
+        crc = zlib.crc32(pygame.image.tobytes(mask.to_surface(), "RGB"), crc)
+        crc = zlib.crc32(repr(offset).encode(), crc)
+    return crc
+
+
+def player_mask(image):
+    return pygame.mask.from_surface(image)
+
+
+def spin_margin(masks):
+    # How far the turned frames reach outside the sprite's own box
+    return max([max(-dx, -dy) for _, (dx, dy) in masks] + [0])
+
+
+def frame_reach(masks, size):
+    # How far frames reach outside a sprite of `size`, on any side
+    w, h = size
+    return max([max(-dx, -dy, dx + m.get_size()[0] - w, dy + m.get_size()[1] - h)
+                for m, (dx, dy) in masks] + [0])
+
+
+class Shapes:
+    def __init__(self, obstacles, player, squash=None):
+        self.obstacles = obstacles  # spin_masks() per obstacle image
+        self.player = player  # player_mask() of the player image, or None
+        self.squash = squash  # squash_masks() of the same image, or None
+        self.margin = max([spin_margin(m) for m in obstacles] + [0])
+        if player is not None and squash:
+            self.margin += frame_reach(squash, player.get_size())
+
+    def player_at(self, jumping, vel_y):
+        # (mask, (dx, dy)) of the player as drawn, or None
+        if self.player is None:
+            return None
+        if jumping and self.squash:
+            return self.squash[squash_frame(vel_y)]
+        return self.player, (0, 0)
+
+    def obstacle(self, kind, tick):
+        # (mask, (dx, dy)) of an obstacle as drawn at `tick`, or None
+        if not self.obstacles:
+            return None
+        masks = self.obstacles[int(kind * len(self.obstacles))]
+        return masks[spin_frame(tick, kind)]
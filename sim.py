@@ -0,0 +1,310 @@
+"""Simulation core: the game rules without any drawing.
+
+Everything a run needs lives in one GameState and advances through
+step(state, inputs).  Nothing here touches pygame, so a state can be
+stepped headless, many at a time, or in worker processes; main.py only
+feeds it input and draws what it finds in the state.
+
+Entities carry a `kind` in [0, 1) instead of a surface.  The renderer
+picks the sprite from it, which keeps the simulation (and its use of the
+state's own RNG) independent of how many images happened to load.
+
+Obstacle hits are decided on pixels when the state has shapes (a
+shapes.Shapes, the masks of the sprites being drawn); the rectangles are
+tested first and are all there is without them.
+
+step() appends what happened during the tick to state.events, as tuples:
+    ("lane", level, lane)           the player moved to another lane
+    ("jump", level)                 the player jumped
+    ("spawn", level, lane)          an obstacle came in
+    ("restart", level)              a hit sent the run back to `level`
+    ("hit", level, ticks, lane, x)  the player hit an obstacle after `ticks`
+    ("collect", level, count)       a puzzle piece was picked up
+    ("finish", level, ticks)        enough pieces were collected
+"""
+import random
+
+from entities import EntityPool
+from levels import compile_timeline
+from endless import EndlessTimeline
+
+TICK_RATE = 60  # fixed simulation steps per second; speeds below are per tick
+TICK_DT = 1.0 / TICK_RATE
+
+# Playfield, in logical pixels
+WIDTH = 900
+HEIGHT = 700
+GROUND_Y = HEIGHT - 40
+
+ENDLESS = "endless"
+
+PLAYER_WIDTH = 90
+PLAYER_HEIGHT = 90
+PLAYER_START_X = 100
+PLAYER_SPEED = 7
+GRAVITY = 1
+JUMP_STRENGTH = -15
+
+OBSTACLE_WIDTH = 140
+OBSTACLE_HEIGHT = 140
+PUZZLE_SIZE = 80
+SCROLL_SPEED = 5
+
+GRASS_TOP = int(HEIGHT * 0.45)
+GRASS_BOTTOM = GROUND_Y - PLAYER_HEIGHT
+LANE_POSITIONS = [
+    int(GRASS_TOP + i * ((GRASS_BOTTOM - GRASS_TOP) / 2)) for i in range(3)
+]
+LANE_COUNT = len(LANE_POSITIONS)
+START_LANE = 1
+
+# Held-key bits of an input, see recording.py for how they are stored
+HELD_LEFT = 1
+HELD_RIGHT = 2
+HELD_JUMP = 4
+
+
+class NullPhase:
+    # Stands in for profiler phases when nobody is profiling
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_PHASE = NullPhase()
+
+
+class GameState:
+    def __init__(self, levels, seed=None, profiler=None):
+        self.levels = levels  # {name: levels.LevelDef}
+        self.first_level = next(iter(levels))
+        self.rng = random.Random(seed)
+        self.profiler = profiler
+        self.invincible = False  # soak runs play one unbroken endless run
+        self.shapes = None  # pixel masks for obstacle hits, see shapes.py
+        self.events = []
+
+        self.level = None
+        self.timer = 0
+        self.timeline = None
+        self.obstacle_speed = 7
+        self.scroll_speed = SCROLL_SPEED
+        self.pieces_required = 3
+        self.puzzles_collected = 0
+        self.finished = False
+
+        self.player_x = PLAYER_START_X
+        self.lane_index = START_LANE
+        self.player_y = LANE_POSITIONS[START_LANE]
+        self.player_vel_y = 0
+        self.is_jumping = False
+
+        self.obstacles = EntityPool(OBSTACLE_WIDTH, OBSTACLE_HEIGHT, LANE_COUNT)
+        self.puzzle_pieces = EntityPool(PUZZLE_SIZE, PUZZLE_SIZE, LANE_COUNT)
+
+    def phase(self, name):
+        return self.profiler.phase(name) if self.profiler else NULL_PHASE
+
+    def key(self):
+        # What replay state hashes cover
+        return (self.level, self.timer, self.lane_index, self.player_x, self.player_y,
+                self.player_vel_y, self.puzzles_collected, len(self.obstacles),
+                len(self.puzzle_pieces), self.obstacles.offset, self.puzzle_pieces.offset)
+
+
+# -------------------------------
+# LEVEL CONTROL
+# -------------------------------
+def start_level(state, level_name):
+    # Timelines are seeded from the state's RNG, so a seeded run replays
+    # the same spawns
+    if level_name == ENDLESS:
+        state.timeline = EndlessTimeline(LANE_COUNT, state.rng.getrandbits(32))
+        state.obstacle_speed = state.timeline.speed
+        state.pieces_required = None  # nothing to finish, pieces are the score
+    else:
+        level = state.levels[level_name]
+        state.timeline = compile_timeline(level, LANE_COUNT, state.rng.getrandbits(32))
+        state.obstacle_speed = level.obstacle_speed
+        state.pieces_required = level.pieces_required
+
+    state.level = level_name
+    state.timer = 0
+    state.finished = False
+    state.obstacles.clear()
+    state.puzzle_pieces.clear()
+    state.puzzles_collected = 0
+    state.player_x = PLAYER_START_X
+    state.lane_index = START_LANE
+    state.scroll_speed = SCROLL_SPEED
+    state.player_y = LANE_POSITIONS[START_LANE]
+    # A jump in progress must not carry over, replays start from rest
+    state.player_vel_y, state.is_jumping = 0, False
+
+    for _ in range(3):
+        spawn_puzzle_piece(state)
+
+
+# -------------------------------
+# PLAYER
+# -------------------------------
+def change_lane(state, step):
+    new_index = state.lane_index + step
+    if 0 <= new_index < LANE_COUNT:
+        state.lane_index = new_index
+        state.player_y = LANE_POSITIONS[new_index]
+        state.events.append(("lane", state.level, new_index))
+
+
+def move_player(state, held):
+    if held & HELD_LEFT and state.player_x > 0:
+        state.player_x -= PLAYER_SPEED
+    if held & HELD_RIGHT and state.player_x < WIDTH - PLAYER_WIDTH:
+        state.player_x += PLAYER_SPEED
+    if held & HELD_JUMP and not state.is_jumping:
+        state.is_jumping = True
+        state.player_vel_y = JUMP_STRENGTH
+        state.events.append(("jump", state.level))
+
+
+def update_player(state):
+    if state.is_jumping:
+        state.player_vel_y += GRAVITY
+        state.player_y += state.player_vel_y
+        if state.player_y >= GROUND_Y - PLAYER_HEIGHT:
+            state.player_y = GROUND_Y - PLAYER_HEIGHT
+            state.player_vel_y = 0
+            state.is_jumping = False
+
+
+def overlaps_player(state, e):
+    return e.y < state.player_y + PLAYER_HEIGHT and state.player_y < e.y + e.h
+
+
+# -------------------------------
+# OBSTACLES
+# -------------------------------
+def spawn_obstacle(state, lane, pick):
+    # Lane and pick come from the precompiled spawn timeline
+    state.obstacles.spawn(WIDTH + 50, LANE_POSITIONS[lane], lane, pick)
+    state.events.append(("spawn", state.level, lane))
+
+
+def update_obstacles(state):
+    # Moving every obstacle is one offset change in the lane index.
+    # Returns True when the player was hit and the level restarted.
+    state.obstacles.scroll(state.obstacle_speed)
+    state.obstacles.expire(-OBSTACLE_WIDTH)
+    if state.invincible:
+        return False
+
+    # Only die if in the same lane, so only the player's lane around the
+    # player's x is checked.  Turned sprites reach `margin` past their box.
+    shapes = state.shapes
+    margin = shapes.margin if shapes else 0
+    for obs in state.obstacles.in_lane(state.lane_index, state.player_x - margin,
+                                       PLAYER_WIDTH + 2 * margin):
+        if (obs.y - margin < state.player_y + PLAYER_HEIGHT
+                and state.player_y < obs.y + obs.h + margin
+                and pixels_overlap(state, obs)):
+            player_hit(state)
+            return True
+    return False
+
+
+def pixels_overlap(state, obs):
+    # Falls back to the box when there is no mask to go by
+    shapes = state.shapes
+    if shapes is None:
+        return overlaps_player(state, obs)
+    player = shapes.player_at(state.is_jumping, state.player_vel_y)
+    shape = shapes.obstacle(obs.kind, state.timer)
+    if player is None or shape is None:
+        return overlaps_player(state, obs)
+    player_mask, (px, py) = player
+    mask, (dx, dy) = shape
+    offset = (obs.x - state.obstacles.offset + dx - state.player_x - px,
+              obs.y + dy - state.player_y - py)
+    return player_mask.overlap(mask, offset) is not None
+
+
+def player_hit(state):
+    state.events.append(("hit", state.level, state.timer, state.lane_index,
+                         state.player_x))
+    # An endless run just starts over; a level sends the whole game back
+    # to the first level
+    restart = ENDLESS if state.level == ENDLESS else state.first_level
+    start_level(state, restart)
+    state.events.append(("restart", restart))
+
+
+# -------------------------------
+# PUZZLE PIECES
+# -------------------------------
+def spawn_puzzle_piece(state):
+    rng = state.rng
+    lane = rng.randrange(LANE_COUNT)
+    x = rng.randint(WIDTH + 400, WIDTH + 1200)
+    state.puzzle_pieces.spawn(x, LANE_POSITIONS[lane], lane, rng.random())
+
+
+def update_puzzle_pieces(state):
+    pieces = state.puzzle_pieces
+    pieces.scroll(int(state.scroll_speed * 1.4))
+    for _ in range(pieces.expire(-PUZZLE_SIZE)):
+        spawn_puzzle_piece(state)
+
+    # Only collect pieces in the player's lane that overlap the player
+    for piece in pieces.in_lane(state.lane_index, state.player_x, PLAYER_WIDTH):
+        if overlaps_player(state, piece):
+            state.puzzles_collected += 1
+            pieces.despawn(piece)
+            state.events.append(("collect", state.level, state.puzzles_collected))
+
+            if state.pieces_required and state.puzzles_collected >= state.pieces_required:
+                state.finished = True
+                state.events.append(("finish", state.level, state.timer))
+                return
+            spawn_puzzle_piece(state)
+
+
+# -------------------------------
+# STEP
+# -------------------------------
+def tick(state, lane_step, held):
+    # One fixed simulation tick
+    if lane_step:
+        change_lane(state, lane_step)
+    move_player(state, held)
+    with state.phase("player.update"):
+        update_player(state)
+
+    # Obstacles: whatever the compiled timeline has due this tick
+    state.timer += 1
+    with state.phase("obstacles.spawn"):
+        for lane, pick in state.timeline.pop_due(state.timer):
+            spawn_obstacle(state, lane, pick)
+    if state.level == ENDLESS:
+        state.obstacle_speed = state.timeline.speed
+    with state.phase("obstacles.update"):
+        if update_obstacles(state):
+            return
+
+    with state.phase("puzzles.update"):
+        update_puzzle_pieces(state)
+
+
+def step(state, inputs=(0, 0), dt=TICK_DT):
+    # Advances `dt` seconds (whole ticks, at least one) with inputs
+    # (lane step, held bits); a lane change only applies to the first
+    # tick.  Stops early once the level is finished.
+    lane_step, held = inputs
+    state.events.clear()
+    for _ in range(max(1, round(dt * TICK_RATE))):
+        if state.finished:
+            break
+        tick(state, lane_step, held)
+        lane_step = 0
+    return state.events
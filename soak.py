@@ -0,0 +1,167 @@
+"""Headless soak run of endless mode.
+
+    python soak.py                      # one simulated hour
+    python soak.py --minutes 10 --draw-every 1
+    python soak.py --json soak.json
+
+Plays a single unbroken endless run (the player is made invincible, so
+the difficulty ramp goes all the way) as fast as possible with the same
+scripted input as benchmark.py.  Every simulated minute it samples entity
+counts, streamed chunks, traced memory and the slowest ticks.  The exit
+status is non-zero when any of them keeps growing: live entities or
+chunks above a fixed bound, memory growing after the first minutes, or
+tick time drifting up.
+"""
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import tracemalloc
+
+os.environ["MISSION_EARTH_HEADLESS"] = "1"
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import main as game
+from benchmark import InputScript, percentile
+
+# Nothing on screen comes close to these; a leak quickly goes past them
+MAX_OBSTACLES = 64
+MAX_PUZZLE_PIECES = 16
+MAX_CHUNKS = 4
+
+
+def soak(minutes, seed, draw_every, trace_memory):
+    state = game.game_state
+    state.rng.seed(seed)
+    script = InputScript(seed)
+    ticks_per_minute = 60 * game.TICK_RATE
+    perf = time.perf_counter
+
+    state.invincible = True
+    game.start_level(game.STATE_ENDLESS)
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()
+
+    samples = []
+    for minute in range(minutes):
+        tick_times = []
+        draw_times = []
+        peak_obstacles = peak_pieces = peak_chunks = 0
+        for n in range(minute * ticks_per_minute, (minute + 1) * ticks_per_minute):
+            t = perf()
+            game.run_tick(*script.frame(n))
+            tick_times.append(perf() - t)
+
+            if draw_every and n % draw_every == 0:
+                t = perf()
+                game.renderer.begin_frame(game.STATE_ENDLESS)
+                game.draw_level_common(game.STATE_ENDLESS)
+                game.renderer.present()
+                draw_times.append(perf() - t)
+
+            peak_obstacles = max(peak_obstacles, len(state.obstacles))
+            peak_pieces = max(peak_pieces, len(state.puzzle_pieces))
+            peak_chunks = max(peak_chunks, len(state.timeline.chunks))
+
+        if game.current_state != game.STATE_ENDLESS:
+            raise RuntimeError(f"endless run left to {game.current_state!r}")
+        tick_times.sort()
+        draw_times.sort()
+        samples.append({
+            "minute": minute + 1,
+            "speed": state.obstacle_speed,
+            "obstacles": peak_obstacles,
+            "puzzle_pieces": peak_pieces,
+            "chunks": peak_chunks,
+            "chunks_made": state.timeline.chunks_made,
+            "pooled": len(state.obstacles.free) + len(state.puzzle_pieces.free),
+            "tick_p99_us": percentile(tick_times, 99) * 1e6,
+            "draw_p99_ms": percentile(draw_times, 99) * 1000,
+            "traced_kib": tracemalloc.get_traced_memory()[0] / 1024 if trace_memory else 0.0,
+        })
+        print_sample(samples[-1])
+
+    if trace_memory:
+        tracemalloc.stop()
+    state.invincible = False
+    return samples
+
+
+def print_sample(s):
+    print(f"{s['minute']:4d} min  speed {s['speed']:5.1f}  "
+          f"obstacles {s['obstacles']:3d}  pieces {s['puzzle_pieces']:2d}  "
+          f"chunks {s['chunks']} ({s['chunks_made']} made)  pooled {s['pooled']:3d}  "
+          f"tick p99 {s['tick_p99_us']:6.1f} us  draw p99 {s['draw_p99_ms']:5.2f} ms  "
+          f"traced {s['traced_kib']:7.0f} KiB")
+
+
+def check(samples, warmup, max_growth_kib, max_tick_drift):
+    # Returns a list of failures, empty when the run stayed bounded
+    failures = []
+    for s in samples:
+        for key, limit in (("obstacles", MAX_OBSTACLES),
+                           ("puzzle_pieces", MAX_PUZZLE_PIECES),
+                           ("chunks", MAX_CHUNKS)):
+            if s[key] > limit:
+                failures.append(f"minute {s['minute']}: {key} {s[key]} > {limit}")
+
+    # Memory and tick time are compared against the end of the warm-up,
+    # once caches and pools have filled
+    if len(samples) > warmup:
+        base = samples[warmup - 1]
+        last = samples[-1]
+        growth = last["traced_kib"] - base["traced_kib"]
+        if growth > max_growth_kib:
+            failures.append(f"traced memory grew {growth:.0f} KiB after minute {warmup}")
+        settled = sorted(s["tick_p99_us"] for s in samples[warmup:])
+        typical = percentile(settled, 50)
+        if typical > base["tick_p99_us"] * max_tick_drift:
+            failures.append(f"tick p99 drifted from {base['tick_p99_us']:.1f} "
+                            f"to {typical:.1f} us")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=int, default=60,
+                        help="simulated minutes to play (default 60)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--draw-every", type=int, default=10, metavar="TICKS",
+                        help="draw and present every N ticks, 0 to never draw (default 10)")
+    parser.add_argument("--warmup", type=int, default=10, metavar="MINUTES",
+                        help="minutes before growth is measured (default 10)")
+    parser.add_argument("--max-growth", type=float, default=256, metavar="KIB",
+                        help="allowed traced memory growth after warm-up (default 256)")
+    parser.add_argument("--max-tick-drift", type=float, default=2.0,
+                        help="allowed factor on tick p99 after warm-up (default 2.0)")
+    parser.add_argument("--no-tracemalloc", action="store_true",
+                        help="skip memory tracing, it slows the run down")
+    parser.add_argument("--json", help="write the samples to this file")
+    args = parser.parse_args(argv)
+
+    game.ensure_loaded("puzzles", *game.LEVELS)
+    start = time.perf_counter()
+    try:
+        samples = soak(args.minutes, args.seed, args.draw_every, not args.no_tracemalloc)
+    finally:
+        game.assets.shutdown()
+    print(f"\n{args.minutes} simulated minutes in {time.perf_counter() - start:.0f} s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(samples, f, indent=1)
+
+    failures = check(samples, min(args.warmup, len(samples)),
+                     args.max_growth, args.max_tick_drift)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if not failures:
+        print("ok: entity counts, chunks, memory and tick time stayed bounded")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
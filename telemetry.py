@@ -0,0 +1,218 @@
+"""Gameplay telemetry: what happens in runs, written out in batches.
+
+log() is all the frame path ever does: it appends (time, kind, fields) to
+a ring buffer of RING_SIZE events, so it costs about a microsecond and
+never formats or touches the disk.  If the buffer fills before a flush
+the oldest events are dropped and counted.  frame() adds a frame time to
+a histogram that goes out with each batch as one "frames" event.
+
+writer() is a scheduler job, like save.writer(): every FLUSH_INTERVAL
+seconds (sooner when the buffer is half full) it takes what is in the
+buffer and hands it to a worker thread, which turns it into
+newline-delimited JSON, gzips it and gives the bytes to the sink.  The
+browser build has no threads and never logs (see main.py).
+
+A sink is anything with send(data) taking one gzipped NDJSON batch:
+    FileSink(folder)  appends to <folder>/<session>.ndjson.gz; batches are
+                      gzip members, so `zcat` and gzip.open() read the file.
+                      The oldest sessions are deleted to keep the folder
+                      under FOLDER_CAP_BYTES
+    HttpSink(url)     POSTs each batch, see telemetry_server.py for a local
+                      stand-in server
+"""
+import os
+import json
+import gzip
+import time
+from bisect import bisect_left
+from collections import deque
+
+TELEMETRY_VERSION = 1
+RING_SIZE = 4096
+FLUSH_INTERVAL = 10.0  # seconds between batches
+FRAME_BUCKETS_MS = (4, 8, 12, 16.7, 20, 25, 33.4, 50, 100)  # upper bounds
+FOLDER_CAP_BYTES = 4 * 1024 * 1024
+SESSION_SUFFIX = ".ndjson.gz"
+
+
+def new_session():
+    return time.strftime("%Y%m%d-%H%M%S-") + os.urandom(3).hex()
+
+
+def encode(session, events):
+    # One gzipped NDJSON batch
+    lines = [json.dumps({"v": TELEMETRY_VERSION, "session": session, "t": round(t, 3),
+                         "event": kind, **fields},
+                        separators=(",", ":"))
+             for t, kind, fields in events]
+    return gzip.compress(("\n".join(lines) + "\n").encode())
+
+
+def decode(data):
+    return [json.loads(line) for line in gzip.decompress(data).splitlines() if line]
+
+
+# -------------------------------
+# SINKS
+# -------------------------------
+class FileSink:
+    def __init__(self, folder, session, cap_bytes=FOLDER_CAP_BYTES):
+        self.folder = folder
+        self.path = os.path.join(folder, session + SESSION_SUFFIX)
+        self.cap_bytes = cap_bytes
+
+    def make_room(self, size):
+        # Deletes the oldest other sessions until `size` more bytes fit
+        files = []
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            if name.endswith(SESSION_SUFFIX):
+                files.append((os.path.getmtime(path), os.path.getsize(path), path))
+        used = sum(s for _, s, _ in files)
+        for _, s, path in sorted(files):
+            if used + size <= self.cap_bytes:
+                break
+            if path != self.path:
+                os.remove(path)
+                used -= s
+        if used + size > self.cap_bytes:
+            raise OSError(f"{self.folder} is over its {self.cap_bytes} byte cap")
+
+    def send(self, data):
+        os.makedirs(self.folder, exist_ok=True)
+        self.make_room(len(data))
+        with open(self.path, "ab") as f:
+            f.write(data)
+
+
+class HttpSink:
+    def __init__(self, url, timeout=5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, data):
+        from urllib.request import Request, urlopen
+        request = Request(self.url, data=data, method="POST", headers={
+            "Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"})
+        with urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class MemorySink:
+    # Keeps the batches, for tools and checks
+    def __init__(self):
+        self.batches = []
+
+    def send(self, data):
+        self.batches.append(data)
+
+    def events(self):
+        return [e for data in self.batches for e in decode(data)]
+
+
+def open_sink(target, session):
+    # A folder or an http(s) URL; None, "" or "0" turns telemetry off
+    if not target or target == "0":
+        return None
+    if target.startswith(("http://", "https://")):
+        return HttpSink(target)
+    return FileSink(target, session)
+
+
+class Telemetry:
+    def __init__(self, sink, session=None, ring_size=RING_SIZE,
+                 interval=FLUSH_INTERVAL):
+        self.sink = sink  # None drops everything
+        self.session = session or new_session()
+        self.ring = deque(maxlen=ring_size)
+        self.ring_size = ring_size
+        self.interval = interval
+        self.last_flush = time.perf_counter()
+        self.frame_counts = [0] * (len(FRAME_BUCKETS_MS) + 1)
+        self.logged = 0
+        self.dropped = 0
+        self.batches = 0
+        self.failed = 0
+        self.sent_bytes = 0
+        self.sending = None
+        self.executor = None
+        if sink is not None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.executor = ThreadPoolExecutor(max_workers=1)
+
+    # -------------------------------
+    # LOGGING (frame path)
+    # -------------------------------
+    def log(self, kind, **fields):
+        if self.sink is None:
+            return
+        if len(self.ring) == self.ring_size:
+            self.dropped += 1
+        self.ring.append((time.time(), kind, fields))
+        self.logged += 1
+
+    def frame(self, ms):
+        if self.sink is None:
+            return
+        self.frame_counts[bisect_left(FRAME_BUCKETS_MS, ms)] += 1
+
+    # -------------------------------
+    # FLUSHING
+    # -------------------------------
+    def take(self):
+        # Main thread: empties the ring and the histogram into one batch
+        events = list(self.ring)
+        self.ring.clear()
+        if any(self.frame_counts):
+            events.append((time.time(), "frames",
+                           {"buckets_ms": FRAME_BUCKETS_MS, "counts": self.frame_counts}))
+            self.frame_counts = [0] * (len(FRAME_BUCKETS_MS) + 1)
+        self.last_flush = time.perf_counter()
+        return events
+
+    def send(self, events):
+        try:
+            data = encode(self.session, events)
+            self.sink.send(data)
+            self.batches += 1
+            self.sent_bytes += len(data)
+        except Exception as e:
+            # Telemetry is best effort, the batch is lost
+            if not self.failed:
+                print(f"Could not send telemetry: {e}")
+            self.failed += 1
+
+    def due(self):
+        if len(self.ring) >= self.ring_size // 2:
+            return True
+        return (time.perf_counter() - self.last_flush >= self.interval
+                and (self.ring or any(self.frame_counts)))
+
+    def writer(self):
+        # Scheduler job: a batch every `interval`, one in flight at a time
+        while True:
+            if (self.sink is None or not self.due()
+                    or (self.sending and not self.sending.done())):
+                yield False
+                continue
+            self.sending = self.executor.submit(self.send, self.take())
+            yield
+
+    def flush(self):
+        # Blocking send of everything outstanding, for shutdown
+        if self.sink is None:
+            return
+        if self.sending:
+            self.sending.result()
+            self.sending = None
+        if self.ring or any(self.frame_counts):
+            self.send(self.take())
+
+    def shutdown(self):
+        self.flush()
+        if self.executor:
+            self.executor.shutdown(wait=True)
+
+    def stats(self):
+        return {"logged": self.logged, "dropped": self.dropped, "batches": self.batches,
+                "failed": self.failed, "sent_bytes": self.sent_bytes}
@@ -0,0 +1,125 @@
+"""Local stand-in for a telemetry server, and a summary of what it got.
+
+    python telemetry_server.py --port 8765 --out telemetry/      # receive
+    MISSION_EARTH_TELEMETRY=http://localhost:8765/ python main.py
+    python telemetry_server.py --summary telemetry/*.ndjson.gz   # read
+
+The server takes the gzipped NDJSON batches HttpSink posts and appends
+each one as it came to <out>/<session>.ndjson.gz, the same files FileSink
+writes when the game logs locally.  --summary reads either kind of file
+and prints where players die and how long levels take.
+"""
+import os
+import re
+import sys
+import gzip
+import json
+import argparse
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telemetry import decode
+
+X_BAND = 100  # x is summarised in bands this wide
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--out", default="telemetry", help="folder batches are written to")
+    parser.add_argument("--summary", nargs="+", metavar="FILE",
+                        help="summarise these files instead of serving")
+    return parser.parse_args(argv)
+
+
+# -------------------------------
+# SERVER
+# -------------------------------
+class TelemetryHandler(BaseHTTPRequestHandler):
+    out = "telemetry"
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            events = decode(data)
+        except (OSError, EOFError, ValueError) as e:
+            self.send_error(400, f"not a gzipped NDJSON batch: {e}")
+            return
+        session = events[0].get("session", "unknown") if events else "unknown"
+        session = re.sub(r"[^\w.-]", "_", session)
+        os.makedirs(self.out, exist_ok=True)
+        with open(os.path.join(self.out, session + ".ndjson.gz"), "ab") as f:
+            f.write(data)
+        self.send_response(204)
+        self.end_headers()
+        print(f"{session}: {len(events)} events, {len(data)} bytes")
+
+    def log_message(self, format, *args):
+        pass  # one line per batch from do_POST is enough
+
+
+def serve(port, out):
+    TelemetryHandler.out = out
+    server = ThreadingHTTPServer(("localhost", port), TelemetryHandler)
+    print(f"Receiving telemetry on http://localhost:{port}/ into {out}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+# -------------------------------
+# SUMMARY
+# -------------------------------
+def read_events(paths):
+    for path in paths:
+        with gzip.open(path, "rt") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def summarise(events):
+    deaths = defaultdict(Counter)  # level -> (lane, x band) -> deaths
+    times = defaultdict(list)
+    frames = None
+    sessions = set()
+    for e in events:
+        sessions.add(e.get("session"))
+        kind = e["event"]
+        if kind == "death":
+            deaths[e["level"]][(e["lane"], e["x"] // X_BAND * X_BAND)] += 1
+        elif kind == "level_time":
+            times[e["level"]].append(e["seconds"])
+        elif kind == "frames":
+            counts = e["counts"]
+            frames = [a + b for a, b in zip(frames, counts)] if frames else counts
+            buckets = e["buckets_ms"]
+
+    print(f"{len(sessions)} sessions")
+    for level in sorted(set(deaths) | set(times)):
+        t = sorted(times[level])
+        cleared = f", cleared {len(t)}x, median {t[len(t) // 2]:.1f} s" if t else ""
+        print(f"{level}: {sum(deaths[level].values())} deaths{cleared}")
+        for (lane, x), n in deaths[level].most_common(5):
+            print(f"    lane {lane}, x {x}-{x + X_BAND - 1}: {n}")
+    if frames:
+        total = sum(frames)
+        print(f"Frames: {total}")
+        labels = [f"<= {b} ms" for b in buckets] + [f"> {buckets[-1]} ms"]
+        for label, n in zip(labels, frames):
+            if n:
+                print(f"    {label:>10}  {100 * n / total:5.1f}%")
+
+
+def main(args):
+    if args.summary:
+        summarise(read_events(args.summary))
+    else:
+        serve(args.port, args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args(sys.argv[1:])))
@@ -0,0 +1,33 @@
+"""Bounded cache of rendered text surfaces.
+
+font.render() rasterises every glyph each time it is called; most of our
+strings never change, and the ones that do (the HUD) only change now and
+then, so surfaces are kept keyed by (font, text, colour, antialias).
+"""
+from collections import OrderedDict
+
+
+class TextCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color, antialias=True):
+        key = (font, text, tuple(color), antialias)
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surf
+
+        self.misses += 1
+        surf = font.render(text, antialias, color)
+        self.surfaces[key] = surf
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surf
+
+    def clear(self):
+        self.surfaces.clear()